@@ -0,0 +1,221 @@
+"""
+스펙트럼 오차 증강 엔진 (data_augmenter.py, create_single_test_file.py, create_single_ai_input_file.py 공용)
+
+(N, L) 배치 전체에 대해 K개의 증강본을 브로드캐스트 연산 몇 번으로 만듭니다.
+오차 종류는 기존과 같습니다.
+    linear : slope * 채널 + intercept
+    peak   : 1~3개의 가우시안 피크
+    noise  : 정규 잡음
+증강본마다 적용할 오차 부분집합을 무작위로 고르며(기존처럼 1~3개), 파라미터 추출(draw_params)과
+적용(apply_params)을 분리해 같은 파라미터로 결과를 재현하거나 기록할 수 있습니다.
+난수는 전역 random/np.random 대신 numpy.random.Generator 하나만 사용합니다.
+
+사용 예:
+    rng = np.random.default_rng(42)
+    augmented = augment_batch(flux, 5, rng)   # (N, L) → (N, 5, L)
+    rng = file_rng(seed, "dr4_mangaHI-7443-12701.csv")   # 파일별 재현 가능한 난수열
+
+    python augmentation.py [CSV 디렉토리 ...]   # 기존 파일별 루프와 속도 비교
+"""
+import glob
+import hashlib
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ERROR_TYPES = ('linear', 'peak', 'noise')
+
+# 기존 함수의 기본값과 동일
+MAX_SLOPE = 0.05
+MAX_INTERCEPT = 0.1
+MAX_PEAKS = 3
+MIN_PEAK_HEIGHT = 0.1
+MAX_PEAK_HEIGHT = 0.5
+MIN_PEAK_WIDTH = 1.0
+MAX_PEAK_WIDTH = 5.0
+NOISE_LEVEL = 0.02
+
+def draw_params(rng, n, length, lengths=None, n_errors=None,
+                max_slope=MAX_SLOPE, max_intercept=MAX_INTERCEPT, max_peaks=MAX_PEAKS,
+                max_height=MAX_PEAK_HEIGHT, max_width=MAX_PEAK_WIDTH, noise_level=NOISE_LEVEL):
+    """
+    n개 증강본의 오차 파라미터를 뽑습니다.
+    lengths: 행별 실제 길이 (NaN 패딩된 배치에서 피크 위치를 실제 구간 안에서 뽑기 위해 사용)
+    n_errors: None이면 증강본마다 1~3개의 오차를 무작위로, 정수면 정확히 그 개수만큼 적용
+    """
+    lengths = np.full(n, length) if lengths is None else np.broadcast_to(np.asarray(lengths), (n,))
+    if n_errors is None:
+        count = rng.integers(1, len(ERROR_TYPES) + 1, size=n)
+    else:
+        count = np.full(n, n_errors)
+    # 무작위 순위가 count보다 작은 오차만 적용 → 행마다 크기가 count인 무작위 부분집합
+    rank = rng.random((n, len(ERROR_TYPES))).argsort(axis=1).argsort(axis=1)
+    apply = rank < count[:, None]
+
+    num_peaks = rng.integers(1, max_peaks + 1, size=n)
+    params = {
+        'apply': apply,
+        'slope': rng.uniform(-max_slope, max_slope, size=n),
+        'intercept': rng.uniform(-max_intercept, max_intercept, size=n),
+        'num_peaks': num_peaks,
+        'peak_position': np.floor(rng.random((n, max_peaks)) * lengths[:, None]),
+        'peak_height': rng.uniform(MIN_PEAK_HEIGHT, max_height, size=(n, max_peaks)),
+        'peak_width': rng.uniform(MIN_PEAK_WIDTH, max_width, size=(n, max_peaks)),
+        'noise': np.zeros((n, length)),
+    }
+    # 잡음은 적용되는 증강본에만 생성 (가장 비싼 단계)
+    params['noise'][apply[:, 2]] = rng.normal(0.0, noise_level, size=(int(apply[:, 2].sum()), length))
+    # num_peaks 보다 뒤의 피크는 높이 0 (적용 단계에서 분기 없이 처리)
+    params['peak_height'] *= np.arange(max_peaks)[None, :] < num_peaks[:, None]
+    return params
+
+def gaussian_peaks(position, width, height, length, n_sigma=8.0):
+    """
+    가우시안 피크의 합 (n, L). 피크 중심 ±n_sigma*폭 구간만 계산해 bincount로 더합니다
+    (구간 밖 값은 exp(-32) 미만이라 무시). 전체 (n, 피크, L) 배열을 만드는 것보다 훨씬 빠릅니다.
+    구간은 피크마다 자기 폭으로 정하므로, 결과는 같은 배치에 함께 들어간 다른 행과 무관합니다.
+    """
+    n = len(position)
+    half = int(np.ceil(n_sigma * width.max())) if n else 0
+    offsets = np.arange(-half, half + 1)
+    idx = position.astype(np.int64)[:, :, None] + offsets[None, None, :]
+    z = offsets[None, None, :] / width[:, :, None]
+    values = height[:, :, None] * np.exp(-0.5 * z * z)
+    own = np.abs(offsets)[None, None, :] <= np.ceil(n_sigma * width)[:, :, None]
+    inside = (idx >= 0) & (idx < length) & (values != 0) & own
+    flat = (np.arange(n)[:, None, None] * length + idx)[inside]
+    return np.bincount(flat, weights=values[inside], minlength=n * length).reshape(n, length)
+
+def apply_params(flux, params):
+    """(n, L) 플럭스에 draw_params로 뽑은 오차를 더합니다. flux는 (L,)이면 모든 행에 공통으로 사용됩니다."""
+    apply = params['apply']
+    n, length = params['noise'].shape
+    out = np.array(np.broadcast_to(np.asarray(flux, dtype=np.float64), (n, length)))
+    x = np.arange(length, dtype=np.float64)
+
+    # 오차별로 적용되는 행에만 더함 (큰 임시 배열을 줄이기 위해 제자리 연산)
+    rows = apply[:, 0]
+    out[rows] += params['slope'][rows, None] * x[None, :] + params['intercept'][rows, None]
+    rows = apply[:, 1]
+    out[rows] += gaussian_peaks(params['peak_position'][rows], params['peak_width'][rows],
+                           params['peak_height'][rows], length)
+    out += params['noise']  # 잡음이 적용되지 않는 행은 0
+    return out
+
+def concat_params(params_list):
+    """같은 length로 뽑은 draw_params 결과들을 행 방향으로 이어 붙입니다 (apply_params 한 번으로 적용하기 위해)."""
+    return {key: np.concatenate([params[key] for params in params_list]) for key in params_list[0]}
+
+def augment_batch(flux, num_augmentations, rng, lengths=None, n_errors=None, **ranges):
+    """
+    (N, L) 배치의 각 스펙트럼마다 num_augmentations개의 증강본을 만들어 (N, K, L)로 반환합니다.
+    ranges는 draw_params의 오차 범위 인자 (max_slope, noise_level 등) 입니다.
+    """
+    flux = np.asarray(flux, dtype=np.float64)
+    if flux.ndim == 1:
+        flux = flux[None, :]
+    n, length = flux.shape
+    k = num_augmentations
+    if lengths is not None:
+        lengths = np.repeat(np.asarray(lengths), k)
+    params = draw_params(rng, n * k, length, lengths, n_errors, **ranges)
+    augmented = apply_params(np.repeat(flux, k, axis=0), params)
+    return augmented.reshape(n, k, length)
+
+def file_rng(seed, key):
+    """
+    마스터 시드와 파일 식별자(문자열)로 파일별 독립 난수 생성기를 만듭니다.
+    워커 수나 처리 순서와 무관하게 같은 파일은 항상 같은 난수열을 받습니다.
+    """
+    words = np.frombuffer(hashlib.sha1(key.encode('utf-8')).digest()[:16], dtype='<u4')
+    return np.random.default_rng(np.random.SeedSequence([int(seed), *words.tolist()]))
+
+def applied_errors(params, i):
+    """i번째 증강본에 적용된 오차 이름 목록"""
+    return [name for name, on in zip(ERROR_TYPES, params['apply'][i]) if on]
+
+def pad_batch(arrays):
+    """길이가 다른 1차원 배열 목록을 NaN으로 채운 (N, L) 배열과 길이 배열로 만듭니다."""
+    lengths = np.array([len(a) for a in arrays])
+    batch = np.full((len(arrays), lengths.max()), np.nan)
+    for i, a in enumerate(arrays):
+        batch[i, :len(a)] = a
+    return batch, lengths
+
+# --- 기존 구현 (속도 비교용 기준) ---
+# 이전 data_augmenter.py의 파일별 루프를 그대로 옮긴 것입니다. 새 코드에서는 사용하지 마세요.
+
+def add_linear_error(data_series, max_slope=0.05, max_intercept=0.1):
+    num_points = len(data_series)
+    slope = random.uniform(-max_slope, max_slope)
+    intercept = random.uniform(-max_intercept, max_intercept)
+    linear_error = slope * np.arange(num_points) + intercept
+    return data_series + linear_error
+
+def add_peak_error(data_series, num_peaks=1, max_height=0.5, max_width=5.0):
+    power_data = data_series.copy().values
+    num_points = len(power_data)
+    for _ in range(num_peaks):
+        peak_position = random.randint(0, num_points - 1)
+        peak_height = random.uniform(0.1, max_height)
+        peak_width = random.uniform(1.0, max_width)
+        x = np.arange(num_points)
+        peak = peak_height * np.exp(-((x - peak_position) ** 2) / (2 * peak_width ** 2))
+        power_data += peak
+    return pd.Series(power_data, index=data_series.index)
+
+def add_random_noise(data_series, noise_level=0.02):
+    noise = np.random.normal(0, noise_level, len(data_series))
+    return data_series + noise
+
+def reference_augment(power_data, num_augmentations=5):
+    """기존 파일별 증강 루프 (pandas Series 입력, 열 목록 반환)"""
+    columns = []
+    for i in range(num_augmentations):
+        augmented_power = power_data.copy()
+        error_functions = [add_linear_error, add_peak_error, add_random_noise]
+        num_errors_to_apply = random.randint(1, len(error_functions))
+        chosen_errors = random.sample(error_functions, num_errors_to_apply)
+
+        for error_func in chosen_errors:
+            if error_func == add_peak_error:
+                augmented_power = error_func(augmented_power, num_peaks=random.randint(1, 3))
+            else:
+                augmented_power = error_func(augmented_power)
+        columns.append(augmented_power)
+    return columns
+
+def benchmark(fluxes, num_augmentations=5, seed=0):
+    """기존 파일별 루프와 augment_batch의 처리 시간을 비교해 출력합니다."""
+    series = [pd.Series(f) for f in fluxes]
+    start = time.perf_counter()
+    for s in series:
+        reference_augment(s, num_augmentations)
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch, lengths = pad_batch(fluxes)
+    augment_batch(batch, num_augmentations, np.random.default_rng(seed), lengths)
+    batch_s = time.perf_counter() - start
+
+    n = len(fluxes) * num_augmentations
+    print(f"{len(fluxes)}개 스펙트럼 x {num_augmentations}개 증강")
+    print(f"  기존 루프   : {loop_s:.3f}s ({n / loop_s:,.0f} spectra/s)")
+    print(f"  augment_batch: {batch_s:.3f}s ({n / batch_s:,.0f} spectra/s), {loop_s / batch_s:.1f}배")
+    return loop_s, batch_s
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+        from module.spectrum_cache import load_spectrum
+        files = [p for d in sys.argv[1:] for p in glob.glob(os.path.join(d, '*.csv'))]
+        fluxes = [np.asarray(load_spectrum(p), dtype=np.float64)[:, 1] for p in files]
+    else:
+        # 데이터가 없으면 MaNGA와 비슷한 길이의 합성 스펙트럼 사용
+        rng = np.random.default_rng(0)
+        fluxes = [rng.normal(0, 0.01, 1400 + int(d)) for d in rng.integers(0, 200, 1000)]
+    benchmark(fluxes)
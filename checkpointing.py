@@ -0,0 +1,128 @@
+"""
+비동기 체크포인트 저장 (train_denoiser.py의 train_model에서 사용)
+
+- 저장 요청 시 state_dict를 CPU 텐서로 복사(스냅샷)만 하고, 직렬화와 디스크 쓰기는 백그라운드 스레드가 합니다.
+- 파일은 임시 파일에 쓴 뒤 os.replace로 교체하므로 저장 중 중단되어도 기존 파일은 온전히 남습니다.
+- 같은 파일에 대한 저장이 밀려 있으면 최신 스냅샷으로 덮어써서(합치기) 디스크가 느려도 학습이 기다리지 않습니다.
+- 검증 손실 기준 상위 top_k개 에폭 체크포인트(checkpoint_epochXXX.pth)를 남기고 나머지는 지웁니다.
+
+checkpoint.pth / best_model.pth의 형식은 기존과 같습니다 (checkpoint.pth에는 'top_k', 'step' 키가 추가됨).
+"""
+import atexit
+import os
+import threading
+
+import torch
+
+def snapshot(obj):
+    """state_dict(중첩 dict/list 포함)의 텐서를 CPU로 복사합니다. 이후 학습이 값을 바꿔도 스냅샷은 그대로입니다."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: snapshot(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(v) for v in obj)
+    return obj
+
+def atomic_save(obj, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+class AsyncCheckpointer:
+    """
+    save(obj, path)는 스냅샷만 만들고 바로 반환합니다. close()는 밀린 저장을 모두 끝낼 때까지 기다립니다.
+    enabled=False면 아무것도 저장하지 않습니다 (분산 학습에서 rank 0이 아닌 프로세스).
+    """
+    def __init__(self, save_dir, top_k=3, enabled=True):
+        self.save_dir = save_dir
+        self.top_k = top_k
+        self.enabled = enabled
+        self.top = []              # [(검증 손실, 경로)], 손실 오름차순
+        self._jobs = []            # [[경로, 객체]] (객체가 None이면 삭제)
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._error = None
+        if enabled:
+            self._thread = threading.Thread(target=self._worker, name='checkpoint-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _put(self, path, obj):
+        with self._cond:
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise RuntimeError(f"체크포인트 저장 실패: {error}") from error
+            for job in self._jobs:
+                if job[0] == path:
+                    job[1] = obj
+                    break
+            else:
+                self._jobs.append([path, obj])
+            self._cond.notify()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._jobs and not self._closed:
+                    self._cond.wait()
+                if not self._jobs:
+                    return
+                path, obj = self._jobs.pop(0)
+                self._busy = True
+            try:
+                if obj is None:
+                    if os.path.exists(path):
+                        os.remove(path)
+                else:
+                    atomic_save(obj, path)
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def save(self, obj, path):
+        if self.enabled:
+            self._put(path, snapshot(obj))
+
+    def save_epoch(self, checkpoint, checkpoint_path, val_loss, epoch):
+        """
+        에폭 끝 체크포인트: checkpoint_path를 갱신하고, 검증 손실이 상위 top_k 안이면
+        checkpoint_epochXXX.pth로도 저장한 뒤 밀려난 파일은 지웁니다. 스냅샷은 한 번만 만듭니다.
+        """
+        if not self.enabled:
+            return
+        state = snapshot(checkpoint)
+        if self.top_k > 0 and (len(self.top) < self.top_k or val_loss < self.top[-1][0]):
+            path = os.path.join(self.save_dir, f"checkpoint_epoch{epoch + 1:03d}.pth")
+            self._put(path, state)
+            self.top = sorted(self.top + [(val_loss, path)])
+            for _, dropped in self.top[self.top_k:]:
+                self._put(dropped, None)
+            self.top = self.top[:self.top_k]
+        # 이어서 학습할 때 상위 목록을 복원하도록 함께 저장
+        self._put(checkpoint_path, {**state, 'top_k': list(self.top)})
+
+    def flush(self):
+        """밀린 저장이 모두 끝날 때까지 기다립니다."""
+        if not self.enabled:
+            return
+        with self._cond:
+            while self._jobs or self._busy:
+                self._cond.wait()
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise RuntimeError(f"체크포인트 저장 실패: {error}") from error
+
+    def close(self):
+        if not self.enabled or self._closed:
+            return
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
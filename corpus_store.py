@@ -0,0 +1,223 @@
+"""
+MaNGA HI DR3/DR4 스펙트럼 전체를 하나의 청크 압축 HDF5 파일로 묶는 도구입니다.
+
+downloader.py가 내려받은 mangaHI-*.csv 수천 개를 매번 여는 대신, 아래 구조의 단일 파일에서
+인덱스로 바로 읽습니다. 새 데이터 릴리스는 기존 파일 뒤에 이어 붙이므로 전체를 다시 쓰지 않습니다.
+
+    /velocity, /flux, /baseline   모든 스펙트럼을 이어 붙인 1차원 배열 (가변 길이, 청크+gzip)
+    /meta/start, /meta/length     각 스펙트럼의 시작 위치와 길이
+    /meta/plateifu, /meta/release 식별자 (예: '7443-12701', 'dr4')
+    /meta/vmin, /meta/vmax, /meta/snr
+
+사용 예:
+    python corpus_store.py corpus.h5 dr3=predata/dr3 dr4=predata/dr4
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+try:
+    import h5py
+except ImportError:  # h5py는 코퍼스 저장소를 쓸 때만 필요
+    h5py = None
+
+# tools/module 의 공용 스펙트럼 로더(파싱 결과 캐시)를 사용하기 위해 경로 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from module.spectrum_cache import load_spectrum
+from module.snr import line_statistics, pad_spectra
+
+ARRAY_NAMES = ('velocity', 'flux', 'baseline')
+META_COLUMNS = ('start', 'length', 'plateifu', 'release', 'vmin', 'vmax', 'snr')
+CHUNK_SIZE = 64 * 1024
+PLATEIFU_PATTERN = re.compile(r'(\d+-\d+)')
+
+def _require_h5py():
+    if h5py is None:
+        raise ImportError("코퍼스 저장소에는 h5py가 필요합니다: pip install h5py")
+
+def plateifu_from_path(file_path):
+    """'mangaHI-7443-12701.csv' → '7443-12701'"""
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    match = PLATEIFU_PATTERN.search(name)
+    return match.group(1) if match else name
+
+def _create_layout(f):
+    for name in ARRAY_NAMES:
+        f.create_dataset(name, shape=(0,), maxshape=(None,), dtype='f8',
+                         chunks=(CHUNK_SIZE,), compression='gzip', shuffle=True)
+    meta = f.create_group('meta')
+    str_dtype = h5py.string_dtype()
+    for name in META_COLUMNS:
+        dtype = str_dtype if name in ('plateifu', 'release') else ('i8' if name in ('start', 'length') else 'f8')
+        meta.create_dataset(name, shape=(0,), maxshape=(None,), dtype=dtype, chunks=(4096,))
+
+def _append(dataset, values):
+    n = dataset.shape[0]
+    dataset.resize((n + len(values),))
+    dataset[n:] = values
+
+def import_release(store_path, release, csv_dir, batch_size=256):
+    """
+    csv_dir 의 스펙트럼을 release 이름으로 저장소에 추가합니다.
+    이미 같은 (plateifu, release)가 있으면 건너뛰므로 여러 번 실행해도 안전합니다.
+    추가한 스펙트럼 수를 반환합니다.
+    """
+    _require_h5py()
+    files = sorted(glob.glob(os.path.join(csv_dir, '*.csv')))
+    if not files:
+        print(f"경고: {csv_dir} 에서 CSV 파일을 찾을 수 없습니다.")
+        return 0
+
+    with h5py.File(store_path, 'a') as f:
+        if 'meta' not in f:
+            _create_layout(f)
+        meta = f['meta']
+        existing = set(zip(meta['plateifu'].asstr()[:], meta['release'].asstr()[:]))
+        offset = f['flux'].shape[0]
+
+        pending = [p for p in files if (plateifu_from_path(p), release) not in existing]
+        print(f"{release}: {len(files)}개 중 {len(pending)}개를 새로 추가합니다.")
+
+        added = 0
+        for i in tqdm(range(0, len(pending), batch_size), desc=f"Importing {release}"):
+            arrays = {name: [] for name in ARRAY_NAMES}
+            rows = {name: [] for name in META_COLUMNS}
+            for file_path in pending[i:i + batch_size]:
+                try:
+                    data = np.asarray(load_spectrum(file_path), dtype=np.float64)
+                except Exception as e:
+                    print(f"[SKIP] {file_path} - {e}")
+                    continue
+                if data.ndim != 2 or data.shape[1] < 2 or len(data) == 0:
+                    print(f"[SKIP] {file_path} - 열이 부족합니다 {data.shape}")
+                    continue
+                velocity, flux = data[:, 0], data[:, 1]
+                baseline = data[:, 2] if data.shape[1] > 2 else np.full(len(data), np.nan)
+                arrays['velocity'].append(velocity)
+                arrays['flux'].append(flux)
+                arrays['baseline'].append(baseline)
+                rows['start'].append(offset)
+                rows['length'].append(len(data))
+                rows['plateifu'].append(plateifu_from_path(file_path))
+                rows['release'].append(release)
+                rows['vmin'].append(np.nanmin(velocity))
+                rows['vmax'].append(np.nanmax(velocity))
+                offset += len(data)
+            if not rows['start']:
+                continue
+            # SNR은 카탈로그와 같은 선 통계(선이 없는 영역의 MAD 잡음 기준)로 배치 단위 계산
+            velocity, flux, valid = pad_spectra(list(zip(arrays['velocity'], arrays['flux'])))
+            rows['snr'] = line_statistics(velocity, flux, valid)['peak_snr']
+            for name in ARRAY_NAMES:
+                _append(f[name], np.concatenate(arrays[name]))
+            for name in META_COLUMNS:
+                _append(meta[name], np.asarray(rows[name], dtype=object if name in ('plateifu', 'release') else None))
+            added += len(rows['start'])
+    return added
+
+class CorpusStore:
+    """
+    코퍼스 저장소의 임의 접근 리더입니다.
+    파일은 처음 접근할 때 열리므로 DataLoader 워커마다 따로 열립니다 (fork 후 핸들 공유 방지).
+    """
+    def __init__(self, store_path):
+        _require_h5py()
+        self.store_path = store_path
+        self._file = None
+        self._pid = None
+        with h5py.File(store_path, 'r') as f:
+            meta = f['meta']
+            self.start = meta['start'][:]
+            self.length = meta['length'][:]
+            self.plateifu = meta['plateifu'].asstr()[:]
+            self.release = meta['release'].asstr()[:]
+        # plateifu → 행 번호 목록 (릴리스 추가 순서). O(1) 조회용
+        self.index = {}
+        for i, key in enumerate(self.plateifu):
+            self.index.setdefault(key, []).append(i)
+
+    def _handle(self):
+        if self._file is None or self._pid != os.getpid():
+            self._file = h5py.File(self.store_path, 'r')
+            self._pid = os.getpid()
+        return self._file
+
+    def __len__(self):
+        return len(self.start)
+
+    def __getitem__(self, i):
+        f = self._handle()
+        s = slice(int(self.start[i]), int(self.start[i] + self.length[i]))
+        item = {name: f[name][s] for name in ARRAY_NAMES}
+        item['plateifu'] = self.plateifu[i]
+        item['release'] = self.release[i]
+        return item
+
+    def find(self, plateifu, release=None):
+        """plateifu 의 행 번호를 반환합니다. release가 없으면 가장 나중에 추가된 릴리스를 사용합니다."""
+        rows = self.index.get(plateifu)
+        if not rows:
+            raise KeyError(plateifu)
+        if release is None:
+            return rows[-1]
+        for i in rows:
+            if self.release[i] == release:
+                return i
+        raise KeyError(f"{plateifu} ({release})")
+
+    def get(self, plateifu, release=None):
+        return self[self.find(plateifu, release)]
+
+    def metadata(self):
+        """스펙트럼별 메타데이터 표를 DataFrame으로 반환합니다."""
+        f = self._handle()
+        meta = f['meta']
+        return pd.DataFrame({
+            name: (meta[name].asstr()[:] if name in ('plateifu', 'release') else meta[name][:])
+            for name in META_COLUMNS
+        })
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_file'] = None
+        return state
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MaNGA HI CSV 코퍼스를 단일 HDF5 저장소로 변환")
+    parser.add_argument('store', help="HDF5 저장소 경로 (없으면 생성)")
+    parser.add_argument('releases', nargs='+', help="릴리스이름=CSV디렉토리 (예: dr4=predata/dr4)")
+    args = parser.parse_args(argv)
+
+    for spec in args.releases:
+        if '=' in spec:
+            release, csv_dir = spec.split('=', 1)
+        else:
+            csv_dir = spec
+            release = os.path.basename(os.path.normpath(spec))
+        added = import_release(args.store, release, csv_dir)
+        print(f"{release}: {added}개 스펙트럼 추가 완료")
+
+    with CorpusStore(args.store) as store:
+        meta = store.metadata()
+        print(f"저장소 '{args.store}': 총 {len(store)}개 스펙트럼")
+        print(meta.groupby('release')['length'].describe())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+실제 SDR 관측에서 보이는 오차를 흉내 내는 배치 손상(corruption) 라이브러리
+
+augmentation.py의 linear/peak/noise 외에 main_pipeline.py 캡처에서 실제로 보이는 효과를 추가합니다.
+모든 효과는 (N, L) 배열에 한 번에 적용되며, 증강본마다 효과별 확률로 무작위 조합을 고릅니다.
+
+    ripple      : 정재파(standing wave) 리플. (1 + a sin(2πx/P + φ)) 곱
+    bandpass    : 대역 양 끝의 통과대역 감쇠 (시그모이드 테이퍼) 곱
+    gain_drift  : 채널 방향의 완만한 이득 변화 (2차 다항식) 곱
+    rfi_comb    : 일정 간격의 좁은 RFI 빗살 (1~6개) 합
+    dc_spike    : RTL-SDR 중심 주파수(DC)의 스파이크 합
+    tilt, peaks, noise : augmentation.py와 같은 기존 오차 (분포도 동일)
+    quantization: ADC 비트 수에 따른 양자화 (마지막에 적용)
+
+곱해지는 효과가 먼저, 더해지는 효과가 다음, 양자화가 마지막입니다 (실제 신호 경로 순서).
+더해지는 새 효과(rfi_comb, dc_spike)의 세기는 스펙트럼별 표준편차(scale) 단위입니다.
+
+사용 예:
+    rng = np.random.default_rng(0)
+    params = draw_params(rng, n, length)                 # 파라미터 추출
+    corrupted = apply_params(flux, params)                # 적용
+    corrupted = corrupt_batch(flux, 5, rng, effects=('ripple', 'dc_spike', 'noise'))   # (N, 5, L)
+
+    python corruptions.py   # 처리 속도 측정
+"""
+import sys
+import time
+
+import numpy as np
+
+import augmentation
+from augmentation import gaussian_peaks
+
+EFFECTS = ('ripple', 'bandpass', 'gain_drift', 'rfi_comb', 'dc_spike', 'tilt', 'peaks', 'noise', 'quantization')
+
+# 효과별 적용 확률
+PROBABILITIES = {
+    'ripple': 0.5,
+    'bandpass': 0.5,
+    'gain_drift': 0.5,
+    'rfi_comb': 0.3,
+    'dc_spike': 0.4,
+    'tilt': 0.5,
+    'peaks': 0.5,
+    'noise': 0.8,
+    'quantization': 0.2,
+}
+
+# 효과별 파라미터 분포 (균등분포 구간, 'log'가 붙은 것은 로그 균등)
+RANGES = {
+    'ripple': {'amplitude': (0.005, 0.05), 'log_period_frac': (1 / 40, 1 / 2)},   # 주기: 전체 길이 대비
+    'bandpass': {'depth': (0.2, 0.9), 'edge_frac': (0.02, 0.12), 'softness_frac': (0.005, 0.03)},
+    'gain_drift': {'offset_std': 0.05, 'slope_std': 0.03, 'curvature_std': 0.02},
+    'rfi_comb': {'teeth': (1, 6), 'log_spacing': (8, 256), 'amplitude': (1.0, 10.0), 'width': (0.5, 1.5)},
+    'dc_spike': {'amplitude': (2.0, 20.0), 'width': (0.5, 2.0), 'jitter': 2},
+    'tilt': {'max_slope': augmentation.MAX_SLOPE, 'max_intercept': augmentation.MAX_INTERCEPT},
+    'peaks': {'max_peaks': augmentation.MAX_PEAKS,
+              'height': (augmentation.MIN_PEAK_HEIGHT, augmentation.MAX_PEAK_HEIGHT),
+              'width': (augmentation.MIN_PEAK_WIDTH, augmentation.MAX_PEAK_WIDTH)},
+    'noise': {'level': augmentation.NOISE_LEVEL},
+    'quantization': {'bits': (4, 8)},
+}
+
+MULTIPLICATIVE = ('ripple', 'bandpass', 'gain_drift')
+ADDITIVE = ('rfi_comb', 'dc_spike', 'tilt', 'peaks', 'noise')
+
+def _merge_ranges(ranges):
+    merged = {name: dict(values) for name, values in RANGES.items()}
+    for name, values in (ranges or {}).items():
+        merged[name].update(values)
+    return merged
+
+def _log_uniform(rng, low, high, size):
+    return np.exp(rng.uniform(np.log(low), np.log(high), size=size))
+
+def draw_params(rng, n, length, lengths=None, effects=EFFECTS, probabilities=None, ranges=None):
+    """
+    n개 손상본의 파라미터를 뽑습니다.
+    effects: 사용할 효과 이름 목록. 증강본마다 효과별 확률로 켜지며, 하나도 켜지지 않은 행은 하나를 무작위로 켭니다.
+    probabilities, ranges: PROBABILITIES / RANGES 중 바꿀 항목만 담은 딕셔너리
+    """
+    unknown = set(effects) - set(EFFECTS)
+    if unknown:
+        raise ValueError(f"알 수 없는 효과: {sorted(unknown)} (가능: {', '.join(EFFECTS)})")
+    prob = dict(PROBABILITIES, **(probabilities or {}))
+    r = _merge_ranges(ranges)
+    lengths = np.full(n, length) if lengths is None else np.broadcast_to(np.asarray(lengths), (n,))
+
+    effects = tuple(effects)
+    on = rng.random((n, len(effects))) < np.array([prob[name] for name in effects])
+    none = ~on.any(axis=1)
+    on[none, rng.integers(0, len(effects), size=int(none.sum()))] = True
+    params = {'length': length, 'lengths': lengths, 'apply': {name: on[:, i] for i, name in enumerate(effects)}}
+
+    def rows(name):
+        return int(params['apply'][name].sum())
+
+    # 효과별 파라미터는 켜진 행에 대해서만 뽑습니다 (값의 개수 = 켜진 행 수)
+    if 'ripple' in effects:
+        m = rows('ripple')
+        params['ripple'] = {
+            'amplitude': rng.uniform(*r['ripple']['amplitude'], size=m),
+            'period': _log_uniform(rng, *r['ripple']['log_period_frac'], m) * lengths[params['apply']['ripple']],
+            'phase': rng.uniform(0, 2 * np.pi, size=m),
+        }
+    if 'bandpass' in effects:
+        m = rows('bandpass')
+        params['bandpass'] = {
+            'depth': rng.uniform(*r['bandpass']['depth'], size=(m, 2)),   # 왼쪽/오른쪽 끝
+            'edge': rng.uniform(*r['bandpass']['edge_frac'], size=(m, 2)),
+            'softness': rng.uniform(*r['bandpass']['softness_frac'], size=(m, 2)),
+        }
+    if 'gain_drift' in effects:
+        m = rows('gain_drift')
+        g = r['gain_drift']
+        params['gain_drift'] = {
+            'coeffs': rng.normal(0.0, 1.0, size=(m, 3)) * np.array([g['offset_std'], g['slope_std'], g['curvature_std']]),
+        }
+    if 'rfi_comb' in effects:
+        m = rows('rfi_comb')
+        c = r['rfi_comb']
+        max_teeth = c['teeth'][1]
+        teeth = rng.integers(c['teeth'][0], max_teeth + 1, size=m)
+        row_len = lengths[params['apply']['rfi_comb']]
+        spacing = _log_uniform(rng, *c['log_spacing'], m)
+        start = rng.random(m) * row_len
+        position = start[:, None] + spacing[:, None] * np.arange(max_teeth)[None, :]
+        height = rng.uniform(*c['amplitude'], size=(m, max_teeth))
+        height *= (np.arange(max_teeth)[None, :] < teeth[:, None]) & (position < row_len[:, None])
+        params['rfi_comb'] = {
+            'position': np.floor(np.minimum(position, row_len[:, None] - 1)),
+            'height': height,
+            'width': rng.uniform(*c['width'], size=(m, max_teeth)),
+        }
+    if 'dc_spike' in effects:
+        m = rows('dc_spike')
+        d = r['dc_spike']
+        center = lengths[params['apply']['dc_spike']] // 2
+        params['dc_spike'] = {
+            'position': (center + rng.integers(-d['jitter'], d['jitter'] + 1, size=m))[:, None].astype(np.float64),
+            'height': rng.uniform(*d['amplitude'], size=(m, 1)),
+            'width': rng.uniform(*d['width'], size=(m, 1)),
+        }
+    if 'tilt' in effects:
+        m = rows('tilt')
+        params['tilt'] = {
+            'slope': rng.uniform(-r['tilt']['max_slope'], r['tilt']['max_slope'], size=m),
+            'intercept': rng.uniform(-r['tilt']['max_intercept'], r['tilt']['max_intercept'], size=m),
+        }
+    if 'peaks' in effects:
+        m = rows('peaks')
+        p = r['peaks']
+        num_peaks = rng.integers(1, p['max_peaks'] + 1, size=m)
+        height = rng.uniform(*p['height'], size=(m, p['max_peaks']))
+        height *= np.arange(p['max_peaks'])[None, :] < num_peaks[:, None]
+        params['peaks'] = {
+            'position': np.floor(rng.random((m, p['max_peaks'])) * lengths[params['apply']['peaks']][:, None]),
+            'height': height,
+            'width': rng.uniform(*p['width'], size=(m, p['max_peaks'])),
+        }
+    if 'noise' in effects:
+        params['noise'] = {'values': r['noise']['level'] * rng.standard_normal(size=(rows('noise'), length), dtype=np.float32)}
+    if 'quantization' in effects:
+        params['quantization'] = {'bits': rng.integers(r['quantization']['bits'][0], r['quantization']['bits'][1] + 1,
+                                                       size=rows('quantization'))}
+    return params
+
+def _multiplicative_gain(name, p, u):
+    """켜진 행의 (m, L) 곱 인자. u는 행별로 [0, 1]로 정규화한 채널 위치"""
+    if name == 'ripple':
+        period_u = p['period'][:, None] / np.maximum(p['_row_len'][:, None] - 1, 1)
+        return 1.0 + p['amplitude'][:, None] * np.sin(2 * np.pi * u / period_u + p['phase'][:, None])
+    if name == 'bandpass':
+        # 지수 인자를 잘라 float32 overflow 경고를 막음 (±60이면 시그모이드는 이미 0 또는 1)
+        left = 1.0 / (1.0 + np.exp(np.clip(-(u - p['edge'][:, 0:1]) / p['softness'][:, 0:1], -60, 60)))
+        right = 1.0 / (1.0 + np.exp(np.clip((u - (1.0 - p['edge'][:, 1:2])) / p['softness'][:, 1:2], -60, 60)))
+        return (1.0 - p['depth'][:, 0:1] * (1.0 - left)) * (1.0 - p['depth'][:, 1:2] * (1.0 - right))
+    if name == 'gain_drift':
+        t = u - 0.5
+        c = p['coeffs']
+        return 1.0 + c[:, 0:1] + c[:, 1:2] * t + c[:, 2:3] * t * t
+    raise ValueError(name)
+
+def apply_params(flux, params, dtype=np.float32):
+    """
+    draw_params로 뽑은 손상을 (n, L) 플럭스에 적용합니다. flux가 (L,)이면 모든 행에 공통으로 사용됩니다.
+    학습용으로는 float32(기본)가 충분하고 빠르며, 파일로 저장할 때는 dtype=np.float64를 쓰세요.
+    """
+    apply = params['apply']
+    n = len(params['lengths'])
+    length = params['length']
+    out = np.array(np.broadcast_to(np.asarray(flux, dtype=dtype), (n, length)))
+    lengths = params['lengths']
+    x = np.arange(length, dtype=dtype)
+
+    # 더해지는 새 효과의 세기 기준: 손상 전 스펙트럼의 표준편차 (NaN 패딩이 있을 때만 nanstd)
+    scale = None
+    if any(name in apply and apply[name].any() for name in ('rfi_comb', 'dc_spike')):
+        scale = np.nanstd(out, axis=1) if np.isnan(out).any() else out.std(axis=1)
+        scale = np.where(np.isfinite(scale) & (scale > 0), scale, 1.0).astype(dtype)
+
+    for name in MULTIPLICATIVE:
+        if name not in apply or not apply[name].any():
+            continue
+        rows = apply[name]
+        p = dict(params[name], _row_len=lengths[rows])
+        p = {key: value.astype(dtype) for key, value in p.items()}
+        u = x[None, :] / np.maximum(p['_row_len'][:, None] - 1, 1)
+        out[rows] *= _multiplicative_gain(name, p, u)
+
+    for name in ADDITIVE:
+        if name not in apply or not apply[name].any():
+            continue
+        rows = apply[name]
+        p = params[name]
+        if name in ('rfi_comb', 'dc_spike'):
+            out[rows] += scale[rows, None] * gaussian_peaks(p['position'], p['width'], p['height'], length).astype(dtype)
+        elif name == 'peaks':
+            out[rows] += gaussian_peaks(p['position'], p['width'], p['height'], length).astype(dtype)
+        elif name == 'tilt':
+            out[rows] += (p['slope'][:, None] * x[None, :] + p['intercept'][:, None]).astype(dtype)
+        elif name == 'noise':
+            out[rows] += p['values']
+
+    if 'quantization' in apply and apply['quantization'].any():
+        rows = apply['quantization']
+        sub = out[rows]
+        lo = np.nanmin(sub, axis=1, keepdims=True)
+        span = np.nanmax(sub, axis=1, keepdims=True) - lo
+        step = (np.where(span > 0, span, 1.0) / (2.0 ** params['quantization']['bits'][:, None] - 1)).astype(dtype)
+        out[rows] = lo + np.round((sub - lo) / step) * step
+    return out
+
+def concat_params(params_list):
+    """
+    같은 length로 뽑은 draw_params 결과들을 행 방향으로 이어 붙입니다 (apply_params 한 번으로 적용하기 위해).
+    효과별 값은 켜진 행 순서대로 저장되어 있으므로 그대로 이어 붙이면 합친 apply 마스크와 순서가 맞습니다.
+    """
+    first = params_list[0]
+    if any(params['length'] != first['length'] for params in params_list):
+        raise ValueError("length가 같은 파라미터만 이어 붙일 수 있습니다.")
+    merged = {
+        'length': first['length'],
+        'lengths': np.concatenate([params['lengths'] for params in params_list]),
+        'apply': {name: np.concatenate([params['apply'][name] for params in params_list]) for name in first['apply']},
+    }
+    for name in first['apply']:
+        merged[name] = {key: np.concatenate([params[name][key] for params in params_list]) for key in first[name]}
+    return merged
+
+def corrupt_batch(flux, num_augmentations, rng, lengths=None, dtype=np.float32, **kwargs):
+    """(N, L) 배치의 스펙트럼마다 손상본 K개를 만들어 (N, K, L)로 반환합니다. kwargs는 draw_params 인자입니다."""
+    flux = np.asarray(flux, dtype=dtype)
+    if flux.ndim == 1:
+        flux = flux[None, :]
+    n, length = flux.shape
+    k = num_augmentations
+    if lengths is not None:
+        lengths = np.repeat(np.asarray(lengths), k)
+    params = draw_params(rng, n * k, length, lengths, **kwargs)
+    return apply_params(np.repeat(flux, k, axis=0), params, dtype).reshape(n, k, length)
+
+def applied_effects(params, i):
+    """i번째 손상본에 적용된 효과 이름 목록"""
+    return [name for name, on in params['apply'].items() if on[i]]
+
+def benchmark(n=20000, length=1024, batch=4096, seed=0):
+    """합성 스펙트럼으로 처리 속도(spectra/min)를 측정해 출력합니다."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(-1, 1, length)
+    clean = np.exp(-0.5 * (x[None, :] / rng.uniform(0.02, 0.1, size=(batch, 1))) ** 2)
+    start = time.perf_counter()
+    done = 0
+    while done < n:
+        apply_params(clean, draw_params(rng, batch, length))
+        done += batch
+    elapsed = time.perf_counter() - start
+    print(f"{done}개 x {length}채널: {elapsed:.2f}s ({done / elapsed * 60 / 1e6:.2f}M spectra/min)")
+    for name in EFFECTS:
+        start = time.perf_counter()
+        apply_params(clean, draw_params(rng, batch, length, effects=(name,)))
+        print(f"  {name:12s}: {(time.perf_counter() - start) / batch * 1e6:.1f} us/spectrum")
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
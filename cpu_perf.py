@@ -0,0 +1,159 @@
+"""
+GPU 없는 학습 장비를 위한 CPU 성능 모드 (train_denoiser.py의 train_model(cpu_perf=...) 에서 사용)
+
+    bf16          : bfloat16 autocast ('auto'면 CPU가 AVX512-BF16/AMX를 지원할 때만 켬)
+    compile       : torch.compile(UNet1D) (inductor, C++ 컴파일러 필요. 첫 배치에서 컴파일 시간이 듦)
+    intra_op_threads / inter_op_threads : torch 스레드 수 (None이면 기본값 유지)
+    guard_tolerance, guard_batches : 정확도 가드. 첫 검증 때 앞쪽 guard_batches개 배치의 손실을
+                    fp32 eager 결과와 비교해 상대 차이가 guard_tolerance를 넘으면 bf16을 끕니다.
+
+채널 우선(channels-last) 메모리 배치는 4차원(NCHW) 텐서에만 정의되어 Conv1d에는 적용할 수 없으므로 제공하지 않습니다.
+체크포인트와 best_model.pth는 항상 컴파일 전 원래 모델의 state_dict로 저장되어 기존 파일과 호환됩니다.
+
+사용 예:
+    train_model(..., cpu_perf={'bf16': 'auto', 'compile': True, 'intra_op_threads': 16})
+    python cpu_perf.py   # 설정별 학습 처리량(samples/s)과 fp32 대비 손실 차이 비교
+"""
+import contextlib
+import copy
+import time
+
+import torch
+import torch.nn as nn
+
+DEFAULTS = {
+    'bf16': 'auto',
+    'compile': False,
+    'intra_op_threads': None,
+    'inter_op_threads': None,
+    'guard_tolerance': 0.02,
+    'guard_batches': 4,
+}
+
+def bf16_supported():
+    """oneDNN이 이 CPU에서 bfloat16 연산을 하드웨어로 지원하는지"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        try:
+            with open('/proc/cpuinfo', 'r') as f:
+                flags = f.read()
+            return 'avx512_bf16' in flags or 'amx_bf16' in flags
+        except OSError:
+            return False
+
+def setup_cpu_perf(cpu_perf, device=torch.device('cpu')):
+    """설정 딕셔너리에 기본값을 채우고 스레드 수를 적용한 뒤 최종 설정을 반환합니다."""
+    perf = {**DEFAULTS, **(cpu_perf or {})}
+    if perf['bf16'] == 'auto':
+        perf['bf16'] = bf16_supported()
+    perf['bf16'] = bool(perf['bf16']) and device.type == 'cpu'
+
+    if perf['intra_op_threads']:
+        torch.set_num_threads(perf['intra_op_threads'])
+    if perf['inter_op_threads']:
+        try:
+            torch.set_num_interop_threads(perf['inter_op_threads'])
+        except RuntimeError as e:
+            # 병렬 작업이 한 번이라도 실행된 뒤에는 바꿀 수 없음
+            print(f"inter-op 스레드 수를 바꿀 수 없습니다: {e}")
+    print(f"CPU perf mode: bf16={perf['bf16']}, compile={perf['compile']}, "
+          f"threads={torch.get_num_threads()}/{torch.get_num_interop_threads()} (intra/inter)")
+    return perf
+
+def prepare_model(model, perf):
+    """학습/검증에서 호출할 모델을 반환합니다 (compile이면 컴파일된 래퍼, 가중치는 model과 공유)."""
+    if perf is not None and perf['compile']:
+        return torch.compile(model)
+    return model
+
+def autocast_context(perf, device):
+    if perf is None or not perf['bf16']:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+
+def check_accuracy(model, forward, loader, criterion, device, perf):
+    """
+    앞쪽 guard_batches개 검증 배치에서 fp32 eager 손실과 성능 모드 손실을 비교합니다.
+    상대 차이가 허용치를 넘으면 perf['bf16']을 끄고, (fp32 손실, 성능 모드 손실)을 반환합니다.
+    """
+    fp32_loss, perf_loss, n = 0.0, 0.0, 0
+    was_training = model.training
+    model.eval()
+    with torch.no_grad():
+        for inputs, targets in loader:
+            if inputs.nelement() == 0: continue
+            inputs, targets = inputs.to(device), targets.to(device)
+            fp32_loss += criterion(model(inputs), targets).item()
+            with autocast_context(perf, device):
+                perf_loss += criterion(forward(inputs).float(), targets).item()
+            n += 1
+            if n >= perf['guard_batches']:
+                break
+    model.train(was_training)
+    if n == 0:
+        return None, None
+    fp32_loss, perf_loss = fp32_loss / n, perf_loss / n
+    rel = abs(perf_loss - fp32_loss) / max(abs(fp32_loss), 1e-12)
+    print(f"Accuracy guard: fp32 loss {fp32_loss:.6f}, perf-mode loss {perf_loss:.6f} (rel. diff {rel:.3%})")
+    if perf['bf16'] and rel > perf['guard_tolerance']:
+        print(f"  허용치({perf['guard_tolerance']:.0%})를 넘어 bf16 autocast를 끄고 fp32로 학습합니다.")
+        perf['bf16'] = False
+    return fp32_loss, perf_loss
+
+# --- 설정별 처리량 비교 ---
+
+BENCHMARK_CONFIGS = {
+    'fp32 eager': {'bf16': False},
+    'bf16 eager': {'bf16': True},
+    'fp32 compile': {'bf16': False, 'compile': True},
+    'bf16 compile': {'bf16': True, 'compile': True},
+}
+
+def benchmark(configs=BENCHMARK_CONFIGS, batch_size=256, length=1024, steps=5, warmup=2, seed=0):
+    """
+    같은 초기 가중치와 같은 합성 배치로 설정마다 학습 스텝 처리량을 재고,
+    fp32 eager 대비 평가 손실 차이(정확도)를 함께 출력합니다.
+    """
+    from train_denoiser import UNet1D
+    device = torch.device('cpu')
+    torch.manual_seed(seed)
+    base = UNet1D(in_channels=1, out_channels=1)
+    targets = torch.randn(batch_size, 1, length).cumsum(-1) / length ** 0.5
+    inputs = targets + 0.05 * torch.randn_like(targets)
+    criterion = nn.MSELoss()
+    with torch.no_grad():
+        reference = criterion(base.eval()(inputs), targets).item()
+
+    results = {}
+    for name, cpu_perf in configs.items():
+        perf = setup_cpu_perf(cpu_perf, device)
+        model = copy.deepcopy(base).train()
+        forward = prepare_model(model, perf)
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-5)
+        try:
+            for step in range(warmup + steps):
+                if step == warmup:
+                    start = time.perf_counter()
+                optimizer.zero_grad()
+                with autocast_context(perf, device):
+                    loss = criterion(forward(inputs).float(), targets)
+                loss.backward()
+                optimizer.step()
+            seconds = time.perf_counter() - start
+        except Exception as e:
+            print(f"{name}: 실패 ({type(e).__name__}: {e})")
+            continue
+
+        # 정확도: 학습 전 가중치로 fp32 eager와 같은 입력의 평가 손실 비교
+        eval_model = copy.deepcopy(base).eval()
+        eval_forward = prepare_model(eval_model, perf)
+        with torch.no_grad(), autocast_context(perf, device):
+            loss = criterion(eval_forward(inputs).float(), targets).item()
+        results[name] = {'samples_per_s': batch_size * steps / seconds, 'loss_rel_diff': abs(loss - reference) / reference}
+        print(f"{name:>14}: {results[name]['samples_per_s']:8.1f} samples/s, "
+              f"eval loss rel. diff vs fp32 {results[name]['loss_rel_diff']:.3%}")
+    return results
+
+if __name__ == '__main__':
+    benchmark()
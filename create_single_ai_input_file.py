@@ -1,42 +1,22 @@
 import pandas as pd
 import numpy as np
 import os
-import random
 import tkinter as tk
 from tkinter import filedialog
-
-# --- 오차 생성 함수 (data_augmenter.py와 동일) ---
-
-def add_linear_error(data_series, max_slope=0.05, max_intercept=0.1):
-    num_points = len(data_series)
-    slope = random.uniform(-max_slope, max_slope)
-    intercept = random.uniform(-max_intercept, max_intercept)
-    linear_error = slope * np.arange(num_points) + intercept
-    return data_series + linear_error
-
-def add_peak_error(data_series, num_peaks=1, max_height=0.5, max_width=5.0):
-    power_data = data_series.copy().values
-    num_points = len(power_data)
-    for _ in range(num_peaks):
-        peak_position = random.randint(0, num_points - 1)
-        peak_height = random.uniform(0.1, max_height)
-        peak_width = random.uniform(1.0, max_width)
-        x = np.arange(num_points)
-        peak = peak_height * np.exp(-((x - peak_position) ** 2) / (2 * peak_width ** 2))
-        power_data += peak
-    return pd.Series(power_data, index=data_series.index)
-
-def add_random_noise(data_series, noise_level=0.02):
-    noise = np.random.normal(0, noise_level, len(data_series))
-    return data_series + noise
+import sys
+# tools/module 의 공용 스펙트럼 로더(파싱 결과 캐시)를 사용하기 위해 경로 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from module.spectrum_cache import load_spectrum
+# 오차 생성은 data_augmenter.py와 같은 augmentation 모듈을 사용
+from augmentation import draw_params, apply_params, applied_errors
 
 # --- 메인 처리 함수 ---
 
-def create_ai_input_file(input_path, output_path):
+def create_ai_input_file(input_path, output_path, seed=None):
     """단일 원본 파일을 읽어 하나의 무작위 오차를 적용한 AI 입력 파일을 생성합니다."""
     print(f"Reading original file: {input_path}")
     try:
-        original_df = pd.read_csv(input_path, sep=r'\s+', header=None, comment='#')
+        original_df = pd.DataFrame(load_spectrum(input_path))
     except Exception as e:
         print(f"Error reading file: {e}")
         return
@@ -46,23 +26,14 @@ def create_ai_input_file(input_path, output_path):
         return
 
     velocity_data = original_df.iloc[:, 0] # 1번째 열 'velocity'
-    flux_data = original_df.iloc[:, 1]     # 2번째 열 'flux'
+    flux_data = original_df.iloc[:, 1].values.astype(np.float64) # 2번째 열 'flux'
 
-    # 무작위로 하나의 오차 함수 선택
-    error_functions = [
-        add_linear_error,
-        add_peak_error,
-        add_random_noise
-    ]
-    chosen_error_func = random.choice(error_functions)
-    
-    print(f"Applying random error: {chosen_error_func.__name__}")
+    # 무작위로 하나의 오차 종류 선택 (linear, peak, noise 중 하나)
+    params = draw_params(np.random.default_rng(seed), 1, len(flux_data), n_errors=1)
+    print(f"Applying random error: {', '.join(applied_errors(params, 0))}")
 
-    # 선택된 오차 함수 적용
-    if chosen_error_func == add_peak_error:
-        noisy_flux = chosen_error_func(flux_data, num_peaks=random.randint(1, 3))
-    else:
-        noisy_flux = chosen_error_func(flux_data)
+    # 선택된 오차 적용
+    noisy_flux = apply_params(flux_data, params)[0]
     
     # AI 입력 형식에 맞게 velocity와 noisy_flux만 포함하는 DataFrame 생성
     output_df = pd.DataFrame({'velocity': velocity_data, 'noisy_flux': noisy_flux})
@@ -1,42 +1,22 @@
 import pandas as pd
 import numpy as np
 import os
-import random
 import tkinter as tk
 from tkinter import filedialog
-
-# --- 오차 생성 함수 (data_augmenter.py와 동일) ---
-
-def add_linear_error(data_series, max_slope=0.05, max_intercept=0.1):
-    num_points = len(data_series)
-    slope = random.uniform(-max_slope, max_slope)
-    intercept = random.uniform(-max_intercept, max_intercept)
-    linear_error = slope * np.arange(num_points) + intercept
-    return data_series + linear_error
-
-def add_peak_error(data_series, num_peaks=1, max_height=0.5, max_width=5.0):
-    power_data = data_series.copy().values
-    num_points = len(power_data)
-    for _ in range(num_peaks):
-        peak_position = random.randint(0, num_points - 1)
-        peak_height = random.uniform(0.1, max_height)
-        peak_width = random.uniform(1.0, max_width)
-        x = np.arange(num_points)
-        peak = peak_height * np.exp(-((x - peak_position) ** 2) / (2 * peak_width ** 2))
-        power_data += peak
-    return pd.Series(power_data, index=data_series.index)
-
-def add_random_noise(data_series, noise_level=0.02):
-    noise = np.random.normal(0, noise_level, len(data_series))
-    return data_series + noise
+import sys
+# tools/module 의 공용 스펙트럼 로더(파싱 결과 캐시)를 사용하기 위해 경로 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from module.spectrum_cache import load_spectrum
+# 오차 생성은 data_augmenter.py와 같은 augmentation 모듈을 사용
+from augmentation import augment_batch
 
 # --- 메인 처리 함수 ---
 
-def augment_single_file(input_path, output_path, num_augmentations=5):
+def augment_single_file(input_path, output_path, num_augmentations=5, seed=None):
     """단일 원본 파일을 읽어 5개의 증강 열을 추가하고 저장합니다."""
     print(f"Reading original file: {input_path}")
     try:
-        original_df = pd.read_csv(input_path, sep=r'\s+', header=None, comment='#')
+        original_df = pd.DataFrame(load_spectrum(input_path))
     except Exception as e:
         print(f"Error reading file: {e}")
         return
@@ -45,23 +25,13 @@ def augment_single_file(input_path, output_path, num_augmentations=5):
         print(f"Error: Input file must have at least 3 columns (velocity, flux, prebaselineflux).")
         return
 
-    power_data_to_augment = original_df.iloc[:, 1] # 2번째 열 'flux'를 증강 대상으로 선택
+    power_data_to_augment = original_df.iloc[:, 1].values.astype(np.float64) # 2번째 열 'flux'를 증강 대상으로 선택
     output_df = original_df.copy()
 
     print("Generating 5 augmented data columns...")
+    augmented = augment_batch(power_data_to_augment, num_augmentations, np.random.default_rng(seed))[0]
     for i in range(num_augmentations):
-        augmented_power = power_data_to_augment.copy()
-        error_functions = [add_linear_error, add_peak_error, add_random_noise]
-        num_errors_to_apply = random.randint(1, len(error_functions))
-        chosen_errors = random.sample(error_functions, num_errors_to_apply)
-
-        for error_func in chosen_errors:
-            if error_func == add_peak_error:
-                augmented_power = error_func(augmented_power, num_peaks=random.randint(1, 3))
-            else:
-                augmented_power = error_func(augmented_power)
-        
-        output_df[f'augmented_{i+1}'] = augmented_power
+        output_df[f'augmented_{i+1}'] = augmented[i]
 
     try:
         output_df.to_csv(output_path, sep=' ', header=False, index=False)
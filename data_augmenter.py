@@ -4,36 +4,127 @@ import pandas as pd
 import numpy as np
 import os
 import glob
-import random
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
+import sys
+# tools/module 의 공용 스펙트럼 로더(파싱 결과 캐시)를 사용하기 위해 경로 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from module.spectrum_cache import load_spectrum
+import augmentation
+import corruptions
+from augmentation import file_rng
+
+CONFIG_NAME = "augment_config.json"
+
+def unique_output_name(file_path):
+    parent_dir_name = os.path.basename(os.path.dirname(file_path))
+    original_filename = os.path.basename(file_path)
+    return f"{parent_dir_name}_{original_filename}"
+
+def read_flux_files(file_paths):
+    """파일 목록을 읽어 (경로, 원본 배열) 목록을 반환합니다. 2열 미만이거나 읽을 수 없는 파일은 건너뜁니다."""
+    loaded = []
+    for file_path in file_paths:
+        try:
+            data = np.asarray(load_spectrum(file_path))
+            if data.ndim != 2 or data.shape[1] < 2:
+                continue
+        except Exception as e:
+            continue
+        loaded.append((file_path, data))
+    return loaded
 
-def add_linear_error(data_series, max_slope=0.05, max_intercept=0.1):
-    num_points = len(data_series)
-    slope = random.uniform(-max_slope, max_slope)
-    intercept = random.uniform(-max_intercept, max_intercept)
-    linear_error = slope * np.arange(num_points) + intercept
-    return data_series + linear_error
-
-def add_peak_error(data_series, num_peaks=1, max_height=0.5, max_width=5.0):
-    power_data = data_series.copy().values
-    num_points = len(power_data)
-    for _ in range(num_peaks):
-        peak_position = random.randint(0, num_points - 1)
-        peak_height = random.uniform(0.1, max_height)
-        peak_width = random.uniform(1.0, max_width)
-        x = np.arange(num_points)
-        peak = peak_height * np.exp(-((x - peak_position) ** 2) / (2 * peak_width ** 2))
-        power_data += peak
-    return pd.Series(power_data, index=data_series.index)
-
-def add_random_noise(data_series, noise_level=0.02):
-    noise = np.random.normal(0, noise_level, len(data_series))
-    return data_series + noise
-
-def generate_augmented_data_columns(input_paths, output_path, num_augmentations=5):
+def augment_loaded(loaded, num_augmentations, seed, effects=None):
+    """
+    읽어 둔 스펙트럼 묶음의 2번째 열(flux)을 증강해 파일별 출력 DataFrame 목록을 반환합니다.
+    파라미터는 파일마다 마스터 시드와 출력 파일명(부모 폴더명_파일명)으로 만든 난수열에서 뽑으므로
+    묶음 구성이나 실행 환경과 무관하게 재현되고, 적용은 길이가 같은 파일끼리 쌓아서 apply_params 한 번으로 합니다.
+    effects가 주어지면 기존 오차 대신 corruptions 모듈의 해당 효과들을 사용합니다.
+    """
+    k = num_augmentations
+    groups = {}
+    for i, (_, data) in enumerate(loaded):
+        groups.setdefault(len(data), []).append(i)
+    outputs = [None] * len(loaded)
+    for length, indices in groups.items():
+        flux = np.stack([loaded[i][1][:, 1].astype(np.float64) for i in indices])
+        rngs = [file_rng(seed, unique_output_name(loaded[i][0])) for i in indices]
+        if effects is None:
+            params = augmentation.concat_params([augmentation.draw_params(rng, k, length) for rng in rngs])
+            augmented = augmentation.apply_params(np.repeat(flux, k, axis=0), params)
+        else:
+            params = corruptions.concat_params([corruptions.draw_params(rng, k, length, effects=effects)
+                                                for rng in rngs])
+            augmented = corruptions.apply_params(np.repeat(flux, k, axis=0), params, dtype=np.float64)
+        for i, rows in zip(indices, augmented.reshape(len(indices), k, length)):
+            output_df = pd.DataFrame(loaded[i][1])
+            for j in range(k):
+                output_df[f'augmented_{j+1}'] = rows[j]
+            outputs[i] = output_df
+    return outputs
+
+def augment_file(file_path, num_augmentations, seed, effects=None):
+    """파일 하나를 증강한 출력 DataFrame을 반환합니다 (읽을 수 없거나 2열 미만이면 None). augment_loaded와 같은 결과입니다."""
+    loaded = read_flux_files([file_path])
+    return augment_loaded(loaded, num_augmentations, seed, effects)[0] if loaded else None
+
+def _write_atomic(path, text):
+    # 임시 파일에 쓴 뒤 교체하므로, 중단되어도 출력 파일은 완전하거나 없거나 둘 중 하나
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def _augment_shard(job):
+    """워커: 파일 묶음을 한 번에 읽고 증강한 뒤 결과를 모아서 씁니다. (처리한 파일 수, 건너뛴 파일 수)를 반환합니다."""
+    file_paths, output_path, num_augmentations, seed, effects = job
+    loaded = read_flux_files(file_paths)
+    outputs = [(os.path.join(output_path, unique_output_name(file_path)),
+                output_df.to_csv(sep=' ', header=False, index=False))
+               for (file_path, _), output_df in zip(loaded, augment_loaded(loaded, num_augmentations, seed, effects))]
+    skipped = len(file_paths) - len(loaded)
+    for output_file_path, text in outputs:
+        _write_atomic(output_file_path, text)
+    return len(outputs), skipped
+
+def _run_config(seed, num_augmentations, effects):
+    config = {'seed': seed, 'num_augmentations': num_augmentations}
+    if effects is not None:
+        config['effects'] = list(effects)
+    return config
+
+def _load_config(output_path, num_augmentations, seed, effects=None):
+    """출력 폴더의 이전 실행 설정을 확인합니다. 이어서 실행할 수 있으면 사용할 시드를, 아니면 None을 반환합니다."""
+    config_path = os.path.join(output_path, CONFIG_NAME)
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            config = json.load(f)
+        if seed is None:
+            seed = config['seed']
+        if config != _run_config(seed, num_augmentations, effects):
+            print(f"오류: '{output_path}'는 다른 설정 {config}로 생성되었습니다. 다른 폴더를 지정하거나 기존 결과를 지우세요.")
+            return None
+        return seed
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (2 ** 63))
+    with open(config_path, 'w') as f:
+        json.dump(_run_config(seed, num_augmentations, effects), f)
+    return seed
+
+def generate_augmented_data_columns(input_paths, output_path, num_augmentations=5, seed=None,
+                                    num_workers=None, shard_size=64, effects=None):
     """
     여러 입력 경로의 모든 CSV 파일에 대해 오차를 추가하여 새로운 데이터셋을 생성합니다.
     파일명 중복을 피하기 위해 부모 폴더명을 파일명에 추가합니다.
+
+    - 파일을 shard_size개씩 나눠 프로세스 풀에서 처리합니다 (num_workers=None이면 CPU 코어 수).
+    - 파일마다 (seed, 출력 파일명)으로 만든 독립 난수열을 쓰므로 같은 시드로 다시 실행하면
+      워커 수와 관계없이 비트 단위로 같은 결과가 나옵니다.
+    - 이미 출력이 있는 파일은 건너뛰므로 중단된 실행을 그대로 이어서 할 수 있습니다.
+      시드를 주지 않으면 새로 정해 augment_config.json에 기록하고, 이어서 실행할 때 그 시드를 사용합니다.
+    - effects: None이면 기존 linear/peak/noise 오차, 효과 이름 목록이면 corruptions.py의 손상을 사용합니다.
     """
     if not os.path.exists(output_path):
         os.makedirs(output_path)
@@ -47,41 +138,37 @@ def generate_augmented_data_columns(input_paths, output_path, num_augmentations=
         print(f"경고: {input_paths} 에서 CSV 파일을 찾을 수 없습니다.")
         return
 
-    print(f"총 {len(all_csv_files)}개의 CSV 파일을 찾았습니다. 데이터 증강을 시작합니다.")
-
-    for file_path in tqdm(all_csv_files, desc="Augmenting files"):
-        try:
-            original_df = pd.read_csv(file_path, delim_whitespace=True, header=None, comment='#')
-            if original_df.shape[1] < 2:
-                continue
-            power_data_to_augment = original_df.iloc[:, 1]
-        except Exception as e:
-            continue
-
-        parent_dir_name = os.path.basename(os.path.dirname(file_path))
-        original_filename = os.path.basename(file_path)
-        unique_filename = f"{parent_dir_name}_{original_filename}"
-        
-        output_df = original_df.copy()
-
-        for i in range(num_augmentations):
-            augmented_power = power_data_to_augment.copy()
-            error_functions = [add_linear_error, add_peak_error, add_random_noise]
-            num_errors_to_apply = random.randint(1, len(error_functions))
-            chosen_errors = random.sample(error_functions, num_errors_to_apply)
-
-            for error_func in chosen_errors:
-                if error_func == add_peak_error:
-                    augmented_power = error_func(augmented_power, num_peaks=random.randint(1, 3))
-                else:
-                    augmented_power = error_func(augmented_power)
-            
-            output_df[f'augmented_{i+1}'] = augmented_power
+    seed = _load_config(output_path, num_augmentations, seed, effects)
+    if seed is None:
+        return
 
-        output_file_path = os.path.join(output_path, unique_filename)
-        output_df.to_csv(output_file_path, sep=' ', header=False, index=False)
+    pending = sorted(p for p in all_csv_files
+                     if not os.path.exists(os.path.join(output_path, unique_output_name(p))))
+    print(f"총 {len(all_csv_files)}개의 CSV 파일을 찾았습니다. "
+          f"{len(all_csv_files) - len(pending)}개는 이미 완료되어 {len(pending)}개를 증강합니다 (seed={seed}).")
+    if not pending:
+        return
 
-    print(f"\n데이터 증강 완료. 결과가 '{output_path}'에 저장되었습니다.")
+    jobs = [(pending[i:i + shard_size], output_path, num_augmentations, seed, effects)
+            for i in range(0, len(pending), shard_size)]
+    num_workers = num_workers or os.cpu_count() or 1
+    written = skipped = 0
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+    try:
+        results = executor.map(_augment_shard, jobs) if executor else map(_augment_shard, jobs)
+        with tqdm(total=len(pending), desc=f"Augmenting files ({num_workers} workers)") as progress:
+            for (n_written, n_skipped), job in zip(results, jobs):
+                written += n_written
+                skipped += n_skipped
+                progress.update(len(job[0]))
+    finally:
+        if executor:
+            executor.shutdown()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n데이터 증강 완료: {written}개 파일, 건너뜀 {skipped}개, {elapsed:.1f}s ({written / elapsed:.1f} files/s). "
+          f"결과가 '{output_path}'에 저장되었습니다.")
 
 if __name__ == '__main__':
     # --- 설정 (사용자 수정 필요) ---
@@ -99,6 +186,13 @@ if __name__ == '__main__':
 
     # 2. 생성된 파일을 저장할 단일 디렉토리 경로
     output_dir = r'path/to/your/single_output_folder'
+
+    # 3. 마스터 시드 (같은 시드면 항상 같은 결과)와 워커 프로세스 수 (None이면 CPU 코어 수)
+    seed = 42
+    num_workers = None
+
+    # 4. 적용할 손상 효과 (None: 기존 linear/peak/noise, 예: corruptions.EFFECTS 또는 ('ripple', 'dc_spike', 'noise'))
+    effects = None
     
     # --- 스크립트 실행 ---
     print("스크립트 사용법:")
@@ -110,5 +204,5 @@ if __name__ == '__main__':
          print("\n!!! 중요 !!!")
          print("스크립트 하단의 'input_dirs'와 'output_dir' 변수를 실제 경로로 수정해주세요.")
     else:
-        generate_augmented_data_columns(input_dirs, output_dir)
+        generate_augmented_data_columns(input_dirs, output_dir, seed=seed, num_workers=num_workers, effects=effects)
 
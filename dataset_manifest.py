@@ -0,0 +1,147 @@
+"""
+학습 데이터 매니페스트(무결성 색인) 빌더
+
+데이터 폴더를 한 번 훑어 파일마다 아래 정보를 JSON 매니페스트에 기록합니다.
+    size, mtime_ns   변경 감지용 (다음 실행에서 둘 다 같으면 다시 검사하지 않음)
+    sha1             내용 해시 (같은 내용의 중복 파일 확인용)
+    rows, columns    파싱된 배열 모양 (rows가 스펙트럼 길이)
+    valid, reason    학습에 쓸 수 있는지와, 격리(quarantine)된 경우 그 이유
+격리 이유: parse_error (읽기 실패), not_numeric, too_few_columns (2열 미만), too_short (2행 미만), non_finite (NaN/Inf)
+
+train_denoiser.py는 manifest_path를 지정하면 valid 파일만 사용하므로, 깨진 파일을 에폭마다 다시 읽고
+버리는 일이 없고 배치 크기도 일정합니다.
+
+사용 예:
+    python dataset_manifest.py manifest.json predata/dr3 predata/dr4   # 갱신 후 격리 목록 출력
+"""
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from tqdm import tqdm
+
+# tools/module 의 공용 스펙트럼 로더(파싱 결과 캐시)를 사용하기 위해 경로 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from module.spectrum_cache import load_spectrum
+
+MANIFEST_VERSION = 1
+MIN_ROWS = 2
+
+def file_sha1(file_path, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def validate_file(file_path):
+    """파일 하나를 검사해 매니페스트 항목(딕셔너리)을 반환합니다."""
+    stat = os.stat(file_path)
+    entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': file_sha1(file_path),
+             'rows': 0, 'columns': 0, 'valid': False, 'reason': None}
+    try:
+        data = np.asarray(load_spectrum(file_path))
+    except Exception as e:
+        entry['reason'] = f"parse_error: {type(e).__name__}: {e}"
+        return entry
+
+    if data.ndim == 2:
+        entry['rows'], entry['columns'] = int(data.shape[0]), int(data.shape[1])
+    try:
+        data = data.astype(np.float64)
+    except (TypeError, ValueError):
+        entry['reason'] = "not_numeric"
+        return entry
+
+    if data.ndim != 2 or data.shape[1] < 2:
+        entry['reason'] = "too_few_columns"
+    elif data.shape[0] < MIN_ROWS:
+        entry['reason'] = "too_short"
+    elif not np.isfinite(data).all():
+        entry['reason'] = "non_finite"
+    else:
+        entry['valid'] = True
+    return entry
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {'version': MANIFEST_VERSION, 'files': {}}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {'version': MANIFEST_VERSION, 'files': {}}
+    return manifest
+
+def save_manifest(manifest, manifest_path):
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    tmp_path = manifest_path + f".{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+def update_manifest(data_dirs, manifest_path, pattern='*.csv'):
+    """
+    data_dirs의 파일로 매니페스트를 갱신해 저장하고 반환합니다.
+    크기와 mtime이 그대로인 파일은 기존 항목을 재사용하고, 사라진 파일의 항목은 지웁니다.
+    """
+    start = time.perf_counter()
+    manifest = load_manifest(manifest_path)
+    old_entries = manifest['files']
+    file_paths = sorted(os.path.abspath(p) for d in data_dirs for p in glob.glob(os.path.join(d, pattern)))
+
+    entries, changed = {}, []
+    for path in file_paths:
+        old = old_entries.get(path)
+        stat = os.stat(path)
+        if old is not None and old['size'] == stat.st_size and old['mtime_ns'] == stat.st_mtime_ns:
+            entries[path] = old
+        else:
+            changed.append(path)
+    for path in tqdm(changed, desc="Validating files", disable=not changed):
+        entries[path] = validate_file(path)
+
+    removed = len(set(old_entries) - set(entries))
+    manifest['files'] = entries
+    manifest['data_dirs'] = [os.path.abspath(d) for d in data_dirs]
+    save_manifest(manifest, manifest_path)
+
+    n_valid = sum(entry['valid'] for entry in entries.values())
+    print(f"Manifest: {len(entries)} files ({len(changed)} validated, {len(entries) - len(changed)} unchanged, "
+          f"{removed} removed), {n_valid} valid, {len(entries) - n_valid} quarantined "
+          f"in {time.perf_counter() - start:.1f}s → {manifest_path}")
+    return manifest
+
+def valid_files(manifest):
+    return [path for path, entry in sorted(manifest['files'].items()) if entry['valid']]
+
+def quarantined(manifest):
+    """{경로: 이유}"""
+    return {path: entry['reason'] for path, entry in sorted(manifest['files'].items()) if not entry['valid']}
+
+def duplicates(manifest):
+    """같은 내용(sha1)의 파일 묶음 목록"""
+    groups = {}
+    for path, entry in sorted(manifest['files'].items()):
+        groups.setdefault(entry['sha1'], []).append(path)
+    return [paths for paths in groups.values() if len(paths) > 1]
+
+def main(manifest_path=None, data_dirs=None):
+    if manifest_path is None and len(sys.argv) > 2:
+        manifest_path, data_dirs = sys.argv[1], sys.argv[2:]
+
+    if not manifest_path or not data_dirs:
+        print("사용법: python dataset_manifest.py <매니페스트.json> <데이터 폴더 ...>")
+        return
+
+    manifest = update_manifest(data_dirs, manifest_path)
+    for path, reason in quarantined(manifest).items():
+        print(f"  격리: {path} ({reason})")
+    for paths in duplicates(manifest):
+        print(f"  중복: {', '.join(paths)}")
+
+if __name__ == '__main__':
+    main()
@@ -6,30 +6,43 @@ import random
 import matplotlib.pyplot as plt
 from tqdm import tqdm
 from train_denoiser import UNet1D # 학습 스크립트에서 모델 구조를 가져옵니다.
+from quantize_export import load_quantized
 import tkinter as tk
 from tkinter import filedialog
-from scipy.signal import resample # 리샘플링을 위한 라이브러리
+import sys
+# tools/module 의 공용 스펙트럼 로더(파싱 결과 캐시)를 사용하기 위해 경로 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from module.spectrum_cache import load_spectrum
+from module.resampler import resample_to_length
 
-def denoise_spectrum_mc(model_path, input_csv_path, output_dir, mc_samples=30):
+def denoise_spectrum_mc(model_path, input_csv_path, output_dir, mc_samples=30, model_kwargs=None):
     """
     학습된 U-Net 모델과 몬테카를로 드롭아웃을 사용하여 스펙트럼의 노이즈를 제거하고,
     결과와 불확실성을 함께 저장 및 시각화합니다.
+    경량 모델(lightweight_models.py)은 학습 때와 같은 model_kwargs를 넘겨야 합니다.
+    model_path가 .pt이면 양자화된 TorchScript 모델(quantize_export.py)로 추론합니다.
     """
     # --- 1. 설정 및 초기화 ---
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Using device: {device}")
 
-    model = UNet1D(in_channels=1, out_channels=1)
-    model.load_state_dict(torch.load(model_path, map_location=device))
-    model.to(device)
-    model.train() # MC Dropout의 핵심: 추론 시에도 드롭아웃을 활성화
+    if model_path.endswith('.pt'):
+        # quantize_export.py로 만든 INT8 TorchScript 모델 (CPU 전용). 드롭아웃이 없어 한 번의 결정적 추론만 합니다.
+        model, meta = load_quantized(model_path)
+        device = torch.device("cpu")
+        mc_samples = 1
+        print(f"Loaded quantized model ({meta.get('backend')}); MC dropout is unavailable, uncertainty will be zero.")
+    else:
+        model = UNet1D(in_channels=1, out_channels=1, **(model_kwargs or {}))
+        model.load_state_dict(torch.load(model_path, map_location=device))
+        model.to(device)
+        model.train() # MC Dropout의 핵심: 추론 시에도 드롭아웃을 활성화
 
     os.makedirs(output_dir, exist_ok=True)
 
     # --- 2. 데이터 로드 및 전처리 ---
     try:
-        # SyntaxWarning 해결: sep=r'\s+' -> sep=r'\s+'
-        data = pd.read_csv(input_csv_path, sep=r'\s+', header=None, comment='#').values.astype(np.float32)
+        data = load_spectrum(input_csv_path).astype(np.float32)
     except Exception as e:
         print(f"Error reading file {input_csv_path}: {e}")
         return
@@ -54,11 +67,13 @@ def denoise_spectrum_mc(model_path, input_csv_path, output_dir, mc_samples=30):
     # 리샘플링 (학습 때와 동일하게 1024로 통일)
     TARGET_LENGTH = 1024 # train_denoiser.py의 TARGET_LENGTH와 동일하게 유지
     if len(noisy_flux) != TARGET_LENGTH:
-        noisy_flux = resample(noisy_flux, TARGET_LENGTH)
+        # 속도 축 기준 등간격 격자로 보간하므로 velocity도 단조로운 격자가 됨
+        fluxes = [noisy_flux] if ground_truth_flux is None else [noisy_flux, ground_truth_flux]
+        velocity, resampled = resample_to_length(velocity, fluxes, TARGET_LENGTH)
+        noisy_flux = resampled[0]
         # ground_truth_flux가 None이 아닐 경우에만 리샘플링
         if ground_truth_flux is not None:
-            ground_truth_flux = resample(ground_truth_flux, TARGET_LENGTH)
-        velocity = resample(velocity, TARGET_LENGTH) # velocity도 리샘플링하여 길이 맞춤
+            ground_truth_flux = resampled[1]
 
     input_tensor = torch.from_numpy(noisy_flux.copy()).unsqueeze(0).unsqueeze(0).to(device)
 
@@ -128,7 +143,7 @@ def main():
         return
 
     # --- 설정 (사용자 수정 가능) ---
-    # 학습된 모델(.pth 파일)의 전체 경로
+    # 학습된 모델(.pth 파일, 또는 quantize_export.py의 INT8 .pt 파일)의 전체 경로
     TRAINED_MODEL_PATH = r'C:\Users\chan2\Desktop\Can-Satellite\trained_models\best_model.pth'
     # 결과(복원된 CSV, 그래프)를 저장할 디렉토리 경로
     OUTPUT_DIR = r'C:\Users\chan2\Desktop\Can-Satellite\denoised_results_mc'
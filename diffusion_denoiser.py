@@ -0,0 +1,361 @@
+"""
+2차 보정용 조건부 확산(diffusion) 잡음 제거 모델과 빠른 샘플러
+
+- 모델: train_denoiser.UNet1D 구조를 그대로 쓰고, 입력을 [x_t, 잡음 섞인 관측 스펙트럼] 2채널로 받으며
+  시간 t의 사인파 임베딩을 인코더 각 단계와 병목 출력에 더합니다. 출력은 깨끗한 스펙트럼 x0 예측입니다.
+- 잡음 일정: 연속 시간 t∈[0, 1]의 cosine 일정 (alpha_bar(t) = cos²((t+s)/(1+s)·π/2) 정규화).
+- 스케일: 스펙트럼마다 관측 스펙트럼의 평균/표준편차로 정규화한 공간에서 확산하고 결과를 되돌립니다.
+- 샘플러:
+    ddim_sample(..., steps=8)       : DDIM (eta=0이면 결정적, 시작 잡음만 다름) — 수백 단계 대신 4~10회 평가
+    distill(...)                    : progressive distillation. 교사 DDIM 두 단계를 학생 한 단계로 맞추는 라운드를
+                                      반복해 단계 수를 절반씩 줄입니다 (예: 64 → 32 → 16 → 8 → 4).
+  posterior_samples로 얻은 여러 표본의 평균/표준편차가 MC 드롭아웃의 평균/불확실성을 대신합니다.
+- benchmark_vs_mc: 같은 검증 스펙트럼에서 MC 드롭아웃(UNet1D)과 단계 수별 확산 샘플링의
+  RMSE, ±2σ 포함 비율(보정도), 소요 시간을 비교합니다.
+
+저장 형식 (best_diffusion.pth): {'model_state_dict', 'model_kwargs', 'sampling_steps'}
+학습 체크포인트(checkpoint.pth)는 train_denoiser와 같은 키를 쓰므로 이어서 학습할 수 있습니다.
+"""
+import copy
+import glob
+import math
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+
+import dataset_manifest
+from checkpointing import AsyncCheckpointer
+from streaming_dataset import load_target
+from train_denoiser import UNet1D, _hash_fraction, split_files, SpectraDataset, PackedSpectraDataset, AugmentingCollate, build_packed_cache
+
+# --- 1. 잡음 일정 ---
+
+COSINE_S = 0.008
+
+def alpha_sigma(t):
+    """연속 시간 t (텐서, [0, 1])의 (alpha, sigma) = (sqrt(alpha_bar), sqrt(1 - alpha_bar))"""
+    f = torch.cos((t + COSINE_S) / (1 + COSINE_S) * math.pi / 2) ** 2
+    alpha_bar = (f / math.cos(COSINE_S / (1 + COSINE_S) * math.pi / 2) ** 2).clamp(0.0, 1.0)
+    return alpha_bar.sqrt(), (1 - alpha_bar).sqrt()
+
+def timestep_embedding(t, dim):
+    """t (B,) → (B, dim) 사인파 임베딩 (t를 1000배해 이산 일정과 같은 주파수 범위 사용)"""
+    half = dim // 2
+    freqs = torch.exp(-math.log(10000) * torch.arange(half, device=t.device, dtype=torch.float32) / half)
+    args = 1000 * t.float()[:, None] * freqs[None]
+    return torch.cat([torch.sin(args), torch.cos(args)], dim=1)
+
+def normalize(cond, eps=1e-6):
+    """관측 스펙트럼 (B, 1, L)의 스펙트럼별 평균/표준편차 → (정규화된 cond, mean, std)"""
+    mean = cond.mean(dim=-1, keepdim=True)
+    std = cond.std(dim=-1, keepdim=True).clamp_min(eps)
+    return (cond - mean) / std, mean, std
+
+# --- 2. 모델 ---
+
+class ConditionalDiffusionUNet1D(UNet1D):
+    """UNet1D 골격 + 시간 임베딩. forward(x_t, cond, t) → x0 예측 (모두 정규화된 공간)"""
+    def __init__(self, base_channels=64, dropout_rate=0.0, **unet_kwargs):
+        super().__init__(in_channels=2, out_channels=1, dropout_rate=dropout_rate, base_channels=base_channels, **unet_kwargs)
+        emb_dim = self.widths[0] * 4
+        self.time_mlp = nn.Sequential(nn.Linear(self.widths[0], emb_dim), nn.SiLU(), nn.Linear(emb_dim, emb_dim))
+        self.time_proj = nn.ModuleList(nn.Linear(emb_dim, width) for width in self.widths)
+
+    def forward(self, x_t, cond, t):
+        emb = self.time_mlp(timestep_embedding(t, self.widths[0]))
+        level_bias = [proj(emb)[:, :, None] for proj in self.time_proj]
+        return self._forward(torch.cat([x_t, cond], dim=1), level_bias)
+
+def ddim_step(x_t, x0_hat, t, s, eta=0.0, generator=None):
+    """x0 예측으로 시간 t → s (s < t) 한 단계. t, s는 (B,) 텐서"""
+    alpha_t, sigma_t = (v[:, None, None] for v in alpha_sigma(t))
+    alpha_s, sigma_s = (v[:, None, None] for v in alpha_sigma(s))
+    eps_hat = (x_t - alpha_t * x0_hat) / sigma_t.clamp_min(1e-8)
+    if eta == 0.0:
+        return alpha_s * x0_hat + sigma_s * eps_hat
+    # DDIM 확률적 변형: eta=1이면 DDPM 사후분포와 같은 분산
+    ab_t, ab_s = alpha_t ** 2, alpha_s ** 2
+    noise_std = eta * torch.sqrt(((1 - ab_s) / (1 - ab_t).clamp_min(1e-8)) * (1 - ab_t / ab_s.clamp_min(1e-8))).clamp(0.0, 1.0)
+    direction = torch.sqrt((sigma_s ** 2 - noise_std ** 2).clamp_min(0.0))
+    noise = torch.randn(x_t.shape, generator=generator, device=x_t.device, dtype=x_t.dtype)
+    return alpha_s * x0_hat + direction * eps_hat + noise_std * noise
+
+@torch.no_grad()
+def ddim_sample(model, cond, steps=8, n_samples=1, eta=0.0, generator=None):
+    """
+    관측 스펙트럼 cond (B, 1, L)에 대한 사후 표본 (n_samples, B, 1, L)을 원래 스케일로 반환합니다.
+    네트워크 평가 횟수는 steps회 (표본들은 한 배치로 묶어 평가)입니다.
+    """
+    model.eval()
+    batch = cond.shape[0]
+    cond_n, mean, std = normalize(cond)
+    cond_n = cond_n.repeat(n_samples, 1, 1)
+    x = torch.randn(cond_n.shape, generator=generator, device=cond.device, dtype=cond_n.dtype)
+    times = torch.linspace(1.0, 0.0, steps + 1, device=cond.device)
+    for i in range(steps):
+        t = times[i].expand(len(x))
+        s = times[i + 1].expand(len(x))
+        x0_hat = model(x, cond_n, t)
+        x = x0_hat if i == steps - 1 else ddim_step(x, x0_hat, t, s, eta=eta, generator=generator)
+    x = x.view(n_samples, batch, *cond.shape[1:])
+    return x * std + mean
+
+def posterior_samples(model, noisy_flux, n_samples=8, steps=8, device=torch.device('cpu'), seed=None):
+    """1차원 numpy 스펙트럼 하나 → (n_samples, L) numpy 표본. 평균과 표준편차가 복원 결과와 불확실성입니다."""
+    cond = torch.from_numpy(np.asarray(noisy_flux, dtype=np.float32).copy()).view(1, 1, -1).to(device)
+    generator = torch.Generator(device=device).manual_seed(seed) if seed is not None else None
+    return ddim_sample(model, cond, steps=steps, n_samples=n_samples, generator=generator)[:, 0, 0].cpu().numpy()
+
+def load_diffusion_model(path, device=torch.device('cpu')):
+    """best_diffusion.pth 또는 distill 결과 → (모델, 권장 샘플링 단계 수)"""
+    saved = torch.load(path, map_location=device)
+    model = ConditionalDiffusionUNet1D(**saved.get('model_kwargs', {}))
+    model.load_state_dict(saved['model_state_dict'])
+    return model.to(device).eval(), saved.get('sampling_steps', 8)
+
+# --- 3. 학습 ---
+
+def diffusion_loss(model, inputs, targets, generator=None):
+    """임의의 t에서 x_t를 만들고 정규화 공간의 x0 예측 MSE를 반환합니다."""
+    cond_n, mean, std = normalize(inputs)
+    x0 = (targets - mean) / std
+    t = torch.rand(len(x0), generator=generator, device=x0.device)
+    alpha, sigma = (v[:, None, None] for v in alpha_sigma(t))
+    noise = torch.randn(x0.shape, generator=generator, device=x0.device)
+    return nn.functional.mse_loss(model(alpha * x0 + sigma * noise, cond_n, t), x0)
+
+def _loaders(data_dirs, batch_size, validation_split, target_length, samples_per_file, val_seed, corruption_effects,
+             cache_dir, num_workers, manifest_path):
+    """train_model과 같은 파일 선택/분할(파일 이름 해시)/입력 손상 방식의 (학습, 검증) DataLoader"""
+    if manifest_path is not None:
+        all_files = dataset_manifest.valid_files(dataset_manifest.update_manifest(data_dirs, manifest_path))
+    else:
+        all_files = [p for d in data_dirs for p in glob.glob(os.path.join(d, '*.csv'))]
+    if not all_files:
+        raise ValueError(f"{data_dirs} 에서 데이터 파일을 찾을 수 없습니다.")
+    if cache_dir is not None:
+        packed, all_files = build_packed_cache(all_files, cache_dir, target_length=target_length)
+        is_val = np.array([_hash_fraction(os.path.basename(p)) < validation_split for p in all_files], dtype=bool)
+        train_dataset = PackedSpectraDataset(packed, np.flatnonzero(~is_val), samples_per_file=samples_per_file)
+        val_dataset = PackedSpectraDataset(packed, np.flatnonzero(is_val), samples_per_file=samples_per_file)
+    else:
+        train_files, val_files = split_files(all_files, validation_split)
+        train_dataset = SpectraDataset(train_files, target_length=target_length, samples_per_file=samples_per_file)
+        val_dataset = SpectraDataset(val_files, target_length=target_length, samples_per_file=samples_per_file)
+    loader_kwargs = {'num_workers': num_workers, 'persistent_workers': num_workers > 0}
+    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True,
+                              collate_fn=AugmentingCollate(effects=corruption_effects), **loader_kwargs)
+    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False,
+                            collate_fn=AugmentingCollate(seed=val_seed, effects=corruption_effects), **loader_kwargs)
+    return train_loader, val_loader
+
+def train_diffusion(data_dirs, model_save_path, epochs=100, batch_size=64, lr=2e-4, validation_split=0.2, patience=10,
+                    target_length=1024, samples_per_file=5, val_seed=0, corruption_effects=None, cache_dir=None,
+                    num_workers=0, manifest_path=None, base_channels=64, keep_top_k=3):
+    """
+    조건부 확산 모델을 학습해 model_save_path/best_diffusion.pth로 저장하고 최고 검증 손실을 반환합니다.
+    데이터 인자는 train_denoiser.train_model과 같습니다. 검증 손실은 고정 시드의 t/잡음으로 계산해 에폭 간 비교할 수 있습니다.
+    """
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"Using device: {device}")
+    model_kwargs = {'base_channels': base_channels}
+    model = ConditionalDiffusionUNet1D(**model_kwargs).to(device)
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    os.makedirs(model_save_path, exist_ok=True)
+    checkpoint_path = os.path.join(model_save_path, 'checkpoint.pth')
+    checkpointer = AsyncCheckpointer(model_save_path, top_k=keep_top_k)
+
+    train_loader, val_loader = _loaders(data_dirs, batch_size, validation_split, target_length, samples_per_file, val_seed,
+                                        corruption_effects, cache_dir, num_workers, manifest_path)
+    print(f"Data loaded: {len(train_loader.dataset)} training samples, {len(val_loader.dataset)} validation samples.")
+
+    start_epoch, best_loss, epochs_no_improve = 0, float('inf'), 0
+    if os.path.exists(checkpoint_path):
+        print(f"Resuming training from checkpoint: {checkpoint_path}")
+        checkpoint = torch.load(checkpoint_path, map_location=device)
+        model.load_state_dict(checkpoint['model_state_dict'])
+        optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        start_epoch = checkpoint['epoch'] + 1
+        best_loss = checkpoint['best_loss']
+        epochs_no_improve = checkpoint['epochs_no_improve']
+        checkpointer.top = [tuple(item) for item in checkpoint.get('top_k', [])]
+
+    for epoch in range(start_epoch, epochs):
+        model.train()
+        running_loss, num_batches = 0.0, 0
+        for inputs, targets in tqdm(train_loader, desc=f"Epoch {epoch+1}/{epochs} [Train]"):
+            if inputs.nelement() == 0: continue
+            inputs, targets = inputs.to(device), targets.to(device)
+            optimizer.zero_grad()
+            loss = diffusion_loss(model, inputs, targets)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+            optimizer.step()
+            running_loss += loss.item()
+            num_batches += 1
+        train_loss = running_loss / max(num_batches, 1)
+
+        model.eval()
+        val_loss, num_batches = 0.0, 0
+        generator = torch.Generator(device=device).manual_seed(val_seed)
+        with torch.no_grad():
+            for inputs, targets in val_loader:
+                if inputs.nelement() == 0: continue
+                val_loss += diffusion_loss(model, inputs.to(device), targets.to(device), generator=generator).item()
+                num_batches += 1
+        val_loss /= max(num_batches, 1)
+        print(f"Epoch {epoch+1}: Train Loss: {train_loss:.6f}, Val Loss: {val_loss:.6f}")
+
+        if val_loss < best_loss:
+            print(f"Validation loss decreased ({best_loss:.6f} --> {val_loss:.6f}). Saving best model...")
+            best_loss = val_loss
+            epochs_no_improve = 0
+            checkpointer.save({'model_state_dict': model.state_dict(), 'model_kwargs': model_kwargs, 'sampling_steps': 8},
+                              os.path.join(model_save_path, 'best_diffusion.pth'))
+        else:
+            epochs_no_improve += 1
+            print(f"Validation loss did not improve. Counter: {epochs_no_improve}/{patience}")
+        checkpointer.save_epoch({
+            'epoch': epoch,
+            'model_state_dict': model.state_dict(),
+            'optimizer_state_dict': optimizer.state_dict(),
+            'best_loss': best_loss,
+            'epochs_no_improve': epochs_no_improve
+        }, checkpoint_path, val_loss, epoch)
+        if epochs_no_improve >= patience:
+            print("Early stopping triggered.")
+            break
+
+    checkpointer.close()
+    print(f"Best diffusion model saved as 'best_diffusion.pth' in '{model_save_path}' with validation loss {best_loss:.6f}")
+    return best_loss
+
+# --- 4. 단계 수 증류 (progressive distillation) ---
+
+def distill(teacher_path, data_loader, output_path, steps_from=64, steps_to=4, iters_per_round=2000, lr=1e-4):
+    """
+    교사의 steps_from 단계 DDIM을 흉내 내는 학생을 라운드마다 단계 수 절반으로 학습합니다.
+    학생 한 단계(t → t - 1/N)가 교사 두 단계(t → t - 1/2N → t - 1/N)와 같은 x_s에 닿도록 하는 x0를 목표로 씁니다.
+    최종 학생을 {'model_state_dict', 'model_kwargs', 'sampling_steps': steps_to} 형식으로 output_path에 저장합니다.
+    """
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    saved = torch.load(teacher_path, map_location=device)
+    model_kwargs = saved.get('model_kwargs', {})
+    teacher, _ = load_diffusion_model(teacher_path, device)
+    n_steps = steps_from
+    while n_steps > steps_to:
+        n_student = n_steps // 2
+        student = copy.deepcopy(teacher).train()
+        optimizer = optim.Adam(student.parameters(), lr=lr)
+        batches = _cycle(data_loader)
+        progress = tqdm(range(iters_per_round), desc=f"Distill {n_steps} → {n_student} steps")
+        for _ in progress:
+            inputs, targets = next(batches)
+            inputs, targets = inputs.to(device), targets.to(device)
+            cond_n, mean, std = normalize(inputs)
+            x0 = (targets - mean) / std
+            i = torch.randint(1, n_student + 1, (len(x0),), device=device)
+            t = i.float() / n_student
+            t_mid, s = t - 0.5 / n_student, t - 1.0 / n_student
+            alpha_t, sigma_t = (v[:, None, None] for v in alpha_sigma(t))
+            x_t = alpha_t * x0 + sigma_t * torch.randn_like(x0)
+            with torch.no_grad():
+                x_mid = ddim_step(x_t, teacher(x_t, cond_n, t), t, t_mid)
+                x_s = ddim_step(x_mid, teacher(x_mid, cond_n, t_mid), t_mid, s)
+                # 한 단계 t → s 결과가 x_s가 되는 x0: x_s = alpha_s x0 + sigma_s (x_t - alpha_t x0) / sigma_t
+                alpha_s, sigma_s = (v[:, None, None] for v in alpha_sigma(s))
+                ratio = sigma_s / sigma_t
+                target = (x_s - ratio * x_t) / (alpha_s - ratio * alpha_t)
+            optimizer.zero_grad()
+            loss = nn.functional.mse_loss(student(x_t, cond_n, t), target)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), max_norm=1.0)
+            optimizer.step()
+            progress.set_postfix(loss=loss.item())
+        teacher = student.eval()
+        n_steps = n_student
+
+    torch.save({'model_state_dict': teacher.state_dict(), 'model_kwargs': model_kwargs, 'sampling_steps': n_steps}, output_path)
+    print(f"Distilled {steps_from}-step sampler to {n_steps} steps → {output_path}")
+    return teacher
+
+def _cycle(loader):
+    while True:
+        for inputs, targets in loader:
+            if inputs.nelement() > 0:
+                yield inputs, targets
+
+# --- 5. MC 드롭아웃과 비교 ---
+
+def benchmark_vs_mc(unet_path, diffusion_paths, file_paths, target_length=1024, n_spectra=64, mc_samples=30, n_samples=8,
+                    step_counts=(4, 8, 10), corruption_effects=None, seed=0):
+    """
+    같은 검증 스펙트럼(고정 시드 손상)에서 MC 드롭아웃과 확산 샘플러를 비교합니다.
+    diffusion_paths: {이름: 경로} (예: {'ddim': best_diffusion.pth, 'distilled': distilled_diffusion.pth})
+    RMSE(평균 vs 정답), ±2σ 포함 비율, 소요 시간, 스펙트럼/초를 출력하고 결과 딕셔너리를 반환합니다.
+    """
+    device = torch.device('cpu')
+    targets = [flux for flux in (load_target(p, target_length) for p in sorted(file_paths)[:n_spectra]) if flux is not None]
+    if not targets:
+        raise ValueError("비교에 쓸 수 있는 스펙트럼이 없습니다.")
+    batch = [(i, torch.from_numpy(flux.astype(np.float32)).unsqueeze(0)) for i, flux in enumerate(targets)]
+    inputs, targets = AugmentingCollate(seed=seed, effects=corruption_effects)(batch)
+
+    def score(name, samples, seconds):
+        mean, std = samples.mean(0), samples.std(0)
+        rmse = ((mean - targets) ** 2).mean().sqrt().item()
+        coverage = ((targets - mean).abs() <= 2 * std).float().mean().item()
+        results[name] = {'rmse': rmse, 'coverage_2sigma': coverage, 'seconds': seconds, 'spectra_per_s': len(targets) / seconds}
+        print(f"{name:>24}: RMSE {rmse:.5f}, ±2σ coverage {coverage:6.1%}, {seconds:7.2f}s ({len(targets) / seconds:7.1f} spectra/s)")
+
+    results = {}
+    print(f"{len(targets)} spectra, length {target_length}")
+    unet = UNet1D(in_channels=1, out_channels=1)
+    unet.load_state_dict(torch.load(unet_path, map_location=device))
+    unet.train()  # denoise_data.denoise_spectrum_mc와 같은 MC 드롭아웃 방식
+    start = time.perf_counter()
+    with torch.no_grad():
+        samples = torch.stack([unet(inputs) for _ in range(mc_samples)])
+    score(f"MC dropout x{mc_samples}", samples, time.perf_counter() - start)
+
+    for label, path in diffusion_paths.items():
+        model, default_steps = load_diffusion_model(path, device)
+        for steps in sorted(set(step_counts) | {default_steps}):
+            generator = torch.Generator().manual_seed(seed)
+            start = time.perf_counter()
+            samples = ddim_sample(model, inputs, steps=steps, n_samples=n_samples, generator=generator)
+            score(f"{label} {steps} steps x{n_samples}", samples, time.perf_counter() - start)
+    return results
+
+
+if __name__ == '__main__':
+    import corruptions
+    DATA_DIRS = [
+        r'C:\Users\chan2\Desktop\Can-Satellite\predata\dr3',
+        r'C:\Users\chan2\Desktop\Can-Satellite\predata\dr4'
+    ]
+    MODEL_SAVE_DIR = r'C:\Users\chan2\Desktop\Can-Satellite\trained_models\diffusion'
+    UNET_PATH = r'C:\Users\chan2\Desktop\Can-Satellite\trained_models\best_model.pth'
+    CACHE_DIR = r'C:\Users\chan2\Desktop\Can-Satellite\trained_models\spectra_cache'
+    MANIFEST_PATH = r'C:\Users\chan2\Desktop\Can-Satellite\trained_models\dataset_manifest.json'
+    CORRUPTION_EFFECTS = corruptions.EFFECTS
+
+    print("--- Conditional Diffusion Denoiser ---")
+    train_diffusion(DATA_DIRS, MODEL_SAVE_DIR, batch_size=64, lr=2e-4, cache_dir=CACHE_DIR,
+                    manifest_path=MANIFEST_PATH, corruption_effects=CORRUPTION_EFFECTS)
+    best_path = os.path.join(MODEL_SAVE_DIR, 'best_diffusion.pth')
+    distilled_path = os.path.join(MODEL_SAVE_DIR, 'distilled_diffusion.pth')
+    train_loader, _ = _loaders(DATA_DIRS, 64, 0.2, 1024, 5, 0, CORRUPTION_EFFECTS, CACHE_DIR, 0, MANIFEST_PATH)
+    distill(best_path, train_loader, distilled_path, steps_from=64, steps_to=4)
+
+    # 학습(train_model/train_diffusion)과 같은 해시 분할의 검증 파일 → 어느 모델도 학습에 쓰지 않은 스펙트럼
+    files = dataset_manifest.valid_files(dataset_manifest.load_manifest(MANIFEST_PATH))
+    val_files = split_files(files, 0.2)[1]
+    benchmark_vs_mc(UNET_PATH, {'ddim': best_path, 'distilled': distilled_path}, val_files,
+                    corruption_effects=CORRUPTION_EFFECTS)
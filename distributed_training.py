@@ -0,0 +1,128 @@
+"""
+CPU 클러스터용 분산 데이터 병렬(DDP) 학습 도우미 (train_denoiser.py 공용, gloo 백엔드)
+
+train_denoiser.py를 torchrun으로 실행하면 train_model이 자동으로 분산 모드가 됩니다.
+    # 한 장비에서 4개 프로세스
+    torchrun --standalone --nproc_per_node=4 train_denoiser.py
+    # 두 장비 (각 장비에서 node_rank만 바꿔 실행, TCP 랑데부)
+    torchrun --nnodes=2 --node_rank=0 --nproc_per_node=8 --master_addr=10.0.0.1 --master_port=29500 train_denoiser.py
+
+- 데이터: 파일(행) 목록을 DistributedSampler로 rank마다 겹치지 않게 나눕니다 (샤드 스트리밍은 자체 분할).
+  batch_size는 프로세스당 크기이므로 전체 배치는 batch_size * world_size 입니다.
+- 그래디언트는 DDP가 역전파 중 all-reduce 하고, 손실은 rank 전체 평균으로 기록합니다.
+- 로그, 체크포인트, best_model.pth 저장은 rank 0만 합니다. 저장 형식은 단일 프로세스와 같아
+  기존 checkpoint.pth로 이어서 학습하거나 분산 학습 결과를 denoise_data.py에서 그대로 쓸 수 있습니다.
+- 한 장비의 프로세스들은 CPU 코어를 나눠 쓰도록 프로세스당 스레드 수를 (코어 수 / 로컬 프로세스 수)로 정합니다.
+
+확장 효율 측정:
+    python distributed_training.py 1 2 4 8
+"""
+import contextlib
+import os
+import socket
+import sys
+import time
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
+
+BACKEND = 'gloo'
+
+def init_distributed():
+    """
+    torchrun 등이 설정한 환경 변수(RANK, WORLD_SIZE, MASTER_ADDR, MASTER_PORT)로 프로세스 그룹을 만들고
+    (rank, world_size)를 반환합니다. 환경 변수가 없으면 (0, 1) 단일 프로세스입니다.
+    """
+    world_size = int(os.environ.get('WORLD_SIZE', 1))
+    if world_size <= 1:
+        return 0, 1
+    if not dist.is_initialized():
+        dist.init_process_group(BACKEND, init_method='env://')
+        local_world_size = int(os.environ.get('LOCAL_WORLD_SIZE', world_size))
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+    return dist.get_rank(), dist.get_world_size()
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1
+
+def wrap_model(model):
+    """분산 모드면 DDP로 감쌉니다 (생성 시 rank 0의 가중치가 모든 rank로 복사됨)."""
+    return DistributedDataParallel(model) if is_distributed() else model
+
+def uneven_inputs(model):
+    """rank별 배치 수가 다를 때 먼저 끝난 rank가 all-reduce를 흉내 내 주도록 DDP join을 겁니다."""
+    if isinstance(model, DistributedDataParallel):
+        return model.join()
+    return contextlib.nullcontext()
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+def all_reduce_sum(*values):
+    """숫자들을 모든 rank에서 합해 같은 순서의 float 목록으로 반환합니다."""
+    if not is_distributed():
+        return [float(v) for v in values]
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor.tolist()
+
+def cleanup():
+    if is_distributed():
+        dist.destroy_process_group()
+
+# --- 확장 효율 측정 ---
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _benchmark_worker(rank, world_size, port, batch_size, length, steps, warmup, results):
+    os.environ.update({'RANK': str(rank), 'WORLD_SIZE': str(world_size), 'LOCAL_WORLD_SIZE': str(world_size),
+                       'MASTER_ADDR': '127.0.0.1', 'MASTER_PORT': str(port)})
+    init_distributed()
+    from train_denoiser import UNet1D
+    torch.manual_seed(rank)
+    model = wrap_model(UNet1D(in_channels=1, out_channels=1))
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-5)
+    criterion = nn.MSELoss()
+    targets = torch.randn(batch_size, 1, length).cumsum(-1) / length ** 0.5
+    inputs = targets + 0.05 * torch.randn_like(targets)
+    for step in range(warmup + steps):
+        if step == warmup:
+            barrier()
+            start = time.perf_counter()
+        optimizer.zero_grad()
+        criterion(model(inputs), targets).backward()
+        optimizer.step()
+    barrier()
+    if rank == 0:
+        results.put(time.perf_counter() - start)
+    cleanup()
+
+def benchmark_scaling(world_sizes=(1, 2, 4, 8), batch_size=32, length=1024, steps=5, warmup=2):
+    """
+    한 장비에서 프로세스 수별로 같은 프로세스당 배치의 DDP 학습 스텝을 실행해
+    전체 처리량(samples/s)과 확장 효율(처리량 / (프로세스 수 * 1개일 때 처리량))을 출력합니다.
+    """
+    results = {}
+    ctx = mp.get_context('spawn')
+    for world_size in world_sizes:
+        queue = ctx.SimpleQueue()
+        mp.start_processes(_benchmark_worker, args=(world_size, _free_port(), batch_size, length, steps, warmup, queue),
+                           nprocs=world_size, start_method='spawn')
+        seconds = queue.get()
+        results[world_size] = batch_size * world_size * steps / seconds
+    base = results.get(1, results[world_sizes[0]] / world_sizes[0])
+    print(f"CPU 코어 {os.cpu_count()}개, 프로세스당 배치 {batch_size}, 길이 {length}")
+    for world_size, throughput in results.items():
+        print(f"  {world_size}개 프로세스: {throughput:8.1f} samples/s, 확장 효율 {throughput / (base * world_size):.0%}")
+    return results
+
+if __name__ == '__main__':
+    sizes = tuple(int(a) for a in sys.argv[1:]) or (1, 2, 4, 8)
+    benchmark_scaling(sizes)
@@ -0,0 +1,291 @@
+"""
+train_denoiser.py 하이퍼파라미터 탐색기 (로컬 프로세스 병렬 + 중간 검증 손실 기반 가지치기)
+
+시도(trial)마다 train_model을 별도 프로세스에서 실행하고, 프로세스당 torch 스레드 수를 threads_per_trial로 제한해
+동시에 (CPU 코어 수 // threads_per_trial)개까지 돌립니다.
+
+    sampler='random' : 탐색 공간에서 무작위 추출
+    sampler='grid'   : 모든 조합 (연속 구간은 grid_points개 점으로 나눔)
+    sampler='tpe'    : 처음 n_startup개는 무작위, 이후에는 끝난 시도를 좋은/나쁜 묶음으로 나눠
+                       좋은 쪽 밀도 / 나쁜 쪽 밀도 비가 큰 후보를 고르는 TPE 방식
+
+가지치기(median rule): prune_warmup 에폭 이후, 같은 에폭까지의 최고 검증 손실이 다른 시도들(prune_min_trials개 이상)의
+같은 에폭 값 중앙값보다 나쁘면 그 시도를 멈춥니다.
+
+실행마다 sweep_dir/run_YYYYmmdd_HHMMSS/ 폴더를 새로 만들어, 결과는 그 안의 sweep_results.csv 한 표에
+시도가 끝날 때마다 갱신되며(검증 손실 순), 시도별 로그와 체크포인트는 trial_XXX/ 에 남습니다.
+(이전 실행의 체크포인트를 새 시도가 이어받는 일이 없도록 폴더를 재사용하지 않습니다.)
+
+사용 예:
+    python hyperparam_sweep.py
+    run_sweep({'data_dirs': [...], 'epochs': 30, 'cache_dir': ...}, sampler='tpe', n_trials=24, threads_per_trial=4)
+"""
+import contextlib
+import glob
+import itertools
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+# (종류, ...) : 'loguniform'/'uniform' 은 (하한, 상한), 'choice' 는 후보 목록
+SPACE = {
+    'lr': ('loguniform', 1e-5, 3e-3),
+    'batch_size': ('choice', [64, 128, 256]),
+    'dropout_rate': ('uniform', 0.0, 0.5),
+    'base_channels': ('choice', [16, 32, 64]),
+}
+# 이 키들은 UNet1D 인자(model_kwargs), 나머지는 train_model 인자로 전달됩니다
+MODEL_KEYS = ('in_channels', 'out_channels', 'dropout_rate', 'base_channels', 'width_mult', 'depth_mult', 'separable')
+
+# --- 탐색 공간 추출 ---
+
+def _sample_random(space, rng):
+    params = {}
+    for name, (kind, *spec) in space.items():
+        if kind == 'choice':
+            params[name] = spec[0][rng.integers(len(spec[0]))]
+        elif kind == 'loguniform':
+            params[name] = float(math.exp(rng.uniform(math.log(spec[0]), math.log(spec[1]))))
+        else:
+            params[name] = float(rng.uniform(spec[0], spec[1]))
+    return params
+
+def grid_params(space, grid_points=3):
+    """탐색 공간의 모든 조합 목록 (연속 구간은 grid_points개의 (로그)등간격 점)"""
+    axes = []
+    for name, (kind, *spec) in space.items():
+        if kind == 'choice':
+            axes.append(list(spec[0]))
+        elif kind == 'loguniform':
+            axes.append([float(v) for v in np.geomspace(spec[0], spec[1], grid_points)])
+        else:
+            axes.append([float(v) for v in np.linspace(spec[0], spec[1], grid_points)])
+    return [dict(zip(space, values)) for values in itertools.product(*axes)]
+
+def _to_unit(kind, spec, value):
+    """연속 값을 [0, 1] 구간으로 (loguniform은 로그 스케일)"""
+    lo, hi = spec
+    if kind == 'loguniform':
+        lo, hi, value = math.log(lo), math.log(hi), math.log(value)
+    return (value - lo) / (hi - lo)
+
+def _from_unit(kind, spec, u):
+    lo, hi = spec
+    if kind == 'loguniform':
+        return float(math.exp(math.log(lo) + u * (math.log(hi) - math.log(lo))))
+    return float(lo + u * (hi - lo))
+
+def _parzen(points, candidates, bandwidth):
+    """[0, 1] 구간 가우시안 커널 밀도 (균등 사전분포 한 개를 섞어 빈 묶음에서도 0이 되지 않게 함)"""
+    points = np.asarray(points, dtype=np.float64)
+    z = (candidates[:, None] - points[None, :]) / bandwidth
+    density = np.exp(-0.5 * z ** 2).sum(axis=1) / (bandwidth * math.sqrt(2 * math.pi))
+    return (density + 1.0) / (len(points) + 1)
+
+def _sample_tpe(space, rng, history, gamma=0.25, n_candidates=24):
+    """
+    history: 끝난 시도의 (params, loss) 목록. 파라미터마다 독립적으로
+    좋은 묶음(손실 하위 gamma 비율)에서 후보를 뽑고 l(x)/g(x)가 가장 큰 값을 고릅니다.
+    """
+    history = sorted(history, key=lambda item: item[1])
+    n_good = max(1, int(math.ceil(gamma * len(history))))
+    good, bad = history[:n_good], history[n_good:]
+    params = {}
+    for name, (kind, *spec) in space.items():
+        if kind == 'choice':
+            options = list(spec[0])
+            # 라플라스 평활한 범주 빈도
+            l = np.ones(len(options))
+            g = np.ones(len(options))
+            for p, _ in good:
+                l[options.index(p[name])] += 1
+            for p, _ in bad:
+                g[options.index(p[name])] += 1
+            l, g = l / l.sum(), g / g.sum()
+            candidates = rng.choice(len(options), size=n_candidates, p=l)
+            params[name] = options[int(candidates[np.argmax(l[candidates] / g[candidates])])]
+        else:
+            good_u = [_to_unit(kind, spec, p[name]) for p, _ in good]
+            bad_u = [_to_unit(kind, spec, p[name]) for p, _ in bad]
+            bandwidth = max(0.05, 1.0 / (len(history) + 1) ** 0.2 * 0.3)
+            centers = np.asarray(good_u)[rng.integers(len(good_u), size=n_candidates)]
+            candidates = np.clip(centers + bandwidth * rng.standard_normal(n_candidates), 0.0, 1.0)
+            score = _parzen(good_u, candidates, bandwidth) / _parzen(bad_u, candidates, bandwidth)
+            params[name] = _from_unit(kind, spec, candidates[np.argmax(score)])
+    return params
+
+# --- 가지치기 ---
+
+class MedianPruner:
+    """
+    시도별 에폭 검증 손실을 공유 딕셔너리(Manager)에 기록하고 median rule로 가지치기 여부를 판단하는
+    train_model용 epoch_callback. 프로세스 사이에 전달되도록 피클 가능한 객체입니다.
+    """
+    def __init__(self, shared, trial_id, warmup_epochs=3, min_trials=3):
+        self.shared = shared
+        self.trial_id = trial_id
+        self.warmup_epochs = warmup_epochs
+        self.min_trials = min_trials
+        self.pruned = False
+        self.epochs_run = 0
+
+    def __call__(self, epoch, train_loss, val_loss):
+        curve = dict(self.shared.get(self.trial_id, {}))
+        curve[epoch] = min(val_loss, min(curve.values(), default=float('inf')))
+        self.shared[self.trial_id] = curve     # 프록시는 값 전체를 다시 넣어야 갱신됨
+        self.epochs_run = epoch + 1
+        if epoch + 1 < self.warmup_epochs:
+            return False
+        others = [c[epoch] for t, c in self.shared.items() if t != self.trial_id and epoch in c]
+        if len(others) < self.min_trials:
+            return False
+        self.pruned = curve[epoch] > float(np.median(others))
+        if self.pruned:
+            print(f"Trial {self.trial_id} pruned at epoch {epoch + 1}: best val loss {curve[epoch]:.6f} > median {np.median(others):.6f}")
+        return self.pruned
+
+# --- 실행 ---
+
+def _set_threads(threads):
+    import torch
+    torch.set_num_threads(threads)
+    with contextlib.suppress(RuntimeError):
+        torch.set_num_interop_threads(1)
+
+def _run_trial(job):
+    """워커: 시도 하나를 실행하고 결과 표의 한 행(딕셔너리)을 반환합니다. 학습 출력은 trial 폴더의 train.log로 보냅니다."""
+    trial_id, params, base_kwargs, trial_dir, seed, pruner = job
+    import torch
+    from train_denoiser import train_model
+    np.random.seed(seed)      # 모든 시도가 같은 학습/검증 분할을 쓰도록 같은 시드
+    torch.manual_seed(seed)
+    model_kwargs = {k: v for k, v in params.items() if k in MODEL_KEYS}
+    train_kwargs = {k: v for k, v in params.items() if k not in MODEL_KEYS}
+    os.makedirs(trial_dir, exist_ok=True)
+    row = {'trial': trial_id, **params}
+    start = time.perf_counter()
+    with open(os.path.join(trial_dir, 'train.log'), 'w', encoding='utf-8') as f, \
+            contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
+        try:
+            common = {k: v for k, v in base_kwargs.items() if k != 'model_kwargs'}
+            best = train_model(**{**common, **train_kwargs}, model_save_path=trial_dir,
+                               model_kwargs={**base_kwargs.get('model_kwargs', {}), **model_kwargs}, epoch_callback=pruner)
+            row.update(best_val_loss=best, state='pruned' if pruner.pruned else 'complete')
+        except Exception as e:
+            print(f"Trial failed: {type(e).__name__}: {e}")
+            row.update(best_val_loss=float('nan'), state='failed')
+    row.update(epochs=pruner.epochs_run, seconds=round(time.perf_counter() - start, 1))
+    return row
+
+def _prime_data(base_kwargs):
+    """시도들이 같은 매니페스트/패킹 캐시를 동시에 만들지 않도록 미리 한 번 만들어 둡니다."""
+    from train_denoiser import build_packed_cache
+    import dataset_manifest
+    data_dirs = base_kwargs['data_dirs']
+    if base_kwargs.get('manifest_path') is not None:
+        files = dataset_manifest.valid_files(dataset_manifest.update_manifest(data_dirs, base_kwargs['manifest_path']))
+    else:
+        files = [p for d in data_dirs for p in glob.glob(os.path.join(d, '*.csv'))]
+    if base_kwargs.get('cache_dir') is not None and base_kwargs.get('shard_dir') is None:
+        build_packed_cache(files, base_kwargs['cache_dir'], target_length=base_kwargs.get('target_length', 1024))
+
+def _new_run_dir(sweep_dir):
+    """sweep_dir 아래에 이번 실행 전용 폴더를 새로 만듭니다 (같은 초에 시작하면 _2, _3 ... 를 붙임)."""
+    base = os.path.join(sweep_dir, time.strftime('run_%Y%m%d_%H%M%S'))
+    path = base
+    for i in itertools.count(2):
+        try:
+            os.makedirs(path)
+            return path
+        except FileExistsError:
+            path = f"{base}_{i}"
+
+def run_sweep(base_kwargs, sweep_dir, space=SPACE, sampler='tpe', n_trials=None, threads_per_trial=4, max_parallel=None,
+              grid_points=3, n_startup=8, prune_warmup=3, prune_min_trials=3, seed=0):
+    """
+    base_kwargs: 모든 시도에 공통인 train_model 인자 (data_dirs, epochs, cache_dir 등; model_save_path 제외).
+    n_trials: None이면 grid는 전체 조합, 나머지는 20개. grid에서 조합 수보다 작으면 조합을 무작위로 골라
+    앞쪽 조합(첫 번째 인자 값이 모두 같은)만 도는 일을 막습니다.
+    결과 표(DataFrame, 검증 손실 순)를 반환하고 이번 실행 폴더(sweep_dir/run_YYYYmmdd_HHMMSS)의 sweep_results.csv 에 저장합니다.
+    """
+    if sampler not in ('random', 'grid', 'tpe'):
+        raise ValueError(f"알 수 없는 sampler: {sampler}")
+    run_dir = _new_run_dir(sweep_dir)
+    results_path = os.path.join(run_dir, 'sweep_results.csv')
+    if max_parallel is None:
+        max_parallel = max(1, (os.cpu_count() or 1) // threads_per_trial)
+    rng = np.random.default_rng(seed)
+    grid = grid_params(space, grid_points) if sampler == 'grid' else None
+    if grid is None:
+        n_trials = 20 if n_trials is None else n_trials
+    elif n_trials is None or n_trials >= len(grid):
+        n_trials = len(grid)
+    else:
+        grid = [grid[i] for i in rng.permutation(len(grid))[:n_trials]]
+
+    _prime_data(base_kwargs)
+    print(f"Sweep: {sampler}, {n_trials} trials, {max_parallel} parallel x {threads_per_trial} threads → {run_dir}")
+
+    ctx = multiprocessing.get_context('spawn')
+    rows, history = [], []
+    with ctx.Manager() as manager, \
+            ProcessPoolExecutor(max_parallel, mp_context=ctx, initializer=_set_threads, initargs=(threads_per_trial,)) as pool:
+        curves = manager.dict()
+        pending = {}
+        next_trial = 0
+        while next_trial < n_trials or pending:
+            while next_trial < n_trials and len(pending) < max_parallel:
+                if grid is not None:
+                    params = grid[next_trial]
+                elif sampler == 'tpe' and len(history) >= n_startup:
+                    params = _sample_tpe(space, rng, history)
+                else:
+                    params = _sample_random(space, rng)
+                pruner = MedianPruner(curves, next_trial, warmup_epochs=prune_warmup, min_trials=prune_min_trials)
+                trial_dir = os.path.join(run_dir, f"trial_{next_trial:03d}")
+                future = pool.submit(_run_trial, (next_trial, params, base_kwargs, trial_dir, seed, pruner))
+                pending[future] = next_trial
+                next_trial += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                row = future.result()
+                rows.append(row)
+                # 가지치기된 시도도 그때까지의 최고 손실로 TPE에 반영 (실패한 시도는 제외)
+                if row['state'] != 'failed':
+                    history.append(({k: row[k] for k in space}, row['best_val_loss']))
+                print(f"Trial {row['trial']:3d} {row['state']:>8}: val loss {row['best_val_loss']:.6f} "
+                      f"({row['epochs']} epochs, {row['seconds']:.0f}s) {({k: row[k] for k in space})}")
+                table = pd.DataFrame(rows).sort_values('best_val_loss', na_position='last')
+                table.to_csv(results_path, index=False)
+
+    print(f"\nSweep finished. Results: {results_path}")
+    print(table.head(10).to_string(index=False))
+    return table
+
+
+if __name__ == '__main__':
+    import corruptions
+    DATA_DIRS = [
+        r'C:\Users\chan2\Desktop\Can-Satellite\predata\dr3',
+        r'C:\Users\chan2\Desktop\Can-Satellite\predata\dr4'
+    ]
+    MODEL_SAVE_DIR = r'C:\Users\chan2\Desktop\Can-Satellite\trained_models'
+    SWEEP_DIR = os.path.join(MODEL_SAVE_DIR, 'sweep')
+
+    BASE_KWARGS = {
+        'data_dirs': DATA_DIRS,
+        'epochs': 30,
+        'patience': 5,
+        'target_length': 1024,
+        'samples_per_file': 5,
+        'corruption_effects': corruptions.EFFECTS,
+        'cache_dir': os.path.join(MODEL_SAVE_DIR, 'spectra_cache'),
+        'manifest_path': os.path.join(MODEL_SAVE_DIR, 'dataset_manifest.json'),
+    }
+    run_sweep(BASE_KWARGS, SWEEP_DIR, sampler='tpe', n_trials=24, threads_per_trial=4)
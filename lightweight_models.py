@@ -0,0 +1,116 @@
+"""
+경량 UNet1D 변형과 지식 증류 (Pi Zero W 탑재 / 노트북 대량 추론용)
+
+변형은 UNet1D 인자(width_mult, depth_mult, separable) 조합입니다. 학습은 train_model의 증류 모드로,
+전체 크기 best_model.pth(교사)의 출력과 정답을 함께 맞춥니다.
+
+    train_student('small', data_dirs, save_dir, teacher_path='trained_models/best_model.pth', ...)
+    python lightweight_models.py   # 변형별 파라미터 수 / 지연시간 / 정확도 비교
+
+경량 모델을 denoise_data.denoise_spectrum_mc에서 쓰려면 model_kwargs=VARIANTS[이름]을 넘깁니다.
+"""
+import os
+import time
+
+import numpy as np
+import torch
+
+from streaming_dataset import load_target
+from train_denoiser import UNet1D, AugmentingCollate, train_model
+
+VARIANTS = {
+    'full': {},
+    'half': {'width_mult': 0.5},
+    'small': {'width_mult': 0.25, 'separable': True},
+    'tiny': {'width_mult': 0.125, 'depth_mult': 0.5, 'separable': True},
+}
+
+def count_parameters(model):
+    return sum(p.numel() for p in model.parameters())
+
+def train_student(variant, data_dirs, model_save_path, teacher_path, distill_alpha=0.5, **train_kwargs):
+    """
+    VARIANTS[variant] 구조의 학생을 teacher_path(전체 크기 UNet1D)로부터 증류 학습합니다.
+    경량 모델은 드롭아웃 정규화가 덜 필요하므로 dropout_rate 기본값을 0.1로 둡니다 (train_kwargs의 model_kwargs로 변경 가능).
+    """
+    model_kwargs = {'dropout_rate': 0.1, **VARIANTS[variant], **train_kwargs.pop('model_kwargs', {})}
+    return train_model(data_dirs, model_save_path, model_kwargs=model_kwargs, teacher_path=teacher_path,
+                       distill_alpha=distill_alpha, **train_kwargs)
+
+def _latency(model, inputs, repeats):
+    """배치 하나의 평균 추론 시간(초). 첫 실행은 워밍업으로 제외"""
+    with torch.no_grad():
+        model(inputs)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(inputs)
+    return (time.perf_counter() - start) / repeats
+
+def compare_variants(models, file_paths=None, target_length=1024, n_spectra=64, bulk_batch=64, repeats=10, threads=1,
+                     corruption_effects=None, seed=0):
+    """
+    models: {이름: (state_dict 경로 또는 None, UNet1D 인자)}. 경로가 None이면 무작위 가중치로 크기/속도만 잽니다.
+    파라미터 수, 스펙트럼 1개 지연시간(threads개 스레드; Pi Zero W는 단일 코어), 대량 처리량(bulk_batch 배치),
+    고정 시드로 손상시킨 검증 스펙트럼의 RMSE를 나란히 출력하고 결과 딕셔너리를 반환합니다.
+    """
+    previous_threads = torch.get_num_threads()
+    torch.set_num_threads(threads)
+    inputs = targets = None
+    if file_paths:
+        flux = [f for f in (load_target(p, target_length) for p in sorted(file_paths)[:n_spectra]) if f is not None]
+        batch = [(i, torch.from_numpy(f.astype(np.float32)).unsqueeze(0)) for i, f in enumerate(flux)]
+        inputs, targets = AugmentingCollate(seed=seed, effects=corruption_effects)(batch)
+    single = torch.randn(1, 1, target_length)
+    bulk = torch.randn(bulk_batch, 1, target_length)
+
+    results = {}
+    print(f"{'model':>10} {'params':>12} {'latency/spectrum':>17} {'bulk spectra/s':>15} {'RMSE':>9}")
+    try:
+        for name, (path, kwargs) in models.items():
+            model = UNet1D(in_channels=1, out_channels=1, **kwargs)
+            if path is not None:
+                model.load_state_dict(torch.load(path, map_location='cpu'))
+            model.eval()
+            row = {'params': count_parameters(model),
+                   'latency_ms': _latency(model, single, repeats) * 1e3,
+                   'bulk_spectra_per_s': bulk_batch / _latency(model, bulk, max(1, repeats // 5)),
+                   'rmse': None}
+            if path is not None and inputs is not None and len(inputs):
+                with torch.no_grad():
+                    row['rmse'] = ((model(inputs) - targets) ** 2).mean().sqrt().item()
+            results[name] = row
+            rmse = f"{row['rmse']:.5f}" if row['rmse'] is not None else '-'
+            print(f"{name:>10} {row['params']:>12,} {row['latency_ms']:>14.2f} ms {row['bulk_spectra_per_s']:>15.1f} {rmse:>9}")
+    finally:
+        torch.set_num_threads(previous_threads)
+    return results
+
+
+if __name__ == '__main__':
+    import corruptions
+    import dataset_manifest
+    from train_denoiser import split_files
+    DATA_DIRS = [
+        r'C:\Users\chan2\Desktop\Can-Satellite\predata\dr3',
+        r'C:\Users\chan2\Desktop\Can-Satellite\predata\dr4'
+    ]
+    MODEL_SAVE_DIR = r'C:\Users\chan2\Desktop\Can-Satellite\trained_models'
+    TEACHER_PATH = os.path.join(MODEL_SAVE_DIR, 'best_model.pth')
+    MANIFEST_PATH = os.path.join(MODEL_SAVE_DIR, 'dataset_manifest.json')
+    # 학습할 경량 변형 (None이면 학습 없이 비교만)
+    TRAIN_VARIANT = 'small'
+
+    if TRAIN_VARIANT is not None:
+        train_student(TRAIN_VARIANT, DATA_DIRS, os.path.join(MODEL_SAVE_DIR, f"student_{TRAIN_VARIANT}"), TEACHER_PATH,
+                      epochs=100, batch_size=256, lr=1e-4, corruption_effects=corruptions.EFFECTS,
+                      cache_dir=os.path.join(MODEL_SAVE_DIR, 'spectra_cache'), manifest_path=MANIFEST_PATH)
+
+    models = {'full': (TEACHER_PATH, VARIANTS['full'])}
+    for name, kwargs in VARIANTS.items():
+        if name == 'full':
+            continue
+        path = os.path.join(MODEL_SAVE_DIR, f"student_{name}", 'best_model.pth')
+        models[name] = (path if os.path.exists(path) else None, {'dropout_rate': 0.1, **kwargs})
+    # train_model과 같은 해시 분할의 검증 파일 (교사/학생 모두 학습에 쓰지 않은 스펙트럼)
+    files = dataset_manifest.valid_files(dataset_manifest.load_manifest(MANIFEST_PATH))
+    compare_variants(models, split_files(files, 0.2)[1], corruption_effects=corruptions.EFFECTS)
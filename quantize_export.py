@@ -0,0 +1,202 @@
+"""
+UNet1D INT8 양자화와 내보내기 (CPU 추론용)
+
+    PTQ : 학습 코퍼스에서 뽑은 보정(calibration) 입력으로 관측기를 돌린 뒤 정적 INT8 변환 (FX graph mode)
+    QAT : fake-quant 모듈을 넣고 학습 데이터로 몇 에폭 미세조정한 뒤 변환
+변환된 모델은 TorchScript(.pt)로 저장하며 백엔드/입력 길이를 파일 안(quant_meta.json)에 함께 기록합니다.
+fp32 모델은 ONNX로도 내보낼 수 있습니다 (onnxruntime 등 다른 런타임용).
+
+- 백엔드: x86(fbgemm) 노트북/서버, ARM(라즈베리 파이 등)은 qnnpack. 추론 장비와 같은 백엔드로 양자화해야 합니다.
+- FX 추적이 가능하도록 길이 맞춤(pad) 분기를 뺀 QuantizableUNet1D를 씁니다 (state_dict는 UNet1D와 같음).
+  따라서 입력 길이는 8의 배수여야 합니다 (TARGET_LENGTH 1024).
+- 양자화 모델은 eval 모드로 고정되어 드롭아웃이 없으므로 MC 드롭아웃 불확실성 대신 한 번의 결정적 추론만 합니다.
+- evaluate: 고정 검증 집합에서 fp32 대비 지연시간/처리량 향상과 RMSE 변화를 측정합니다.
+
+사용 예:
+    python quantize_export.py
+    denoise_data.denoise_spectrum_mc('trained_models/best_model_int8.pt', ...)   # 양자화 모델로 추론
+"""
+import copy
+import json
+import os
+import platform
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.ao.quantization import QConfig, default_weight_observer, default_weight_fake_quant
+from torch.ao.quantization import get_default_qconfig_mapping, get_default_qat_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, prepare_qat_fx, convert_fx
+from tqdm import tqdm
+
+from streaming_dataset import load_target
+from train_denoiser import UNet1D, AugmentingCollate
+
+META_NAME = 'quant_meta.json'
+
+class QuantizableUNet1D(UNet1D):
+    """FX 추적용 UNet1D: 입력 길이가 8의 배수라고 가정해 pad 분기를 없앤 같은 연산"""
+    def forward(self, x):
+        e1 = self.enc1(x)
+        e2 = self.enc2(self.pool(e1))
+        e3 = self.enc3(self.pool(e2))
+        b = self.bottleneck(self.pool(e3))
+        d3 = self.dec3(torch.cat([self.upconv3(b), e3], dim=1))
+        d2 = self.dec2(torch.cat([self.upconv2(d3), e2], dim=1))
+        d1 = self.dec1(torch.cat([self.upconv1(d2), e1], dim=1))
+        return self.out_conv(d1)
+
+def default_backend():
+    """이 장비에 맞는 양자화 엔진 ('qnnpack' / 'x86' / 'fbgemm')"""
+    engines = torch.backends.quantized.supported_engines
+    if platform.machine().lower() in ('arm64', 'aarch64', 'armv7l') and 'qnnpack' in engines:
+        return 'qnnpack'
+    return 'x86' if 'x86' in engines else 'fbgemm'
+
+def _qconfig_mapping(backend, qat=False):
+    mapping = get_default_qat_qconfig_mapping(backend) if qat else get_default_qconfig_mapping(backend)
+    # ConvTranspose1d는 채널별 가중치 양자화를 지원하지 않는 버전이 있어 텐서 단위 가중치로 양자화
+    weight = default_weight_fake_quant if qat else default_weight_observer
+    return mapping.set_object_type(nn.ConvTranspose1d, QConfig(activation=mapping.global_qconfig.activation, weight=weight))
+
+def load_float_model(model_path, model_kwargs=None):
+    model = QuantizableUNet1D(in_channels=1, out_channels=1, **(model_kwargs or {}))
+    model.load_state_dict(torch.load(model_path, map_location='cpu'))
+    return model.eval()
+
+def spectra_batch(file_paths, target_length=1024, n_spectra=256, corruption_effects=None, seed=0):
+    """파일들의 목표 스펙트럼과 고정 시드로 손상시킨 입력 → (inputs, targets) (N, 1, L) 텐서"""
+    flux = [f for f in (load_target(p, target_length) for p in sorted(file_paths)[:n_spectra]) if f is not None]
+    if not flux:
+        raise ValueError("사용할 수 있는 스펙트럼이 없습니다.")
+    batch = [(i, torch.from_numpy(f.astype(np.float32)).unsqueeze(0)) for i, f in enumerate(flux)]
+    return AugmentingCollate(seed=seed, effects=corruption_effects)(batch)
+
+# --- 1. 양자화 ---
+
+def quantize_ptq(model, calib_inputs, backend=None, batch_size=32):
+    """정적 PTQ: 보정 입력으로 활성값 범위를 관측한 뒤 INT8 모델로 변환합니다 (Conv-BN-ReLU는 자동 융합)."""
+    backend = backend or default_backend()
+    torch.backends.quantized.engine = backend
+    if calib_inputs.shape[-1] % 8:
+        raise ValueError(f"입력 길이는 8의 배수여야 합니다: {calib_inputs.shape[-1]}")
+    prepared = prepare_fx(copy.deepcopy(model).eval(), _qconfig_mapping(backend), example_inputs=(calib_inputs[:1],))
+    with torch.no_grad():
+        for chunk in tqdm(calib_inputs.split(batch_size), desc="Calibrating"):
+            prepared(chunk)
+    return convert_fx(prepared)
+
+def quantize_qat(model, train_loader, backend=None, epochs=2, lr=1e-5, max_batches=None):
+    """QAT: fake-quant를 넣은 모델을 train_loader((입력, 정답) 배치)로 미세조정한 뒤 INT8 모델로 변환합니다."""
+    backend = backend or default_backend()
+    torch.backends.quantized.engine = backend
+    example = next(inputs for inputs, _ in train_loader if inputs.nelement() > 0)
+    prepared = prepare_qat_fx(copy.deepcopy(model).train(), _qconfig_mapping(backend, qat=True), example_inputs=(example[:1],))
+    optimizer = torch.optim.Adam(prepared.parameters(), lr=lr)
+    criterion = nn.MSELoss()
+    for epoch in range(epochs):
+        progress = tqdm(train_loader, desc=f"QAT epoch {epoch + 1}/{epochs}", total=max_batches)
+        for i, (inputs, targets) in enumerate(progress):
+            if max_batches is not None and i >= max_batches:
+                break
+            if inputs.nelement() == 0: continue
+            optimizer.zero_grad()
+            loss = criterion(prepared(inputs), targets)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(prepared.parameters(), max_norm=1.0)
+            optimizer.step()
+            progress.set_postfix(loss=loss.item())
+    return convert_fx(prepared.eval())
+
+# --- 2. 내보내기 / 불러오기 ---
+
+def export_torchscript(qmodel, path, backend, target_length=1024):
+    """양자화 모델을 TorchScript로 저장합니다. 백엔드와 입력 길이는 파일 안에 함께 기록됩니다."""
+    example = torch.randn(1, 1, target_length)
+    with torch.no_grad():
+        traced = torch.jit.trace(qmodel, example)
+    meta = {'backend': backend, 'target_length': target_length, 'dtype': 'int8'}
+    torch.jit.save(traced, path, _extra_files={META_NAME: json.dumps(meta)})
+    print(f"TorchScript INT8 model saved to {path} ({os.path.getsize(path) / 1024 ** 2:.1f} MB, backend {backend})")
+    return path
+
+def export_onnx(model, path, target_length=1024, opset=17):
+    """fp32 모델을 배치 크기가 가변인 ONNX로 저장합니다."""
+    torch.onnx.export(copy.deepcopy(model).eval(), torch.randn(1, 1, target_length), path,
+                      input_names=['noisy_flux'], output_names=['denoised_flux'],
+                      dynamic_axes={'noisy_flux': {0: 'batch'}, 'denoised_flux': {0: 'batch'}}, opset_version=opset)
+    print(f"ONNX fp32 model saved to {path}")
+    return path
+
+def load_quantized(path):
+    """export_torchscript 결과 → (모델, 메타데이터). 저장 때의 양자화 엔진을 선택합니다."""
+    extra = {META_NAME: ''}
+    model = torch.jit.load(path, map_location='cpu', _extra_files=extra)
+    meta = json.loads(extra[META_NAME] or '{}')
+    if meta.get('backend') in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = meta['backend']
+    return model.eval(), meta
+
+# --- 3. 측정 ---
+
+def _seconds_per_call(model, inputs, repeats):
+    with torch.no_grad():
+        model(inputs)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(inputs)
+    return (time.perf_counter() - start) / repeats
+
+def evaluate(float_model, qmodel, inputs, targets, repeats=20, bulk_batch=64):
+    """fp32 대비 INT8 모델의 지연시간(스펙트럼 1개), 대량 처리량, RMSE와 출력 차이를 출력하고 딕셔너리로 반환합니다."""
+    single, bulk = inputs[:1], inputs[:bulk_batch]
+    results = {}
+    with torch.no_grad():
+        float_out = float_model.eval()(inputs)
+        quant_out = qmodel(inputs)
+    for name, model, out in (('fp32', float_model, float_out), ('int8', qmodel, quant_out)):
+        results[name] = {
+            'latency_ms': _seconds_per_call(model, single, repeats) * 1e3,
+            'bulk_spectra_per_s': len(bulk) / _seconds_per_call(model, bulk, max(1, repeats // 5)),
+            'rmse': ((out - targets) ** 2).mean().sqrt().item(),
+        }
+    results['speedup'] = results['fp32']['latency_ms'] / results['int8']['latency_ms']
+    results['bulk_speedup'] = results['int8']['bulk_spectra_per_s'] / results['fp32']['bulk_spectra_per_s']
+    results['rmse_increase'] = results['int8']['rmse'] / results['fp32']['rmse'] - 1
+    results['output_rmse_vs_fp32'] = ((quant_out - float_out) ** 2).mean().sqrt().item()
+    print(f"{len(inputs)} validation spectra, engine {torch.backends.quantized.engine}, {torch.get_num_threads()} threads")
+    for name in ('fp32', 'int8'):
+        r = results[name]
+        print(f"  {name}: {r['latency_ms']:7.2f} ms/spectrum, {r['bulk_spectra_per_s']:8.1f} spectra/s (batch {len(bulk)}), RMSE {r['rmse']:.5f}")
+    print(f"  speedup x{results['speedup']:.2f} (bulk x{results['bulk_speedup']:.2f}), "
+          f"RMSE change {results['rmse_increase']:+.2%}, int8 vs fp32 output RMSE {results['output_rmse_vs_fp32']:.5f}")
+    return results
+
+
+if __name__ == '__main__':
+    import corruptions
+    import dataset_manifest
+    from train_denoiser import split_files
+    MODEL_SAVE_DIR = r'C:\Users\chan2\Desktop\Can-Satellite\trained_models'
+    MODEL_PATH = os.path.join(MODEL_SAVE_DIR, 'best_model.pth')
+    MANIFEST_PATH = os.path.join(MODEL_SAVE_DIR, 'dataset_manifest.json')
+    # 경량 모델이면 학습 때의 UNet1D 인자 (lightweight_models.VARIANTS)
+    MODEL_KWARGS = None
+    TARGET_LENGTH = 1024
+    CALIBRATION_SPECTRA = 512
+    VALIDATION_SPECTRA = 256
+    BACKEND = default_backend()
+
+    files = dataset_manifest.valid_files(dataset_manifest.load_manifest(MANIFEST_PATH))
+    # train_model과 같은 해시 분할: 보정은 학습 파일, 평가는 학습에 쓰지 않은 검증 파일
+    calib_files, val_files = split_files(files, 0.2)
+    calib_inputs, _ = spectra_batch(calib_files, TARGET_LENGTH, CALIBRATION_SPECTRA, corruptions.EFFECTS, seed=1)
+    val_inputs, val_targets = spectra_batch(val_files, TARGET_LENGTH, VALIDATION_SPECTRA, corruptions.EFFECTS, seed=0)
+
+    float_model = load_float_model(MODEL_PATH, MODEL_KWARGS)
+    qmodel = quantize_ptq(float_model, calib_inputs, BACKEND)
+    quant_path = export_torchscript(qmodel, os.path.join(MODEL_SAVE_DIR, 'best_model_int8.pt'), BACKEND, TARGET_LENGTH)
+    export_onnx(float_model, os.path.join(MODEL_SAVE_DIR, 'best_model.onnx'), TARGET_LENGTH)
+    loaded, _ = load_quantized(quant_path)
+    evaluate(float_model, loaded, val_inputs, val_targets)
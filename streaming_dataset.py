@@ -0,0 +1,237 @@
+"""
+메모리보다 큰 학습 코퍼스를 위한 샤드 스트리밍 데이터셋 (train_denoiser.py 공용)
+
+1) write_shards: 스펙트럼 파일을 한 번만 검증/리샘플링해 shard_size 행씩 float32 .npy 샤드로 저장합니다.
+   출력 폴더 이름은 파일 목록(경로, 크기, 수정 시각)과 target_length의 해시라서 데이터가 바뀌면 새로 만들고,
+   index.json은 모든 샤드를 쓴 뒤 마지막에 원자적으로 기록하므로 중간에 끊긴 폴더는 재사용되지 않습니다.
+2) ShardedSpectraStream: 샤드를 메모리 맵으로 순서대로 읽는 IterableDataset.
+   - 에폭마다 섞은 샤드 순서로 행을 이어 분산 rank마다 같은 개수의 연속 구간으로 나누고, 다시 DataLoader 워커에 나눕니다.
+     rank/워커 사이에 겹치는 샘플이 없고, rank별 샘플 수(__len__)는 모든 rank에서 같으며 에폭과 무관합니다.
+   - 워커마다 마지막 배치가 덜 찬 채로 나오므로 실제 배치 수는 num_batches(batch_size, num_workers)로 구합니다.
+   - 셔플 버퍼(shuffle_buffer개)에서 무작위로 꺼내 샤드 안/사이의 순서를 섞습니다. 0이면 순서대로 (검증용).
+   - 에폭 번호는 공유 메모리 값이라 persistent_workers=True인 워커에도 set_epoch가 전달됩니다.
+   반환 형태는 SpectraDataset과 같은 (idx, (1, L) 텐서)이므로 AugmentingCollate를 그대로 씁니다.
+
+사용 예:
+    shard_dir = write_shards(files, 'cache/shards', target_length=1024)
+    stream = ShardedSpectraStream(shard_dir, samples_per_file=5)
+    loader = DataLoader(stream, batch_size=256, num_workers=4, pin_memory=True, persistent_workers=True, ...)
+
+    python streaming_dataset.py <샤드 출력 폴더> <CSV 디렉토리 ...>   # 워커 수별 처리량(samples/s) 측정
+"""
+import glob
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, DataLoader, get_worker_info
+from tqdm import tqdm
+
+# tools/module 의 공용 스펙트럼 로더(파싱 결과 캐시)를 사용하기 위해 경로 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from module.spectrum_cache import load_spectrum
+from module.resampler import resample_to_length
+
+INDEX_NAME = 'index.json'
+SHARD_SIZE = 4096
+
+def cache_key(file_paths, target_length):
+    """파일 목록(경로, 크기, 수정 시각)과 target_length로 만든 캐시 키"""
+    h = hashlib.sha1(f"target_length={target_length}".encode('utf-8'))
+    for path in file_paths:
+        st = os.stat(path)
+        h.update(f"\n{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}".encode('utf-8'))
+    return h.hexdigest()[:16]
+
+def load_target(file_path, target_length):
+    """SpectraDataset.__getitem__과 같은 검증/리샘플링. 쓸 수 없는 파일이면 None"""
+    try:
+        data = load_spectrum(file_path).astype(np.float32)
+        if not np.isfinite(data).all() or data.ndim != 2 or data.shape[1] < 2:
+            return None
+        target_flux = data[:, 1]
+        if len(target_flux) != target_length:
+            _, (target_flux,) = resample_to_length(data[:, 0], [target_flux], target_length)
+        return target_flux
+    except Exception:
+        return None
+
+def write_shards(file_paths, out_dir, target_length=1024, shard_size=SHARD_SIZE):
+    """
+    목표 스펙트럼을 shard_size 행씩 out_dir/shards_<길이>_<키>/shard_XXXXX.npy 로 저장하고 샤드 폴더를 반환합니다.
+    메모리에는 샤드 하나 분량만 올라갑니다. 같은 키의 완성된 폴더가 있으면 그대로 사용합니다.
+    """
+    file_paths = sorted(file_paths)
+    shard_dir = os.path.join(out_dir, f"shards_{target_length}_{cache_key(file_paths, target_length)}")
+    index_path = os.path.join(shard_dir, INDEX_NAME)
+    if os.path.exists(index_path):
+        print(f"Shard cache hit: {shard_dir}")
+        return shard_dir
+
+    os.makedirs(shard_dir, exist_ok=True)
+    start = time.perf_counter()
+    shards, files, skipped, buffer = [], [], [], []
+
+    def flush():
+        name = f"shard_{len(shards):05d}.npy"
+        tmp_path = os.path.join(shard_dir, name + ".tmp.npy")
+        np.save(tmp_path, np.stack(buffer).astype(np.float32))
+        os.replace(tmp_path, os.path.join(shard_dir, name))
+        shards.append({'name': name, 'rows': len(buffer), 'offset': len(files) - len(buffer)})
+        buffer.clear()
+
+    for file_path in tqdm(file_paths, desc="Writing shards"):
+        target_flux = load_target(file_path, target_length)
+        if target_flux is None:
+            skipped.append(file_path)
+            continue
+        buffer.append(target_flux)
+        files.append(file_path)
+        if len(buffer) == shard_size:
+            flush()
+    if buffer:
+        flush()
+
+    index = {'target_length': target_length, 'shards': shards, 'files': files, 'skipped': skipped}
+    with open(index_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+    os.replace(index_path + ".tmp", index_path)
+    print(f"Wrote {len(files)} spectra in {len(shards)} shards ({len(skipped)} invalid skipped) "
+          f"in {time.perf_counter() - start:.1f}s → {shard_dir}")
+    return shard_dir
+
+class ShardedSpectraStream(IterableDataset):
+    """
+    write_shards 결과를 (idx, (1, L) 텐서)로 스트리밍합니다. 파일마다 samples_per_file개의 샘플을 내며,
+    idx는 (전체 행 번호 * samples_per_file + k)라서 AugmentingCollate의 검증용 샘플별 시드가 그대로 동작합니다.
+    rank/world_size가 None이면 생성 시점에 torch.distributed가 초기화되어 있으면 그 값을, 아니면 단일 프로세스를 사용합니다.
+    (DataLoader 워커는 spawn으로 시작하면 프로세스 그룹이 없으므로 rank는 반드시 생성 시점에 정합니다.)
+
+    rank 분할은 행 단위입니다. 에폭마다 샤드 순서를 (모든 rank가 같게) 섞어 이어 붙인 행을 rank마다 같은 개수의
+    연속 구간으로 나누고, 그 구간을 다시 워커마다 연속 구간으로 나눕니다. 행 수가 world_size로 나누어떨어지지 않으면
+    나머지(world_size - 1개 이하)는 해당 에폭에서 빠집니다.
+    """
+    def __init__(self, shard_dir, samples_per_file=5, shuffle_buffer=4096, seed=0, rank=None, world_size=None):
+        with open(os.path.join(shard_dir, INDEX_NAME), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.shard_dir = shard_dir
+        self.shards = index['shards']
+        self.files = index['files']
+        self.samples_per_file = samples_per_file
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        if rank is None:
+            if torch.distributed.is_available() and torch.distributed.is_initialized():
+                rank, world_size = torch.distributed.get_rank(), torch.distributed.get_world_size()
+            else:
+                rank, world_size = 0, 1
+        self.rank = rank
+        self.world_size = world_size or 1
+        self._epoch = mp.Value('i', 0)
+        if not self.shards:
+            raise ValueError("데이터 파일을 찾을 수 없습니다. 경로를 확인하세요.")
+        self.rows_per_rank = sum(shard['rows'] for shard in self.shards) // self.world_size
+        if self.rows_per_rank == 0:
+            raise ValueError(f"스펙트럼 {len(self.files)}개를 {self.world_size}개 rank에 나눌 수 없습니다.")
+
+    def set_epoch(self, epoch):
+        self._epoch.value = epoch
+
+    def __len__(self):
+        return self.rows_per_rank * self.samples_per_file
+
+    def _worker_range(self, worker_id, num_workers):
+        """이 rank 구간 안에서 워커가 맡는 [시작, 끝) 행 번호 (에폭 순서 기준)"""
+        start = self.rank * self.rows_per_rank
+        return (start + self.rows_per_rank * worker_id // num_workers,
+                start + self.rows_per_rank * (worker_id + 1) // num_workers)
+
+    def num_batches(self, batch_size, num_workers=0):
+        """
+        DataLoader가 실제로 내는 배치 수. 워커마다 마지막 배치가 덜 찬 채로 나오므로 num_workers > 1이면
+        len(loader)(= ceil(len(dataset) / batch_size))보다 클 수 있습니다.
+        """
+        num_workers = max(num_workers, 1)
+        total = 0
+        for worker_id in range(num_workers):
+            lo, hi = self._worker_range(worker_id, num_workers)
+            total += -(-(hi - lo) * self.samples_per_file // batch_size)
+        return total
+
+    def _pieces(self, epoch, worker_id, num_workers):
+        """워커가 읽을 (샤드, 시작 행, 끝 행) 목록"""
+        shards = self.shards
+        if self.shuffle_buffer > 0:
+            # 모든 rank가 같은 순서를 보므로 rank 구간이 겹치지 않음
+            order = np.random.default_rng([self.seed, epoch]).permutation(len(shards))
+            shards = [shards[i] for i in order]
+        lo, hi = self._worker_range(worker_id, num_workers)
+        pieces, position = [], 0
+        for shard in shards:
+            start, stop = max(lo, position), min(hi, position + shard['rows'])
+            if start < stop:
+                pieces.append((shard, start - position, stop - position))
+            position += shard['rows']
+        return pieces
+
+    def _samples(self, pieces, rng):
+        for shard, start, stop in pieces:
+            data = np.load(os.path.join(self.shard_dir, shard['name']), mmap_mode='r')
+            rows = start + rng.permutation(stop - start) if self.shuffle_buffer > 0 else range(start, stop)
+            for row in rows:
+                flux = torch.from_numpy(np.array(data[row])).unsqueeze(0)
+                base = (shard['offset'] + int(row)) * self.samples_per_file
+                for k in range(self.samples_per_file):
+                    yield base + k, flux
+
+    def __iter__(self):
+        epoch = self._epoch.value
+        worker = get_worker_info()
+        worker_id, num_workers = (0, 1) if worker is None else (worker.id, worker.num_workers)
+
+        rng = np.random.default_rng([self.seed, epoch, self.rank, worker_id + 1])
+        samples = self._samples(self._pieces(epoch, worker_id, num_workers), rng)
+        if self.shuffle_buffer <= 0:
+            yield from samples
+            return
+
+        buffer = []
+        for item in samples:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(item)
+                continue
+            j = int(rng.integers(len(buffer)))
+            yield buffer[j]
+            buffer[j] = item
+        for j in rng.permutation(len(buffer)):
+            yield buffer[j]
+
+def benchmark(shard_dir, batch_size=256, worker_counts=(0, 1, 2, 4), epochs=2, samples_per_file=5):
+    """워커 수별로 학습 없이 데이터만 읽어 samples/s를 출력합니다 (입력 손상 생성 포함)."""
+    from train_denoiser import AugmentingCollate
+    results = {}
+    for num_workers in worker_counts:
+        stream = ShardedSpectraStream(shard_dir, samples_per_file=samples_per_file)
+        loader = DataLoader(stream, batch_size=batch_size, num_workers=num_workers, collate_fn=AugmentingCollate(),
+                            pin_memory=torch.cuda.is_available(), persistent_workers=num_workers > 0)
+        for epoch in range(epochs):
+            stream.set_epoch(epoch)
+            start = time.perf_counter()
+            n = sum(len(targets) for _, targets in loader)
+            seconds = time.perf_counter() - start
+        # 워커 시작 비용이 빠진 마지막 에폭 기준
+        results[num_workers] = n / seconds
+        print(f"  num_workers={num_workers}: {n} samples in {seconds:.2f}s ({results[num_workers]:,.0f} samples/s)")
+    return results
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("사용법: python streaming_dataset.py <샤드 출력 폴더> <CSV 디렉토리 ...>")
+        sys.exit(1)
+    files = [p for d in sys.argv[2:] for p in glob.glob(os.path.join(d, '*.csv'))]
+    benchmark(write_shards(files, sys.argv[1]))
@@ -0,0 +1,232 @@
+"""
+toolbox.py의 기능을 GUI 없이 디렉토리/글롭 단위로 일괄 실행하는 커맨드라인 도구입니다.
+
+사용 예:
+    python batch.py preprocess predata/dr4 --out processed/dr4 --workers 8
+    python batch.py snr "predata/**/*.csv" --results snr_results.csv
+
+- 작업은 프로세스 풀에 청크 단위로 분배됩니다.
+- 파일 출력 작업(preprocess, doffler)은 --out 아래에 입력 디렉토리 구조를 그대로 복제해 저장합니다.
+- 모든 작업은 파일별 상태/오류를 하나의 결과 CSV에 기록합니다.
+- 다시 실행하면 출력이 입력보다 최신인 파일은 건너뜁니다 (--force로 무시).
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from tqdm import tqdm
+
+# 모듈 불러오기
+import module.axishifter as ax
+import module.resampler as res
+import module.de_baseline as db
+import module.snr as snr
+import module.doffler as doffler
+import module.info as info
+
+# 전처리/보정 단계에서 생성되는 파일 접미사 (디렉토리 스캔 시 입력에서 제외)
+DERIVED_SUFFIXES = ("_vel", "_resampled", "_debaselined", "_corrected")
+
+# --- 작업 정의 ---
+# 각 작업은 (입력 파일, 출력 기준 경로) 를 받아 결과 딕셔너리를 반환합니다 ('status'를 넣으면 'ok' 대신 사용).
+# 출력 기준 경로는 입력 파일과 같은 이름을 가진 (미러링된) 경로입니다.
+
+def run_preprocess(file_path, out_base):
+    # toolbox.preprocess와 동일한 순서: 축변환 → 리샘플링 → 베이스라인 제거
+    vel_file = ax.convert_file(file_path, out_base.replace(".csv", "_vel.csv"))
+    resampled_file = res.resample_file(vel_file)
+    final_file, diagnostics = db.remove_baseline_file(resampled_file)
+    return {'output': final_file,
+            'baseline_rms': diagnostics['rms'],
+            'baseline_channels': diagnostics['n_used'],
+            'baseline_converged': diagnostics['converged']}
+
+def run_snr(file_path, out_base):
+    return snr.spectrum_statistics(file_path)
+
+def run_info(file_path, out_base):
+    result = info.get_info(file_path)
+    return {'rows': result['rows'], 'columns': ' '.join(result['columns'])}
+
+def run_doffler(file_path, out_base):
+    # 관측 시각이 없는 파일(MaNGA/NRAO 내보내기 등)은 오류 대신 skipped로 기록
+    try:
+        output, correction, assumed = doffler.correct_file(file_path, out_base.replace(".csv", "_corrected.csv"))
+    except doffler.MissingMetadata as e:
+        return {'status': 'skipped', 'error': str(e)}
+    return {'output': output, 'doppler_correction_kms': correction, 'doppler_assumed': ', '.join(assumed)}
+
+TASKS = {
+    'preprocess': run_preprocess,
+    'snr': run_snr,
+    'info': run_info,
+    'doffler': run_doffler,
+}
+
+# 작업별 최종 출력 파일 이름 규칙 (결과 파일만 기록하는 작업은 None)
+OUTPUT_NAMES = {
+    'preprocess': lambda base: base.replace(".csv", "_vel_resampled_debaselined.csv"),
+    'doffler': lambda base: base.replace(".csv", "_corrected.csv"),
+    'snr': None,
+    'info': None,
+}
+
+# --- 입력 수집 ---
+
+def is_derived(file_path):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return stem.endswith(DERIVED_SUFFIXES)
+
+def collect_inputs(patterns):
+    """디렉토리, 글롭 패턴, 파일 경로 목록을 (입력 파일, 기준 디렉토리) 목록으로 펼칩니다."""
+    inputs = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root = pattern
+            matches = glob.glob(os.path.join(pattern, '**', '*.csv'), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+            # 글롭의 고정된 앞부분을 미러링 기준 디렉토리로 사용
+            root = os.path.dirname(pattern.split('*')[0].split('?')[0]) or '.'
+        for path in sorted(matches):
+            if not os.path.isfile(path) or is_derived(path):
+                continue
+            key = os.path.abspath(path)
+            if key in seen:
+                continue
+            seen.add(key)
+            inputs.append((path, root))
+    return inputs
+
+def mirrored_base(file_path, root, out_dir):
+    """입력 파일을 out_dir 아래의 동일한 상대 경로로 매핑합니다. out_dir이 없으면 입력 옆에 저장합니다."""
+    if out_dir is None:
+        return file_path
+    rel = os.path.relpath(file_path, root)
+    return os.path.join(out_dir, rel)
+
+def is_up_to_date(file_path, output_path):
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(file_path)
+
+# --- 워커 ---
+
+def _run_one(job):
+    """워커 프로세스에서 파일 하나를 처리합니다. 예외는 결과 행으로 기록합니다."""
+    task, file_path, out_base = job
+    start = time.perf_counter()
+    row = {'file': file_path, 'task': task}
+    try:
+        out_dir = os.path.dirname(out_base)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        result = TASKS[task](file_path, out_base)
+        row['status'] = 'ok'
+        row['error'] = ''
+        row.update(result)
+    except Exception as e:
+        row['status'] = 'error'
+        row['error'] = f"{type(e).__name__}: {e}"
+        row['traceback'] = traceback.format_exc(limit=3)
+    row['input_mtime'] = os.path.getmtime(file_path) if os.path.exists(file_path) else None
+    row['seconds'] = round(time.perf_counter() - start, 4)
+    return row
+
+# --- 실행 ---
+
+def load_previous_results(results_path):
+    """이전 결과 파일에서 결과 파일보다 오래된 입력의 성공 행만 재사용합니다."""
+    if not results_path or not os.path.exists(results_path):
+        return {}
+    results_mtime = os.path.getmtime(results_path)
+    previous = pd.read_csv(results_path)
+    rows = {}
+    for row in previous.to_dict('records'):
+        if row.get('status') != 'ok' or not os.path.exists(row['file']):
+            continue
+        if os.path.getmtime(row['file']) <= results_mtime:
+            rows[os.path.abspath(row['file'])] = row
+    return rows
+
+def run_batch(task, patterns, out_dir=None, results_path=None, workers=None, chunksize=16, force=False):
+    """여러 파일에 작업을 병렬로 실행하고 파일별 결과 행 목록을 반환합니다."""
+    if task not in TASKS:
+        raise ValueError(f"알 수 없는 작업: {task} (가능: {', '.join(TASKS)})")
+
+    inputs = collect_inputs(patterns)
+    if not inputs:
+        print(f"경고: {patterns} 에서 처리할 CSV 파일을 찾을 수 없습니다.")
+        return []
+
+    if results_path is None:
+        results_path = os.path.join(out_dir or '.', f"batch_{task}_results.csv")
+
+    previous = {} if force else load_previous_results(results_path)
+    output_name = OUTPUT_NAMES[task]
+
+    jobs, rows = [], []
+    for file_path, root in inputs:
+        out_base = mirrored_base(file_path, root, out_dir)
+        if not force:
+            if output_name is not None and is_up_to_date(file_path, output_name(out_base)):
+                rows.append({'file': file_path, 'task': task, 'status': 'skipped',
+                             'output': output_name(out_base), 'error': ''})
+                continue
+            if output_name is None and os.path.abspath(file_path) in previous:
+                rows.append(previous[os.path.abspath(file_path)])
+                continue
+        jobs.append((task, file_path, out_base))
+
+    print(f"총 {len(inputs)}개 파일 중 {len(jobs)}개 처리, {len(inputs) - len(jobs)}개는 최신 상태로 건너뜁니다.")
+
+    if jobs:
+        workers = workers or os.cpu_count() or 1
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_run_one, jobs, chunksize=max(1, chunksize))
+            progress = tqdm(results, total=len(jobs), desc=f"{task} ({workers} workers)")
+            errors = skipped = 0
+            for row in progress:
+                rows.append(row)
+                if row['status'] == 'error':
+                    errors += 1
+                    progress.set_postfix(errors=errors)
+                elif row['status'] == 'skipped':
+                    skipped += 1
+        elapsed = time.perf_counter() - start
+        print(f"{len(jobs)}개 파일 처리 완료: {elapsed:.1f}s ({len(jobs) / elapsed:.1f} files/s), 오류 {errors}개, 건너뜀 {skipped}개")
+
+    results_dir = os.path.dirname(results_path)
+    if results_dir:
+        os.makedirs(results_dir, exist_ok=True)
+    pd.DataFrame(rows).to_csv(results_path, index=False)
+    print(f"결과 저장: {results_path}")
+
+    for row in rows:
+        if row['status'] == 'error':
+            print(f"[FAIL] {row['file']} - {row['error']}")
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CanSat 스펙트럼 일괄 처리 (toolbox 헤드리스 모드)")
+    parser.add_argument('task', choices=sorted(TASKS), help="실행할 작업")
+    parser.add_argument('inputs', nargs='+', help="입력 디렉토리, 글롭 패턴 또는 CSV 파일")
+    parser.add_argument('--out', default=None, help="출력 파일을 미러링해 저장할 디렉토리 (기본: 입력 옆)")
+    parser.add_argument('--results', default=None, help="통합 결과 CSV 경로")
+    parser.add_argument('--workers', type=int, default=None, help="워커 프로세스 수 (기본: CPU 코어 수)")
+    parser.add_argument('--chunksize', type=int, default=16, help="워커에 한 번에 넘길 파일 수")
+    parser.add_argument('--force', action='store_true', help="최신 출력이 있어도 다시 처리")
+    args = parser.parse_args(argv)
+
+    rows = run_batch(args.task, args.inputs, out_dir=args.out, results_path=args.results,
+                     workers=args.workers, chunksize=args.chunksize, force=args.force)
+    if any(row['status'] == 'error' for row in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
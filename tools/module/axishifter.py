@@ -1,16 +1,14 @@
-import pandas as pd
 import sys
+try:
+    from module.spectrum_cache import read_spectrum_df
+except ModuleNotFoundError:  # python tools/module/<파일>.py 로 단독 실행할 때
+    from spectrum_cache import read_spectrum_df
 
-def main(file_path=None):
-    if file_path is None and len(sys.argv) > 1:
-        file_path = sys.argv[1]
-    if not file_path:
-        print("파일 경로를 입력하세요.")
-        return
-
+def convert_file(file_path, output=None):
+    """주파수 축을 속도 축으로 변환해 저장하고 출력 파일 경로를 반환합니다."""
     # MaNGA 파일 형식에 맞게 주석(#)을 무시하고, 공백으로 분리된 데이터를 읽음
     # 열 이름: freq, intensity, pre_baseline_intensity
-    df = pd.read_csv(file_path, comment='#', delim_whitespace=True, names=['frequency', 'intensity', 'pre_baseline_intensity'])
+    df = read_spectrum_df(file_path, names=['frequency', 'intensity', 'pre_baseline_intensity'])
 
     # 물리 상수 정의
     C_KMS = 299792.458  # 빛의 속도 (km/s)
@@ -23,10 +21,21 @@ def main(file_path=None):
     # 필요한 열(velocity, intensity)만 선택
     df = df[['velocity', 'intensity']]
     
-    output = file_path.replace(".csv", "_vel.csv")
+    if output is None:
+        output = file_path.replace(".csv", "_vel.csv")
     
     # 다음 모듈에서 쉽게 읽을 수 있도록 헤더 없이, 공백으로 분리된 파일로 저장
     df.to_csv(output, index=False, header=False, sep=' ')
+    return output
+
+def main(file_path=None):
+    if file_path is None and len(sys.argv) > 1:
+        file_path = sys.argv[1]
+    if not file_path:
+        print("파일 경로를 입력하세요.")
+        return
+
+    output = convert_file(file_path)
     print(f"파일 정리 및 변환 완료: {output}")
 
 if __name__ == "__main__":
@@ -1,5 +1,210 @@
-import pandas as pd
+import numpy as np
 import sys
+from scipy.linalg import solveh_banded
+from scipy.ndimage import maximum_filter1d
+try:
+    from module.spectrum_cache import read_spectrum_df
+except ModuleNotFoundError:  # python tools/module/<파일>.py 로 단독 실행할 때
+    from spectrum_cache import read_spectrum_df
+
+# --- 배치 베이스라인 추정 엔진 ---
+# 모든 함수는 (N, L) 배열을 한 번에 처리하고 (baseline, diagnostics)를 반환합니다.
+#   method='poly'       : (마스크된) 다항식 최소제곱. N개의 정규방정식을 한 번에 풉니다.
+#   method='sigma_clip' : 반복 시그마 클리핑 + 선(line) 마스킹을 적용한 다항식 적합
+#   method='als'        : 비대칭 최소제곱 (Eilers & Boelens). N개의 띠 행렬을 하나의 블록 띠 행렬로 풉니다.
+# diagnostics는 스펙트럼별 배열 딕셔너리입니다 (rms, n_used, n_iter, converged 등).
+
+MAD_TO_SIGMA = 1.4826
+
+def _as_batch(flux):
+    flux = np.asarray(flux, dtype=np.float64)
+    return flux[None, :] if flux.ndim == 1 else flux
+
+def _design_matrix(length, order, x=None):
+    """[-1, 1]로 정규화한 축의 Vandermonde 행렬 (L, order+1)"""
+    if x is None:
+        x = np.arange(length, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    span = x.max() - x.min()
+    t = 2.0 * (x - x.min()) / span - 1.0 if span > 0 else np.zeros_like(x)
+    return np.vander(t, order + 1, increasing=True)
+
+def fit_polynomial(flux, order=1, mask=None, x=None):
+    """
+    마스크(True=베이스라인으로 사용)된 채널만으로 다항식을 적합합니다.
+    N개의 (order+1)x(order+1) 정규방정식을 np.linalg.solve 한 번으로 풉니다.
+    반환값: (baseline (N, L), coeffs (N, order+1))
+    """
+    y = _as_batch(flux)
+    w = np.ones_like(y) if mask is None else _as_batch(mask).astype(np.float64)
+    w = w * np.isfinite(y)
+    y = np.where(np.isfinite(y), y, 0.0)
+    A = _design_matrix(y.shape[1], order, x)
+    k = order + 1
+    # 정규방정식 G = A^T W A, b = A^T W y 를 행렬곱 한 번씩으로 계산
+    G = (w @ (A[:, :, None] * A[:, None, :]).reshape(-1, k * k)).reshape(-1, k, k)
+    b = (w * y) @ A
+    # 사용 채널이 부족한 행도 풀리도록 아주 작은 정규화 항 추가
+    G += 1e-10 * np.eye(k)[None, :, :]
+    coeffs = np.linalg.solve(G, b[:, :, None])[:, :, 0]
+    return coeffs @ A.T, coeffs
+
+def masked_median(values, mask):
+    """마스크된 채널의 행별 중앙값. 정렬 한 번으로 처리해 np.nanmedian보다 빠릅니다."""
+    count = mask.sum(axis=1)
+    s = np.sort(np.where(mask, values, np.inf), axis=1)
+    lo = np.take_along_axis(s, np.maximum((count - 1) // 2, 0)[:, None], axis=1)
+    hi = np.take_along_axis(s, np.maximum(count // 2, 0)[:, None], axis=1)
+    return np.where(count[:, None] > 0, 0.5 * (lo + hi), np.nan)
+
+def masked_sigma(resid, mask):
+    """마스크된 채널의 MAD 기반 강건 표준편차 (행별)"""
+    med = masked_median(resid, mask)
+    return MAD_TO_SIGMA * masked_median(np.abs(resid - med), mask)
+
+def sigma_clip_baseline(flux, order=1, nsigma=3.0, max_iter=10, line_mask=None, dilate=5, x=None):
+    """
+    반복 시그마 클리핑 다항식 베이스라인.
+    매 반복마다 nsigma 밖의 채널을 제외하고, 양의 이상치(선 후보)는 dilate 채널만큼 넓혀 함께 제외합니다.
+    line_mask (True=선 영역)로 미리 알고 있는 선 위치를 지정할 수 있습니다.
+    """
+    y = _as_batch(flux)
+    n, length = y.shape
+    base_mask = np.isfinite(y)
+    if line_mask is not None:
+        base_mask &= ~_as_batch(line_mask).astype(bool)
+    mask = base_mask.copy()
+    n_iter = np.zeros(n, dtype=np.int64)
+    converged = np.zeros(n, dtype=bool)
+
+    for it in range(1, max_iter + 1):
+        baseline, coeffs = fit_polynomial(y, order, mask, x)
+        resid = y - baseline
+        sigma = masked_sigma(resid, mask)
+        sigma = np.where(np.isfinite(sigma) & (sigma > 0), sigma, np.inf)
+        line = resid > nsigma * sigma
+        if dilate > 0:
+            line = maximum_filter1d(line.astype(np.uint8), size=2 * dilate + 1, axis=1).astype(bool)
+        new_mask = base_mask & ~line & (np.abs(resid) <= nsigma * sigma)
+        # 사용할 채널이 너무 적어지면 이전 마스크 유지
+        too_few = new_mask.sum(axis=1) <= order + 1
+        new_mask[too_few] = mask[too_few]
+        # 경계에서 오가는 채널 한두 개는 수렴으로 간주
+        changed = np.sum(new_mask != mask, axis=1) > max(1, length // 1000)
+        n_iter[~converged] = it
+        converged |= ~changed
+        mask = new_mask
+        if converged.all():
+            break
+
+    baseline, coeffs = fit_polynomial(y, order, mask, x)
+    resid = np.where(mask, y - baseline, np.nan)
+    diagnostics = {
+        'rms': np.sqrt(np.nanmean(resid ** 2, axis=1)),
+        'n_used': mask.sum(axis=1),
+        'n_iter': n_iter,
+        'converged': converged,
+        'coeffs': coeffs,
+    }
+    return baseline, diagnostics
+
+def _second_difference_banded(n, length, lam):
+    """
+    lam * D^T D (D: 2차 차분) 를 N개 블록으로 이어 붙인 하삼각 띠 형식 (3, N*L).
+    블록 경계를 넘는 항은 0이므로 각 스펙트럼은 서로 독립적으로 풀립니다.
+    """
+    diag = np.full(length, 6.0)
+    diag[[0, -1]] = 1.0
+    diag[[1, -2]] = 5.0
+    sub1 = np.full(length, -4.0)
+    sub1[[0, -2]] = -2.0
+    sub1[-1] = 0.0
+    sub2 = np.ones(length)
+    sub2[-2:] = 0.0
+    ab = np.zeros((3, n * length))
+    ab[0] = np.tile(diag, n) * lam
+    ab[1] = np.tile(sub1, n) * lam
+    ab[2] = np.tile(sub2, n) * lam
+    return ab
+
+def als_baseline(flux, lam=1e5, p=0.01, max_iter=10, tol=1e-3):
+    """
+    비대칭 최소제곱 베이스라인 (Eilers & Boelens 2005).
+    (W + lam D^T D) z = W y 를 모든 스펙트럼에 대해 하나의 블록 띠 행렬로 풉니다.
+    """
+    y = _as_batch(flux)
+    n, length = y.shape
+    if length < 4:
+        raise ValueError("ALS 베이스라인에는 최소 4개 채널이 필요합니다.")
+    finite = np.isfinite(y)
+    y0 = np.where(finite, y, 0.0)
+    penalty = _second_difference_banded(n, length, lam)
+    w = finite.astype(np.float64)
+    n_iter = np.zeros(n, dtype=np.int64)
+    converged = np.zeros(n, dtype=bool)
+
+    for it in range(1, max_iter + 1):
+        ab = penalty.copy()
+        ab[0] += w.ravel()
+        z = solveh_banded(ab, (w * y0).ravel(), lower=True, check_finite=False).reshape(n, length)
+        new_w = np.where(y0 > z, p, 1.0 - p) * finite
+        changed = np.mean(np.abs(new_w - w), axis=1) > tol
+        n_iter[~converged] = it
+        converged |= ~changed
+        w = new_w
+        if converged.all():
+            break
+
+    used = (w > 0.5) & finite
+    resid = np.where(used, y - z, np.nan)
+    diagnostics = {
+        'rms': np.sqrt(np.nanmean(resid ** 2, axis=1)),
+        'n_used': used.sum(axis=1),
+        'n_iter': n_iter,
+        'converged': converged,
+    }
+    return z, diagnostics
+
+def estimate_baseline(flux, method='sigma_clip', **kwargs):
+    """(N, L) 배치의 베이스라인을 추정합니다. 반환값: (baseline (N, L), diagnostics)"""
+    if method == 'poly':
+        y = _as_batch(flux)
+        mask = np.isfinite(y)
+        if kwargs.get('mask') is not None:
+            mask &= _as_batch(kwargs['mask']).astype(bool)
+        baseline, coeffs = fit_polynomial(y, kwargs.get('order', 1), mask, kwargs.get('x'))
+        resid = np.where(mask, y - baseline, np.nan)
+        diagnostics = {
+            'rms': np.sqrt(np.nanmean(resid ** 2, axis=1)),
+            'n_used': mask.sum(axis=1),
+            'n_iter': np.ones(len(y), dtype=np.int64),
+            'converged': np.ones(len(y), dtype=bool),
+            'coeffs': coeffs,
+        }
+        return baseline, diagnostics
+    if method == 'sigma_clip':
+        return sigma_clip_baseline(flux, **kwargs)
+    if method == 'als':
+        return als_baseline(flux, **kwargs)
+    raise ValueError(f"알 수 없는 베이스라인 방법: {method} (poly, sigma_clip, als)")
+
+def remove_baseline_file(file_path, output=None, method='sigma_clip', **kwargs):
+    """베이스라인을 제거해 저장하고 (출력 파일 경로, 진단 정보)를 반환합니다."""
+    # 공백으로 분리된 데이터 읽기 (헤더 없음)
+    df = read_spectrum_df(file_path, names=['velocity', 'intensity'])
+
+    if method != 'als':
+        kwargs.setdefault('x', df['velocity'].values)  # 다항식은 속도 축 기준으로 적합
+    baseline, diagnostics = estimate_baseline(df['intensity'].values, method=method, **kwargs)
+    df['intensity'] = df['intensity'] - baseline[0]
+
+    if output is None:
+        output = file_path.replace(".csv", "_debaselined.csv")
+
+    # 다음 모듈 호환성을 위해 헤더 없이 공백으로 분리하여 저장
+    df.to_csv(output, index=False, header=False, sep=' ')
+    summary = {key: value[0].item() for key, value in diagnostics.items() if np.ndim(value) == 1}
+    return output, summary
 
 def main(file_path=None):
     if file_path is None and len(sys.argv) > 1:
@@ -8,17 +213,9 @@ def main(file_path=None):
         print("파일 경로를 입력하세요.")
         return
 
-    # 공백으로 분리된 데이터 읽기 (헤더 없음)
-    df = pd.read_csv(file_path, delim_whitespace=True, names=['velocity', 'intensity'])
-
-    baseline = df['intensity'].mean()
-    df['intensity'] = df['intensity'] - baseline
-    
-    output = file_path.replace(".csv", "_debaselined.csv")
-    
-    # 다음 모듈 호환성을 위해 헤더 없이 공백으로 분리하여 저장
-    df.to_csv(output, index=False, header=False, sep=' ')
+    output, diagnostics = remove_baseline_file(file_path)
     print(f"베이스라인 제거 완료: {output}")
+    print(f"  잔차 RMS: {diagnostics['rms']:.4g}, 사용 채널: {diagnostics['n_used']}, 반복: {diagnostics['n_iter']}")
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,238 @@
-import pandas as pd
+import os
+import re
 import sys
+from calendar import timegm
+from functools import lru_cache
+from time import strptime
+
+import numpy as np
+try:
+    from module.spectrum_cache import read_spectrum_df
+except ModuleNotFoundError:  # python tools/module/<파일>.py 로 단독 실행할 때
+    from spectrum_cache import read_spectrum_df
+
+# --- 도플러(관측자 운동) 보정 엔진 ---
+# 관측 시각, 관측 위치, 지향 방향 배열을 받아 수천 개 스펙트럼의 보정값을 한 번에 계산합니다.
+# 인터넷/IERS 표 없이 동작하도록 저정밀 해석식(Astronomical Almanac)을 사용합니다.
+#   - 지구 공전: 태양 겉보기 경도 식 + 달에 의한 지구 흔들림 + 목성/토성에 의한 태양 흔들림 (정확도 ~0.02 km/s)
+#   - 지구 자전: GMST(UT1≈UTC)와 WGS84 관측 위치로 계산 (최대 0.46 km/s)
+#   - LSRK: 태양이 (RA, Dec) = (18h03m50.29s, +30°00'16.8") 방향으로 20 km/s로 운동
+# 공전 항은 관측 구간 전체에 대해 미리 표로 만들어 캐시하고, 각 시각은 표에서 선형 보간합니다.
+#
+# 보정값 v_corr는 관측 속도에 더하는 값입니다: v_lsrk = v_obs + v_corr
+
+C_KMS = 299792.458
+AU_KM = 149597870.7
+SECONDS_PER_DAY = 86400.0
+UNIX_EPOCH_JD = 2440587.5
+J2000_JD = 2451545.0
+OBLIQUITY_J2000_DEG = 23.439291
+EARTH_ROTATION_RAD_S = 7.2921150e-5
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+MOON_MASS_FRACTION = 0.0121506  # m_moon / (m_earth + m_moon)
+LSRK_SPEED_KMS = 20.0
+LSRK_APEX_RA_DEG = 270.95954   # 18h03m50.29s
+LSRK_APEX_DEC_DEG = 30.004667  # +30°00'16.8"
+
+# 태양 흔들림에 기여하는 행성: (태양 대비 질량비, 궤도 반지름 AU, J2000 평균 경도 deg, 세기당 경도 변화 deg)
+PLANETS = (
+    (1 / 1047.3486, 5.2026, 34.39644, 3034.74612775),   # 목성
+    (1 / 3497.898, 9.5549, 49.95424, 1222.49362201),    # 토성
+)
+
+EPHEMERIS_STEP_S = 600.0
+
+# 기본 관측지 (헤더/인자로 위치가 주어지지 않을 때 사용; 서울). 사용하면 correct_file이 가정 목록에 기록합니다.
+DEFAULT_LAT_DEG = 37.5665
+DEFAULT_LON_DEG = 126.9780
+DEFAULT_HEIGHT_M = 0.0
+
+class MissingMetadata(ValueError):
+    """보정에 필요한 관측 메타데이터(시각, strict 모드에서는 위치/지향)가 없는 파일"""
+
+def _unit_vector(ra_deg, dec_deg):
+    ra, dec = np.radians(ra_deg), np.radians(dec_deg)
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=-1)
+
+def _ecliptic_to_equatorial(vec):
+    eps = np.radians(OBLIQUITY_J2000_DEG)
+    x, y, z = vec[..., 0], vec[..., 1], vec[..., 2]
+    return np.stack([x, y * np.cos(eps) - z * np.sin(eps), y * np.sin(eps) + z * np.cos(eps)], axis=-1)
+
+def _earth_barycentric_position_au(jd):
+    """지구 중심의 태양계 질량중심 기준 위치 (J2000 황도 좌표, AU)"""
+    n = jd - J2000_JD
+    T = n / 36525.0
+    # 태양의 지심 황경 (평균 춘분점 of date → J2000 으로 세차 보정)
+    L = np.radians(280.460 + 0.9856474 * n)
+    g = np.radians(357.528 + 0.9856003 * n)
+    lam = L + np.radians(1.915) * np.sin(g) + np.radians(0.020) * np.sin(2 * g) - np.radians(1.396971) * T
+    R = 1.00014 - 0.01671 * np.cos(g) - 0.00014 * np.cos(2 * g)
+    earth = -R[..., None] * np.stack([np.cos(lam), np.sin(lam), np.zeros_like(lam)], axis=-1)
+
+    # 지구-달 질량중심에 대한 지구의 흔들림
+    Lm = np.radians(218.316 + 13.176396 * n)
+    Mm = np.radians(134.963 + 13.064993 * n)
+    lam_m = Lm + np.radians(6.289) * np.sin(Mm)
+    r_m = (385001.0 - 20905.0 * np.cos(Mm)) / AU_KM
+    moon = r_m[..., None] * np.stack([np.cos(lam_m), np.sin(lam_m), np.zeros_like(lam_m)], axis=-1)
+    earth = earth - MOON_MASS_FRACTION * moon
+
+    # 목성/토성에 의한 태양의 질량중심 흔들림
+    sun = np.zeros_like(earth)
+    for mass_ratio, a, L0, rate in PLANETS:
+        Lp = np.radians(L0 + rate * T)
+        sun -= (mass_ratio / (1 + mass_ratio)) * a * np.stack([np.cos(Lp), np.sin(Lp), np.zeros_like(Lp)], axis=-1)
+    return earth + sun
+
+@lru_cache(maxsize=32)
+def _ephemeris_table(i0, i1, step_s):
+    """[i0*step, i1*step] 구간의 지구 공전 속도 표 (적도 J2000, km/s). 중앙 차분으로 미분합니다."""
+    t = np.arange(i0, i1 + 1) * step_s
+    jd = t / SECONDS_PER_DAY + UNIX_EPOCH_JD
+    h = 0.01  # day
+    v = (_earth_barycentric_position_au(jd + h) - _earth_barycentric_position_au(jd - h)) / (2 * h)
+    v_kms = _ecliptic_to_equatorial(v) * AU_KM / SECONDS_PER_DAY
+    return t, v_kms
+
+def earth_orbital_velocity(times, step_s=EPHEMERIS_STEP_S):
+    """유닉스 시각 배열에 대한 지구 공전(질량중심 기준) 속도 (..., 3) km/s"""
+    times = np.asarray(times, dtype=np.float64)
+    i0 = int(np.floor(times.min() / step_s)) - 1
+    i1 = int(np.ceil(times.max() / step_s)) + 1
+    t, v = _ephemeris_table(i0, i1, step_s)
+    return np.stack([np.interp(times, t, v[:, k]) for k in range(3)], axis=-1)
+
+def local_sidereal_time_deg(times, lon_deg):
+    """GMST(UT1≈UTC) + 동경 → 지방 항성시 (deg)"""
+    d = np.asarray(times, dtype=np.float64) / SECONDS_PER_DAY + UNIX_EPOCH_JD - J2000_JD
+    T = d / 36525.0
+    gmst = 280.46061837 + 360.98564736629 * d + 0.000387933 * T ** 2
+    return np.mod(gmst + lon_deg, 360.0)
+
+def observer_rotation_velocity(times, lat_deg, lon_deg, height_m=0.0):
+    """지구 자전에 의한 관측자 속도 (..., 3) km/s (적도 좌표)"""
+    lat = np.radians(lat_deg)
+    e2 = WGS84_F * (2 - WGS84_F)
+    n_radius = WGS84_A_KM / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    rho = (n_radius + np.asarray(height_m) / 1000.0) * np.cos(lat)
+    lst = np.radians(local_sidereal_time_deg(times, lon_deg))
+    speed = EARTH_ROTATION_RAD_S * rho
+    return np.stack([-speed * np.sin(lst), speed * np.cos(lst), np.zeros_like(lst * speed)], axis=-1)
+
+def zenith_pointing(times, lat_deg, lon_deg):
+    """천정 방향의 (RA, Dec) (deg). 안테나가 위를 향한다고 가정할 때 사용합니다."""
+    ra = local_sidereal_time_deg(times, lon_deg)
+    return ra, np.broadcast_to(lat_deg, np.shape(ra))
+
+def radial_velocity_correction(times, lat_deg, lon_deg, height_m, ra_deg, dec_deg, frame='lsrk'):
+    """
+    관측 속도에 더할 보정값 (km/s) 배열을 반환합니다.
+    times는 유닉스 시각(초, UTC) 배열이고 나머지 인자는 스칼라 또는 같은 모양으로 브로드캐스트되는 배열입니다.
+    frame: 'barycentric' 또는 'lsrk'
+    """
+    times = np.asarray(times, dtype=np.float64)
+    v_obs = earth_orbital_velocity(times) + observer_rotation_velocity(times, lat_deg, lon_deg, height_m)
+    n_src = _unit_vector(ra_deg, dec_deg)
+    correction = np.sum(v_obs * n_src, axis=-1)
+    if frame == 'lsrk':
+        apex = _unit_vector(LSRK_APEX_RA_DEG, LSRK_APEX_DEC_DEG)
+        correction = correction + LSRK_SPEED_KMS * np.sum(apex * n_src, axis=-1)
+    elif frame != 'barycentric':
+        raise ValueError(f"알 수 없는 기준계: {frame} (barycentric, lsrk)")
+    return correction
+
+def correct_velocities(velocity, times, lat_deg, lon_deg, height_m=0.0, ra_deg=None, dec_deg=None, frame='lsrk'):
+    """
+    (N, L) 속도 배열을 스펙트럼별 시각 (N,)으로 한 번에 보정합니다.
+    ra_deg/dec_deg가 없으면 천정 지향으로 가정합니다.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    if ra_deg is None or dec_deg is None:
+        ra_deg, dec_deg = zenith_pointing(times, lat_deg, lon_deg)
+    correction = radial_velocity_correction(times, lat_deg, lon_deg, height_m, ra_deg, dec_deg, frame)
+    return np.asarray(velocity) + correction[..., None], correction
+
+# --- 파일 처리 ---
+
+HEADER_KEYS = {
+    'timestamp_utc': 'timestamp', 'latitude_deg': 'lat', 'longitude_deg': 'lon',
+    'altitude_m': 'height', 'ra_deg': 'ra', 'dec_deg': 'dec',
+}
+FILENAME_TIME_PATTERN = re.compile(r'(\d{8}_\d{6})')
+
+def read_observation_metadata(file_path):
+    """
+    '# key: value' 형식의 헤더에서 관측 메타데이터를 읽습니다.
+    시각이 없으면 main_pipeline.py의 파일명 규칙(YYYYmmdd_HHMMSS, UTC)에서 추출합니다.
+    """
+    meta = {}
+    with open(file_path, 'r') as f:
+        for line in f:
+            if not line.startswith('#'):
+                break
+            key, _, value = line[1:].partition(':')
+            key = key.strip()
+            if key in HEADER_KEYS and value.strip():
+                meta[HEADER_KEYS[key]] = value.strip()
+    if 'timestamp' in meta:
+        value = meta['timestamp']
+        try:
+            meta['timestamp'] = float(value)
+        except ValueError:
+            try:
+                meta['timestamp'] = timegm(strptime(value.replace('Z', ''), '%Y-%m-%dT%H:%M:%S'))
+            except ValueError:
+                raise MissingMetadata(f"관측 시각 형식을 읽을 수 없습니다: {file_path} ('{value}', "
+                                      "유닉스 시각 또는 YYYY-mm-ddTHH:MM:SSZ 필요)") from None
+    else:
+        match = FILENAME_TIME_PATTERN.search(os.path.basename(file_path))
+        if match:
+            meta['timestamp'] = timegm(strptime(match.group(1), '%Y%m%d_%H%M%S'))
+    for key in ('lat', 'lon', 'height', 'ra', 'dec'):
+        if key in meta:
+            meta[key] = float(meta[key])
+    return meta
+
+def correct_file(file_path, output=None, timestamp=None, lat=None, lon=None, height=None,
+                 ra=None, dec=None, frame='lsrk', strict=False):
+    """
+    도플러 보정을 적용해 저장하고 (출력 파일 경로, 보정값 km/s, 가정 목록)을 반환합니다. 인자가 헤더 값보다 우선합니다.
+    관측 시각이 없으면 MissingMetadata를 발생시킵니다 (MaNGA/NRAO 내보내기 파일 등).
+    위치/지향 방향이 없으면 기본 관측지(서울)/천정 지향을 쓰고 가정 목록에 남기며, strict=True면 MissingMetadata를 발생시킵니다.
+    """
+    meta = read_observation_metadata(file_path)
+    timestamp = meta.get('timestamp') if timestamp is None else timestamp
+    if timestamp is None:
+        raise MissingMetadata(f"관측 시각을 알 수 없습니다: {os.path.basename(file_path)} "
+                              "('# timestamp_utc:' 헤더 또는 YYYYmmdd_HHMMSS 파일명 필요)")
+    lat = meta.get('lat') if lat is None else lat
+    lon = meta.get('lon') if lon is None else lon
+    height = meta.get('height', DEFAULT_HEIGHT_M) if height is None else height
+    ra = meta.get('ra') if ra is None else ra
+    dec = meta.get('dec') if dec is None else dec
+
+    assumed = []
+    if lat is None or lon is None:
+        assumed.append(f"기본 관측지 ({DEFAULT_LAT_DEG}, {DEFAULT_LON_DEG})")
+        lat = DEFAULT_LAT_DEG if lat is None else lat
+        lon = DEFAULT_LON_DEG if lon is None else lon
+    if ra is None or dec is None:
+        assumed.append("천정 지향")
+    if strict and assumed:
+        raise MissingMetadata(f"관측 위치/지향 방향이 없습니다: {os.path.basename(file_path)} "
+                              "('# latitude_deg:', '# longitude_deg:', '# ra_deg:', '# dec_deg:' 헤더 또는 인자 필요)")
+
+    # MaNGA 파일 형식에 맞게 주석(#)을 무시하고, 공백으로 분리된 데이터를 읽음
+    df = read_spectrum_df(file_path, names=['velocity', 'intensity', 'pre_baseline_intensity'])
+
+    corrected, correction = correct_velocities(df['velocity'].values[None, :], [timestamp], lat, lon, height, ra, dec, frame)
+    df['velocity'] = corrected[0]
+    if output is None:
+        output = file_path.replace(".csv", "_corrected.csv")
+    df.to_csv(output, index=False, header=False, sep=' ')
+    return output, float(correction[0]), assumed
 
 def main(file_path=None):
     if file_path is None and len(sys.argv) > 1:
@@ -8,11 +241,11 @@ def main(file_path=None):
         print("파일 경로가 필요합니다.")
         return
 
-    # MaNGA 파일 형식에 맞게 주석(#)을 무시하고, 공백으로 분리된 데이터를 읽음
-    df = pd.read_csv(file_path, comment='#', delim_whitespace=True, names=['velocity', 'intensity', 'pre_baseline_intensity'])
-    
-    # 예시: 도플러 보정 인자 -10 km/s
-    df['velocity'] = df['velocity'] - 10  
-    output = file_path.replace(".csv", "_corrected.csv")
-    df.to_csv(output, index=False, header=False, sep=' ')
-    print(f"도플러 보정 완료: {output}")
+    try:
+        output, correction, assumed = correct_file(file_path)
+    except ValueError as e:
+        print(f"오류: {e}")
+        return
+    if assumed:
+        print(f"경고: 헤더에 값이 없어 {', '.join(assumed)}으로 가정했습니다.")
+    print(f"도플러 보정 완료 ({correction:+.3f} km/s, LSRK): {output}")
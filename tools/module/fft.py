@@ -1,19 +1,57 @@
-import pandas as pd
+import argparse
+import os
+import sys
+import time
+
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
-import sys
+try:
+    from module.graph import DecimatedLine, decimate_image
+except ModuleNotFoundError:  # python tools/module/<파일>.py 로 단독 실행할 때
+    from graph import DecimatedLine, decimate_image
 
-def main(file_path=None):
-    if file_path is None and len(sys.argv) > 1:
-        file_path = sys.argv[1]
-    if not file_path:
-        print("파일 경로가 필요합니다.")
-        return
+# --- 대용량 I/Q 녹음용 청크 단위 Welch PSD ---
+# 녹음 전체를 메모리에 올리지 않고 고정 크기 청크로 읽으며 PSD(와 선택적으로 워터폴)를 누적합니다.
+#   csv  : '# key: value' 헤더 + 공백 구분 I Q 열 (pandas chunksize로 읽음)
+#   u8   : rtl_sdr 원시 출력 (I, Q 교대 uint8, 127.5 중심) - 메모리 맵
+#   cf32 : complex64 (GNU Radio 등) - 메모리 맵
+# 사용 메모리는 청크 크기, nperseg, 워터폴 최대 행 수로만 정해집니다.
+
+CHUNK_SAMPLES = 1 << 20
+NPERSEG = 4096
+OVERLAP = 0.5
+WATERFALL_MAX_ROWS = 512
+
+FORMATS = {
+    '.csv': 'csv', '.txt': 'csv',
+    '.bin': 'u8', '.u8': 'u8', '.cu8': 'u8', '.iq': 'u8',
+    '.cf32': 'cf32', '.fc32': 'cf32', '.c64': 'cf32', '.raw': 'cf32',
+}
+
+class Cancelled(Exception):
+    """cancel 이벤트로 분석이 중단되었을 때 발생합니다."""
+
+def detect_format(file_path):
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"알 수 없는 I/Q 파일 형식: {ext} (csv, u8/cu8/bin, cf32/c64)")
+    return FORMATS[ext]
 
-    # Read metadata from comments
+def read_header(file_path, fmt=None):
+    """
+    '# sample_rate_hz:', '# center_freq_hz:' 주석 헤더를 읽습니다.
+    바이너리 파일은 같은 형식의 사이드카 파일 (<파일>.meta)에서 읽습니다.
+    fmt를 주면 확장자로 형식을 추측하지 않습니다 (.dat 등 목록에 없는 확장자).
+    """
     sample_rate_hz = None
     center_freq_hz = None
-    with open(file_path, 'r') as f:
+    header_path = file_path
+    if (fmt or detect_format(file_path)) != 'csv':
+        header_path = file_path + '.meta'
+        if not os.path.exists(header_path):
+            return None, None
+    with open(header_path, 'r') as f:
         for line in f:
             if line.startswith('# sample_rate_hz:'):
                 sample_rate_hz = float(line.split(':')[1].strip())
@@ -21,52 +59,234 @@ def main(file_path=None):
                 center_freq_hz = float(line.split(':')[1].strip())
             elif not line.startswith('#'): # Stop reading comments after header
                 break
+    return sample_rate_hz, center_freq_hz
+
+def iter_iq_chunks(file_path, fmt=None, chunk_samples=CHUNK_SAMPLES):
+    """(complex64 청크, 진행률 0~1) 를 차례로 반환합니다."""
+    fmt = fmt or detect_format(file_path)
+    if fmt == 'csv':
+        total = max(os.path.getsize(file_path), 1)
+        with open(file_path, 'r') as f:
+            reader = pd.read_csv(f, sep=r'\s+', header=None, comment='#', usecols=[0, 1],
+                                 dtype=np.float32, chunksize=chunk_samples)
+            for df in reader:
+                values = df.values
+                chunk = np.empty(len(values), dtype=np.complex64)
+                chunk.real = values[:, 0]
+                chunk.imag = values[:, 1]
+                yield chunk, min(f.tell() / total, 1.0)
+        return
+
+    if fmt == 'u8':
+        raw = np.memmap(file_path, dtype=np.uint8, mode='r')
+        n = len(raw) // 2
+        for start in range(0, n, chunk_samples):
+            block = raw[2 * start:2 * min(start + chunk_samples, n)].astype(np.float32)
+            block = (block - 127.5) / 127.5
+            yield block.view(np.complex64), min(start + chunk_samples, n) / max(n, 1)
+    elif fmt == 'cf32':
+        raw = np.memmap(file_path, dtype=np.complex64, mode='r')
+        n = len(raw)
+        for start in range(0, n, chunk_samples):
+            yield np.array(raw[start:start + chunk_samples]), min(start + chunk_samples, n) / max(n, 1)
+    else:
+        raise ValueError(f"알 수 없는 I/Q 형식: {fmt}")
+
+class WelchAccumulator:
+    """
+    청크를 차례로 받아 Welch PSD를 누적합니다. 청크 경계에 걸친 세그먼트는 다음 청크와 이어 처리하므로
+    한 번에 전체 FFT를 한 결과(scipy.signal.welch, detrend 없음, 양측 스펙트럼)와 같습니다.
+    waterfall=True 이면 세그먼트 평균 행을 쌓되, max_rows를 넘으면 인접 행을 둘씩 합쳐 메모리를 고정합니다.
+    """
+    def __init__(self, nperseg=NPERSEG, overlap=OVERLAP, waterfall=False, max_rows=WATERFALL_MAX_ROWS):
+        self.nperseg = nperseg
+        self.hop = max(1, int(round(nperseg * (1 - overlap))))
+        self.window = np.hanning(nperseg + 1)[:-1].astype(np.float32)  # periodic Hann
+        self.tail = np.zeros(0, dtype=np.complex64)
+        self.power_sum = np.zeros(nperseg, dtype=np.float64)
+        self.n_segments = 0
+        self.n_samples = 0
+        self.waterfall = waterfall
+        self.max_rows = max_rows
+        self.rows = []
+        self.row_sum = np.zeros(nperseg, dtype=np.float64)
+        self.row_count = 0
+        self.segments_per_row = 1
 
+    def update(self, chunk):
+        self.n_samples += len(chunk)
+        data = np.concatenate([self.tail, chunk]) if len(self.tail) else chunk
+        n_seg = (len(data) - self.nperseg) // self.hop + 1 if len(data) >= self.nperseg else 0
+        if n_seg > 0:
+            segments = np.lib.stride_tricks.as_strided(
+                data, shape=(n_seg, self.nperseg),
+                strides=(data.strides[0] * self.hop, data.strides[0]), writeable=False)
+            power = np.abs(np.fft.fft(segments * self.window, axis=1)) ** 2
+            self.power_sum += power.sum(axis=0)
+            self.n_segments += n_seg
+            if self.waterfall:
+                self._add_rows(power)
+        self.tail = data[n_seg * self.hop:].copy()
+
+    def _add_rows(self, power):
+        i = 0
+        while i < len(power):
+            take = min(self.segments_per_row - self.row_count, len(power) - i)
+            self.row_sum += power[i:i + take].sum(axis=0)
+            self.row_count += take
+            i += take
+            if self.row_count == self.segments_per_row:
+                self.rows.append(self.row_sum / self.row_count)
+                self.row_sum = np.zeros(self.nperseg, dtype=np.float64)
+                self.row_count = 0
+                if len(self.rows) >= self.max_rows:
+                    # 행 수를 절반으로 줄이고 이후 행당 세그먼트 수를 두 배로
+                    self.rows = [(a + b) / 2 for a, b in zip(self.rows[0::2], self.rows[1::2])]
+                    self.segments_per_row *= 2
+
+    def _scale(self, sample_rate_hz):
+        # 'density' 스케일 (단위: 1/Hz) - scipy.signal.welch와 동일
+        return 1.0 / (sample_rate_hz * np.sum(self.window.astype(np.float64) ** 2))
+
+    def _fit_short(self):
+        """
+        녹음이 nperseg보다 짧아 세그먼트가 하나도 없으면 전체 샘플(tail)을 nperseg로 삼아 FFT 한 번으로 계산합니다.
+        (scipy.signal.welch가 nperseg를 입력 길이로 줄이는 것과 같은 동작)
+        """
+        if self.n_segments or not len(self.tail):
+            return
+        self.nperseg = len(self.tail)
+        self.window = np.hanning(self.nperseg + 1)[:-1].astype(np.float32)
+        power = np.abs(np.fft.fft(self.tail * self.window)) ** 2
+        self.power_sum = power.astype(np.float64)
+        self.n_segments = 1
+        self.tail = np.zeros(0, dtype=np.complex64)
+        if self.waterfall:
+            self.row_sum = np.zeros(self.nperseg, dtype=np.float64)
+            self._add_rows(power[np.newaxis])
+
+    def psd(self, sample_rate_hz):
+        """(주파수 오프셋 Hz, PSD) 를 0 Hz가 가운데 오도록 정렬해 반환합니다."""
+        self._fit_short()
+        if self.n_segments == 0:
+            raise ValueError(f"샘플이 부족합니다: {self.n_samples}개 (nperseg={self.nperseg})")
+        freqs = np.fft.fftshift(np.fft.fftfreq(self.nperseg, 1 / sample_rate_hz))
+        psd = np.fft.fftshift(self.power_sum / self.n_segments) * self._scale(sample_rate_hz)
+        return freqs, psd
+
+    def waterfall_rows(self, sample_rate_hz):
+        """(행 시작 시각 s, 워터폴 (rows, nperseg) PSD) - 마지막 미완성 행 포함"""
+        rows = list(self.rows)
+        if self.row_count:
+            rows.append(self.row_sum / self.row_count)
+        if not rows:
+            return np.zeros(0), np.zeros((0, self.nperseg))
+        times = np.arange(len(rows)) * self.segments_per_row * self.hop / sample_rate_hz
+        return times, np.fft.fftshift(np.array(rows), axes=1) * self._scale(sample_rate_hz)
+
+def welch_psd(file_path, nperseg=NPERSEG, overlap=OVERLAP, waterfall=False, fmt=None,
+              sample_rate_hz=None, center_freq_hz=None, chunk_samples=CHUNK_SAMPLES,
+              max_rows=WATERFALL_MAX_ROWS, progress=None, cancel=None):
+    """
+    I/Q 파일의 Welch PSD를 청크 단위로 계산해 결과 딕셔너리를 반환합니다.
+    progress(fraction) 콜백과 cancel (is_set()을 가진 threading.Event 등)으로 GUI에서 진행률 표시/중단이 가능합니다.
+    """
+    fmt = fmt or detect_format(file_path)
+    if not sample_rate_hz or center_freq_hz is None:
+        header_rate, header_center = read_header(file_path, fmt)
+        sample_rate_hz = sample_rate_hz or header_rate
+        center_freq_hz = center_freq_hz if center_freq_hz is not None else header_center
     if sample_rate_hz is None or center_freq_hz is None:
-        print("Error: Missing sample_rate_hz or center_freq_hz in file header.")
+        raise ValueError("Missing sample_rate_hz or center_freq_hz in file header.")
+
+    acc = WelchAccumulator(nperseg, overlap, waterfall, max_rows)
+    start = time.perf_counter()
+    for chunk, fraction in iter_iq_chunks(file_path, fmt, chunk_samples):
+        if cancel is not None and cancel.is_set():
+            raise Cancelled(file_path)
+        acc.update(chunk)
+        if progress is not None:
+            progress(fraction)
+    seconds = time.perf_counter() - start
+
+    freqs, psd = acc.psd(sample_rate_hz)
+    result = {
+        'freq_mhz': (freqs + center_freq_hz) / 1e6,
+        'psd': psd,
+        'psd_db': 10 * np.log10(np.maximum(psd, 1e-30)),
+        'sample_rate_hz': sample_rate_hz,
+        'center_freq_hz': center_freq_hz,
+        'n_samples': acc.n_samples,
+        'n_segments': acc.n_segments,
+        'seconds': seconds,
+        'msps': acc.n_samples / seconds / 1e6 if seconds > 0 else float('inf'),
+        'waterfall': None,
+    }
+    if waterfall:
+        times, rows = acc.waterfall_rows(sample_rate_hz)
+        result['waterfall_times'] = times
+        result['waterfall'] = 10 * np.log10(np.maximum(rows, 1e-30))
+    return result
+
+def plot_result(result):
+    """welch_psd 결과를 그립니다 (워터폴이 있으면 아래에 함께 표시). Tk/메인 스레드에서 호출하세요."""
+    has_waterfall = result['waterfall'] is not None and len(result['waterfall'])
+    fig, axes = plt.subplots(2 if has_waterfall else 1, 1, figsize=(10, 8 if has_waterfall else 6),
+                             sharex=True, squeeze=False)
+    ax = axes[0, 0]
+    freq_mhz, psd_db = result['freq_mhz'], result['psd_db']
+    # nperseg가 크면 (예: 65536) 점이 많으므로 화면 폭에 맞게 축소해서 그림
+    DecimatedLine(ax, freq_mhz, psd_db)
+    ax.set_title(f"Welch PSD of Raw SDR Data ({result['n_samples'] / 1e6:.1f} MS, {result['n_segments']} segments)")
+    ax.set_ylabel("PSD (dB/Hz)")
+    center, rate = result['center_freq_hz'], result['sample_rate_hz']
+    ax.set_xlim(center / 1e6 - rate / 2e6, center / 1e6 + rate / 2e6)
+    ax.set_ylim(np.min(psd_db) - 5, np.max(psd_db) + 5)
+    ax.grid(True)
+    if has_waterfall:
+        times = result['waterfall_times']
+        end = times[-1] + (times[1] - times[0] if len(times) > 1 else 0)
+        axes[1, 0].imshow(decimate_image(result['waterfall']), aspect='auto', origin='lower',
+                          extent=[freq_mhz[0], freq_mhz[-1], 0, end], cmap='viridis')
+        axes[1, 0].set_ylabel("Time (s)")
+        axes[1, 0].set_xlabel("Frequency (MHz)")
+    else:
+        ax.set_xlabel("Frequency (MHz)")
+    fig.tight_layout()
+    return fig
+
+def main(file_path=None, waterfall=False, **kwargs):
+    if file_path is None and len(sys.argv) > 1:
+        file_path = sys.argv[1]
+    if not file_path:
+        print("파일 경로가 필요합니다.")
+        return
+
+    try:
+        result = welch_psd(file_path, waterfall=waterfall, **kwargs)
+    except ValueError as e:
+        print(f"Error: {e}")
         return
 
-    # Read I/Q data
-    df = pd.read_csv(file_path, comment='#', delim_whitespace=True, names=['I', 'Q'])
-    
-    # Combine I and Q into complex signal
-    complex_signal = df['I'].values + 1j * df['Q'].values
-
-    # Perform FFT
-    N = len(complex_signal)
-    yf = np.fft.fft(complex_signal)
-    xf = np.fft.fftfreq(N, 1 / sample_rate_hz)
-
-    # Shift zero frequency to center for plotting
-    xf_shifted = np.fft.fftshift(xf)
-    yf_shifted = np.fft.fftshift(yf)
-
-    # Convert frequency to MHz for plotting
-    freq_mhz = (xf_shifted + center_freq_hz) / 1e6
-
-    # Calculate power spectrum in dB
-    power_spectrum_db = 10 * np.log10(np.abs(yf_shifted)**2 / N)
-
-    # Debugging prints
-    print(f"Max Power (dB): {np.max(power_spectrum_db)}")
-    print(f"Min Power (dB): {np.min(power_spectrum_db)}")
-    print(f"Mean Power (dB): {np.mean(power_spectrum_db)}")
-
-    # Plotting magnitude spectrum
-    plt.figure(figsize=(10, 6))
-    plt.plot(freq_mhz, power_spectrum_db)
-    plt.title("Frequency Spectrum of Raw SDR Data (dB)")
-    plt.xlabel("Frequency (MHz)")
-    plt.ylabel("Power (dB)")
-    
-    # Adjust X-axis limit to focus on the peak
-    plt.xlim(center_freq_hz/1e6 - sample_rate_hz/2e6, center_freq_hz/1e6 + sample_rate_hz/2e6)
-    
-    # Set Y-limit dynamically based on power spectrum
-    plt.ylim(np.min(power_spectrum_db) - 5, np.max(power_spectrum_db) + 5)
-
-    plt.grid(True)
+    psd_db = result['psd_db']
+    print(f"{result['n_samples']:,} samples in {result['seconds']:.2f}s ({result['msps']:.1f} MS/s)")
+    print(f"Max PSD (dB/Hz): {np.max(psd_db)}")
+    print(f"Min PSD (dB/Hz): {np.min(psd_db)}")
+    print(f"Mean PSD (dB/Hz): {np.mean(psd_db)}")
+
+    plot_result(result)
     plt.show()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="I/Q 녹음의 청크 단위 Welch PSD / 워터폴")
+    parser.add_argument('file', help="I/Q 파일 (.csv, .cu8/.bin, .cf32)")
+    parser.add_argument('--format', choices=['csv', 'u8', 'cf32'], default=None)
+    parser.add_argument('--nperseg', type=int, default=NPERSEG)
+    parser.add_argument('--overlap', type=float, default=OVERLAP)
+    parser.add_argument('--chunk-samples', type=int, default=CHUNK_SAMPLES)
+    parser.add_argument('--sample-rate', type=float, default=None, help="헤더 대신 사용할 샘플링 속도 (Hz)")
+    parser.add_argument('--center-freq', type=float, default=None, help="헤더 대신 사용할 중심 주파수 (Hz)")
+    parser.add_argument('--waterfall', action='store_true')
+    args = parser.parse_args()
+    main(args.file, waterfall=args.waterfall, fmt=args.format, nperseg=args.nperseg, overlap=args.overlap,
+         chunk_samples=args.chunk_samples, sample_rate_hz=args.sample_rate, center_freq_hz=args.center_freq)
@@ -1,6 +1,204 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+try:
+    from module.spectrum_cache import load_spectrum
+except ModuleNotFoundError:  # python tools/module/<파일>.py 로 단독 실행할 때
+    from spectrum_cache import load_spectrum
+
+# --- 대용량 스펙트럼용 축소(decimation) 플로팅 ---
+# 전체 점을 plt.plot에 넘기지 않고, 보이는 구간만 화면 픽셀 폭에 맞게 줄여서 그립니다.
+#   minmax: 픽셀 구간마다 최솟값/최댓값 두 점 (스파이크가 사라지지 않음, 가장 빠름)
+#   lttb  : Largest-Triangle-Three-Buckets (모양 보존, 점 수가 더 적음)
+# 확대/이동(xlim_changed) 시 원본 배열(또는 메모리 맵)에서 보이는 구간을 다시 가져옵니다.
+
+DEFAULT_METHOD = 'minmax'
+THUMBNAIL_SIZE = (320, 200)
+
+def visible_range(x, xmin, xmax):
+    """단조(오름/내림차순) 축 x에서 [xmin, xmax]에 해당하는 인덱스 구간 (양 끝 한 점씩 여유 포함)"""
+    n = len(x)
+    if n == 0:
+        return 0, 0
+    ascending = x[-1] >= x[0]
+    if ascending:
+        lo = np.searchsorted(x, xmin, side='left')
+        hi = np.searchsorted(x, xmax, side='right')
+    else:
+        # 내림차순 축 (MaNGA 속도 축 등): 뒤집힌 뷰에서 찾아 인덱스를 변환
+        rev = x[::-1]
+        lo = n - np.searchsorted(rev, xmax, side='right')
+        hi = n - np.searchsorted(rev, xmin, side='left')
+    return max(int(lo) - 1, 0), min(int(hi) + 1, n)
+
+def minmax_decimate(x, y, n_out):
+    """n_out // 2 개 구간마다 최솟값과 최댓값 점을 원래 순서대로 남깁니다."""
+    n = len(y)
+    n_buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return np.asarray(x), np.asarray(y)
+    size = -(-n // n_buckets)
+    y = np.asarray(y, dtype=np.float64)
+    pad = n_buckets * size - n
+    blocks = np.pad(y, (0, pad), mode='edge').reshape(n_buckets, size)
+    finite = np.isfinite(blocks)
+    i_min = np.where(finite, blocks, np.inf).argmin(axis=1)
+    i_max = np.where(finite, blocks, -np.inf).argmax(axis=1)
+    offsets = np.arange(n_buckets) * size
+    idx = np.sort(np.stack([i_min, i_max], axis=1), axis=1) + offsets[:, None]
+    idx = np.minimum(idx.ravel(), n - 1)
+    return np.asarray(x)[idx], y[idx]
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets 축소. 처음과 마지막 점은 항상 유지합니다."""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.asarray(x), np.asarray(y)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # 다음 구간의 평균점은 선택 결과와 무관하므로 미리 한 번에 계산
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1])
+    mean_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        cx, cy = mean_x[i + 1], mean_y[i + 1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+def decimate(x, y, n_out, method=DEFAULT_METHOD):
+    if method == 'minmax':
+        return minmax_decimate(x, y, n_out)
+    if method == 'lttb':
+        return lttb(x, y, n_out)
+    raise ValueError(f"알 수 없는 축소 방법: {method} (minmax, lttb)")
+
+def decimate_image(image, max_rows=1024, max_cols=2048):
+    """워터폴 등 2차원 배열을 블록 최댓값으로 줄입니다 (좁은 선/RFI가 사라지지 않도록)."""
+    image = np.asarray(image)
+    rows, cols = image.shape
+    fr = max(1, -(-rows // max_rows))
+    fc = max(1, -(-cols // max_cols))
+    if fr == 1 and fc == 1:
+        return image
+    padded = np.pad(image, ((0, (-rows) % fr), (0, (-cols) % fc)), mode='edge')
+    return padded.reshape(padded.shape[0] // fr, fr, padded.shape[1] // fc, fc).max(axis=(1, 3))
+
+def _monotonic(x, chunk=1 << 22):
+    """x가 단조 증가 또는 감소인지 (메모리 맵도 한 번에 다 올리지 않도록 구간별로 검사)"""
+    n = len(x)
+    if n < 2:
+        return True
+    ascending = x[-1] >= x[0]
+    for start in range(0, n - 1, chunk):
+        d = np.diff(np.asarray(x[start:start + chunk + 1]))
+        if (d < 0).any() if ascending else (d > 0).any():
+            return False
+    return True
+
+class DecimatedLine:
+    """
+    축에 축소된 선을 그리고, 확대/이동할 때마다 보이는 구간을 원본에서 다시 축소합니다.
+    x/y는 np.memmap이어도 됩니다 (단조 x면 보이는 구간만 읽음). x가 단조가 아니면 처음에 한 번 x 순으로 정렬합니다.
+    matplotlib 콜백은 약한 참조이므로 축(ax._decimated_lines)이 이 객체를 붙잡아 두어 호출자가 반환값을 버려도 동작합니다.
+    """
+    def __init__(self, ax, x, y, method=DEFAULT_METHOD, points_per_pixel=2, **plot_kwargs):
+        self.ax = ax
+        if not _monotonic(x):
+            order = np.argsort(np.asarray(x), kind='stable')
+            x, y = np.asarray(x)[order], np.asarray(y)[order]
+        self.x = x
+        self.y = y
+        self.method = method
+        self.points_per_pixel = points_per_pixel
+        self.last_update_ms = 0.0
+        xs, ys = self._fetch(min(x[0], x[-1]), max(x[0], x[-1]))
+        self.line, = ax.plot(xs, ys, **plot_kwargs)
+        self._cid = ax.callbacks.connect('xlim_changed', self._on_xlim)
+        if not hasattr(ax, '_decimated_lines'):
+            ax._decimated_lines = []
+        ax._decimated_lines.append(self)
+
+    def _n_out(self):
+        width = self.ax.get_window_extent().width if self.ax.figure is not None else 1000
+        return max(int(width * self.points_per_pixel), 64)
+
+    def _fetch(self, xmin, xmax):
+        start = time.perf_counter()
+        lo, hi = visible_range(self.x, xmin, xmax)
+        xs, ys = decimate(self.x[lo:hi], self.y[lo:hi], self._n_out(), self.method)
+        self.last_update_ms = (time.perf_counter() - start) * 1000
+        return xs, ys
+
+    def _on_xlim(self, ax):
+        xmin, xmax = sorted(ax.get_xlim())
+        self.line.set_data(*self._fetch(xmin, xmax))
+
+    def disconnect(self):
+        self.ax.callbacks.disconnect(self._cid)
+        if self in getattr(self.ax, '_decimated_lines', []):
+            self.ax._decimated_lines.remove(self)
+
+def plot_spectrum(ax, velocity, intensity, method=DEFAULT_METHOD, **plot_kwargs):
+    """graph.main과 같은 모양으로 스펙트럼을 축소해 그리고 DecimatedLine을 반환합니다."""
+    line = DecimatedLine(ax, velocity, intensity, method=method, **plot_kwargs)
+    ax.set_xlabel("Velocity (km/s)")
+    ax.set_ylabel("Intensity")
+    ax.set_title("1D Hydrogen Line Spectrum")
+    ax.grid()
+    return line
+
+def render_thumbnail(file_path, output=None, size=THUMBNAIL_SIZE, dpi=100, method=DEFAULT_METHOD):
+    """
+    스펙트럼 파일의 썸네일 PNG를 만듭니다. pyplot 대신 Figure + Agg 캔버스를 직접 쓰므로
+    Tk 루프와 무관하게 작업 스레드에서 호출할 수 있습니다.
+    """
+    data = load_spectrum(file_path)
+    if output is None:
+        output = os.path.splitext(file_path)[0] + "_thumb.png"
+    fig = Figure(figsize=(size[0] / dpi, size[1] / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0.02, 0.02, 0.96, 0.96])
+    xs, ys = decimate(data[:, 0], data[:, 1], size[0] * 2, method)
+    ax.plot(xs, ys, linewidth=0.8)
+    ax.set_axis_off()
+    ax.set_title(os.path.basename(file_path), fontsize=6, y=0.88)
+    fig.savefig(output, dpi=dpi)
+    return output
+
+def render_thumbnails(file_paths, out_dir=None, workers=4, size=THUMBNAIL_SIZE):
+    """여러 파일의 썸네일을 스레드 풀에서 만들고 {입력: 출력 경로 또는 예외} 딕셔너리를 반환합니다."""
+    def job(path):
+        output = None
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+            output = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + ".png")
+        return render_thumbnail(path, output, size)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {path: executor.submit(job, path) for path in file_paths}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                results[path] = e
+    return results
 
 def main(file_path=None):
     if file_path is None and len(sys.argv) > 1:
@@ -10,13 +208,10 @@ def main(file_path=None):
         print("파일 경로를 입력하세요.")
         return
 
-    # MaNGA 파일 형식에 맞게 주석(#)을 무시하고, 공백으로 분리된 데이터를 읽음
-    df = pd.read_csv(file_path, comment='#', delim_whitespace=True, names=['velocity', 'intensity', 'pre_baseline_intensity'])
-    plt.plot(df['velocity'], df['intensity'])
-    plt.xlabel("Velocity (km/s)")
-    plt.ylabel("Intensity")
-    plt.title("1D Hydrogen Line Spectrum")
-    plt.grid()
+    # MaNGA 파일 형식에 맞게 주석(#)을 무시하고, 공백으로 분리된 데이터를 읽음 (캐시된 메모리 맵)
+    data = load_spectrum(file_path)
+    fig, ax = plt.subplots()
+    plot_spectrum(ax, data[:, 0], data[:, 1])
     plt.show()
 
 if __name__ == "__main__":
@@ -1,5 +1,18 @@
-import pandas as pd
 import sys
+try:
+    from module.spectrum_cache import read_spectrum_df
+except ModuleNotFoundError:  # python tools/module/<파일>.py 로 단독 실행할 때
+    from spectrum_cache import read_spectrum_df
+
+def get_info(file_path):
+    """스펙트럼 파일의 열 이름, 행 수, 샘플 데이터를 딕셔너리로 반환합니다."""
+    # MaNGA 파일 형식에 맞게 주석(#)을 무시하고, 공백으로 분리된 데이터를 읽음
+    df = read_spectrum_df(file_path, names=['velocity', 'intensity', 'pre_baseline_intensity'])
+    return {
+        'columns': df.columns.tolist(),
+        'rows': len(df),
+        'head': df.head(),
+    }
 
 def main(file_path=None):
     if file_path is None and len(sys.argv) > 1:
@@ -8,8 +21,7 @@ def main(file_path=None):
         print("파일 경로가 필요합니다.")
         return
 
-    # MaNGA 파일 형식에 맞게 주석(#)을 무시하고, 공백으로 분리된 데이터를 읽음
-    df = pd.read_csv(file_path, comment='#', delim_whitespace=True, names=['velocity', 'intensity', 'pre_baseline_intensity'])
-    print("열 이름:", df.columns.tolist())
-    print("행 수:", len(df))
-    print("샘플 데이터:\n", df.head())
+    info = get_info(file_path)
+    print("열 이름:", info['columns'])
+    print("행 수:", info['rows'])
+    print("샘플 데이터:\n", info['head'])
@@ -1,28 +1,188 @@
 import pandas as pd
 import numpy as np
 import sys
+try:
+    from module.spectrum_cache import read_spectrum_df
+except ModuleNotFoundError:  # python tools/module/<파일>.py 로 단독 실행할 때
+    from spectrum_cache import read_spectrum_df
 
-def main(file_path=None):
-    if file_path is None and len(sys.argv) > 1:
-        file_path = sys.argv[1]
-    if not file_path:
-        print("파일 경로를 입력하세요.")
-        return
+# --- 배치 리샘플러 ---
+# 길이가 서로 다른 N개의 스펙트럼을 한 번의 벡터 연산으로 공통 속도 격자에 올립니다.
+#   method='linear' : 선형 보간 (np.interp와 동일)
+#   method='sinc'   : Lanczos 윈도 sinc 보간 (채널 인덱스 공간에서 계산)
+#   method='rebin'  : 플럭스 보존 리비닝 (누적 적분을 출력 빈 경계에서 차분)
+# 결과는 (N, L) float32 배열과 입력 속도 범위 안에 있는 채널을 나타내는 (N, L) 마스크입니다.
+
+LANCZOS_A = 3
+
+def make_grid(v_min, v_max, length=None, step=None):
+    """공통 속도 격자를 만듭니다. length(채널 수) 또는 step(km/s 간격) 중 하나를 지정합니다."""
+    if step is not None:
+        return np.arange(v_min, v_max, step)
+    if length is None:
+        raise ValueError("length 또는 step 중 하나가 필요합니다.")
+    return np.linspace(v_min, v_max, length)
+
+def pad_ragged(velocities, fluxes):
+    """
+    가변 길이 스펙트럼을 속도 오름차순으로 정렬해 (N, M) 배열로 채웁니다.
+    남는 칸은 마지막 값을 반복해 각 행이 단조 증가를 유지하도록 합니다.
+    """
+    lengths = np.array([len(v) for v in velocities])
+    if np.any(lengths < 2):
+        raise ValueError("각 스펙트럼은 최소 2개 채널이 필요합니다.")
+    n, m = len(lengths), lengths.max()
+    v_pad = np.empty((n, m), dtype=np.float64)
+    f_pad = np.empty((n, m), dtype=np.float64)
+    for i, (v, f) in enumerate(zip(velocities, fluxes)):
+        v = np.asarray(v, dtype=np.float64)
+        f = np.asarray(f, dtype=np.float64)
+        order = np.argsort(v, kind='stable')
+        k = lengths[i]
+        v_pad[i, :k] = v[order]
+        f_pad[i, :k] = f[order]
+        v_pad[i, k:] = v_pad[i, k - 1]
+        f_pad[i, k:] = f_pad[i, k - 1]
+    return v_pad, f_pad, lengths
+
+def _locate(x, lengths, xq):
+    """
+    행마다 정렬된 x (N, M)에서 질의점 xq (N, Q)가 속한 구간의 왼쪽 인덱스를 찾습니다.
+    행마다 큰 오프셋을 더해 전체를 하나의 정렬된 배열로 만든 뒤 searchsorted 한 번으로 처리합니다.
+    """
+    n, m = x.shape
+    lo = min(x[:, 0].min(), xq.min())
+    span = max(x.max(), xq.max()) - lo + 1.0
+    offsets = (np.arange(n) * 2 * span)[:, None]
+    flat = (x - lo + offsets).ravel()
+    pos = np.searchsorted(flat, (xq - lo + offsets).ravel(), side='right').reshape(xq.shape) - 1
+    local = pos - np.arange(n)[:, None] * m
+    return np.clip(local, 0, (lengths - 2)[:, None])
+
+def _interp_rows(x, y, lengths, xq):
+    """행별 선형 보간. x는 행마다 오름차순이어야 합니다."""
+    j = _locate(x, lengths, xq)
+    x0 = np.take_along_axis(x, j, axis=1)
+    x1 = np.take_along_axis(x, j + 1, axis=1)
+    y0 = np.take_along_axis(y, j, axis=1)
+    y1 = np.take_along_axis(y, j + 1, axis=1)
+    dx = x1 - x0
+    t = np.divide(xq - x0, dx, out=np.zeros_like(xq), where=dx != 0)
+    t = np.clip(t, 0.0, 1.0)  # 범위 밖은 np.interp처럼 끝 값으로 고정 (마스크로 표시)
+    return y0 + t * (y1 - y0)
+
+def _bin_edges(centers, lengths=None):
+    """채널 중심 (N, K)에서 채널 경계 (N, K+1)를 만듭니다."""
+    if lengths is None:
+        lengths = np.full(centers.shape[0], centers.shape[1])
+    last = np.take_along_axis(centers, (lengths - 1)[:, None], axis=1)
+    prev = np.take_along_axis(centers, (lengths - 2)[:, None], axis=1)
+    mid = 0.5 * (centers[:, 1:] + centers[:, :-1])
+    left = centers[:, :1] - (mid[:, :1] - centers[:, :1])
+    edges = np.concatenate([left, mid, centers[:, -1:]], axis=1)
+    # 각 행의 실제 마지막 채널 뒤 경계와 패딩 부분
+    right = last + 0.5 * (last - prev)
+    cols = np.arange(edges.shape[1])[None, :]
+    return np.where(cols >= lengths[:, None], right, edges)
+
+def resample_batch(velocities, fluxes, grid, method='linear', dtype=np.float32):
+    """
+    N개의 가변 길이 스펙트럼을 공통 속도 격자 grid에 리샘플링합니다.
+
+    grid는 모든 스펙트럼이 공유하는 (L,) 배열이거나 스펙트럼별 (N, L) 배열입니다.
+    반환값: (N, L) 배열, (N, L) 불리언 마스크 (입력 속도 범위 밖 채널은 False, 값은 0)
+    """
+    v, f, lengths = pad_ragged(velocities, fluxes)
+    n = len(lengths)
+    grid = np.asarray(grid, dtype=np.float64)
+    gq = np.broadcast_to(grid, (n, grid.shape[-1])) if grid.ndim == 1 else grid
+    gq = np.ascontiguousarray(gq)
+
+    v_min = v[:, :1]
+    v_max = np.take_along_axis(v, (lengths - 1)[:, None], axis=1)
 
+    if method == 'linear':
+        out = _interp_rows(v, f, lengths, gq)
+        mask = (gq >= v_min) & (gq <= v_max)
+
+    elif method == 'sinc':
+        # 격자 점을 입력 채널의 분수 인덱스로 바꾼 뒤 Lanczos 커널로 주변 채널을 가중합
+        idx = np.broadcast_to(np.arange(v.shape[1], dtype=np.float64), v.shape)
+        u = _interp_rows(v, idx, lengths, gq)
+        base = np.floor(u).astype(np.int64)
+        acc = np.zeros_like(u)
+        wsum = np.zeros_like(u)
+        last = (lengths - 1)[:, None]
+        for k in range(-LANCZOS_A + 1, LANCZOS_A + 1):
+            j = base + k
+            d = u - j
+            w = np.sinc(d) * np.sinc(d / LANCZOS_A)
+            w = np.where((j >= 0) & (j <= last), w, 0.0)
+            acc += w * np.take_along_axis(f, np.clip(j, 0, last), axis=1)
+            wsum += w
+        out = np.divide(acc, wsum, out=np.zeros_like(acc), where=wsum != 0)
+        mask = (gq >= v_min) & (gq <= v_max)
+
+    elif method == 'rebin':
+        # 입력/출력 채널 경계에서 누적 적분을 구해 차분 → 각 출력 빈의 평균 플럭스 (적분량 보존)
+        in_edges = _bin_edges(v, lengths)
+        widths = np.diff(in_edges, axis=1)
+        cum = np.concatenate([np.zeros((n, 1)), np.cumsum(f * widths, axis=1)], axis=1)
+        order = np.argsort(gq, axis=1, kind='stable')
+        g_sorted = np.take_along_axis(gq, order, axis=1)
+        out_edges = _bin_edges(g_sorted)
+        cum_out = _interp_rows(in_edges, cum, lengths + 1, out_edges)
+        out_sorted = np.diff(cum_out, axis=1) / np.diff(out_edges, axis=1)
+        e_min = in_edges[:, :1]
+        e_max = np.take_along_axis(in_edges, lengths[:, None], axis=1)
+        mask_sorted = (out_edges[:, :-1] >= e_min) & (out_edges[:, 1:] <= e_max)
+        inverse = np.argsort(order, axis=1)
+        out = np.take_along_axis(out_sorted, inverse, axis=1)
+        mask = np.take_along_axis(mask_sorted, inverse, axis=1)
+
+    else:
+        raise ValueError(f"알 수 없는 리샘플링 방법: {method} (linear, sinc, rebin)")
+
+    out = np.where(mask, out, 0.0).astype(dtype)
+    return out, mask
+
+def resample_to_length(velocity, fluxes, length, method='linear'):
+    """
+    같은 속도 축을 공유하는 여러 플럭스 열을 해당 스펙트럼 범위의 등간격 격자 length개로 리샘플링합니다.
+    격자는 입력과 같은 방향(velocity[0] → velocity[-1])을 유지합니다.
+    반환값: (격자, (K, length) float32 배열)
+    """
+    velocity = np.asarray(velocity, dtype=np.float64)
+    grid = np.linspace(velocity[0], velocity[-1], length)
+    out, _ = resample_batch([velocity] * len(fluxes), fluxes, grid, method=method)
+    return grid, out
+
+def resample_file(file_path, output=None):
+    """5 km/s 등간격 속도 축으로 리샘플링해 저장하고 출력 파일 경로를 반환합니다."""
     # 공백으로 분리된 데이터 읽기 (헤더 없음)
-    df = pd.read_csv(file_path, delim_whitespace=True, names=['velocity', 'intensity'])
+    df = read_spectrum_df(file_path, names=['velocity', 'intensity'])
 
-    df = df.sort_values(by='velocity')
     min_v = df['velocity'].min()
     max_v = df['velocity'].max()
-    new_velocity = np.arange(min_v, max_v, 5)  # 5 km/s 간격
-    new_intensity = np.interp(new_velocity, df['velocity'], df['intensity'])
+    new_velocity = make_grid(min_v, max_v, step=5)  # 5 km/s 간격
+    new_intensity, _ = resample_batch([df['velocity'].values], [df['intensity'].values], new_velocity, dtype=np.float64)
+
+    new_df = pd.DataFrame({'velocity': new_velocity, 'intensity': new_intensity[0]})
+    if output is None:
+        output = file_path.replace(".csv", "_resampled.csv")
 
-    new_df = pd.DataFrame({'velocity': new_velocity, 'intensity': new_intensity})
-    output = file_path.replace(".csv", "_resampled.csv")
-    
     # 다음 모듈 호환성을 위해 헤더 없이 공백으로 분리하여 저장
     new_df.to_csv(output, index=False, header=False, sep=' ')
+    return output
+
+def main(file_path=None):
+    if file_path is None and len(sys.argv) > 1:
+        file_path = sys.argv[1]
+    if not file_path:
+        print("파일 경로를 입력하세요.")
+        return
+
+    output = resample_file(file_path)
     print(f"리샘플링 완료: {output}")
 
 if __name__ == "__main__":
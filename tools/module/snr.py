@@ -1,6 +1,213 @@
-import pandas as pd
-import numpy as np
+import argparse
+import glob
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.ndimage import maximum_filter1d
+try:
+    from module.spectrum_cache import load_spectrum
+    from module.de_baseline import masked_median, masked_sigma
+except ModuleNotFoundError:  # python tools/module/<파일>.py 로 단독 실행할 때
+    from spectrum_cache import load_spectrum
+    from de_baseline import masked_median, masked_sigma
+
+# --- 벡터화된 선(line) 통계 ---
+# (N, L) 배치에 대해 스펙트럼별로 아래 값을 한 번에 계산합니다.
+#   noise          : 선이 없는 영역의 MAD 기반 잡음
+#   peak_snr       : (피크 - 기준 레벨) / noise
+#   integrated_flux: W20 구간의 (flux - level) * |dv| 합
+#   w50, w20       : 피크의 50% / 20% 높이에서 잰 선폭 (km/s, 채널 사이 선형 보간)
+#   centroid       : W20 구간의 플럭스 가중 평균 속도
+
+LINE_NSIGMA = 3.0
+LINE_DILATE = 5
+CATALOG_COLUMNS = ['path', 'mtime_ns', 'size', 'n_channels', 'level', 'noise', 'peak',
+                   'peak_velocity', 'peak_snr', 'integrated_flux', 'w50', 'w20', 'centroid']
+
+def pad_spectra(spectra):
+    """(velocity, flux) 목록을 NaN으로 채운 (N, L) 배열 두 개와 유효 마스크로 만듭니다."""
+    length = max(len(v) for v, _ in spectra)
+    velocity = np.full((len(spectra), length), np.nan)
+    flux = np.full((len(spectra), length), np.nan)
+    for i, (v, f) in enumerate(spectra):
+        velocity[i, :len(v)] = v
+        flux[i, :len(f)] = f
+    valid = np.isfinite(velocity) & np.isfinite(flux)
+    return velocity, flux, valid
+
+def line_free_noise(flux, valid, nsigma=LINE_NSIGMA, dilate=LINE_DILATE, n_iter=1):
+    """선 후보(양의 이상치)를 넓혀 제외한 영역에서 기준 레벨과 MAD 잡음을 구합니다."""
+    mask = valid.copy()
+    for _ in range(n_iter):
+        level = masked_median(flux, mask)
+        noise = masked_sigma(flux, mask)
+        line = np.where(valid, flux - level > nsigma * noise, False)
+        line = maximum_filter1d(line.astype(np.uint8), size=2 * dilate + 1, axis=1).astype(bool)
+        new_mask = valid & ~line
+        # 거의 전부가 선으로 잡히면 (잡음 추정 불가) 이전 마스크 유지
+        keep = new_mask.sum(axis=1) < 10
+        new_mask[keep] = mask[keep]
+        mask = new_mask
+    return masked_median(flux, mask)[:, 0], masked_sigma(flux, mask)[:, 0], mask
+
+def _edge_velocity(velocity, flux, thr, i0, i1):
+    """채널 i0, i1 사이에서 flux가 thr을 지나는 속도를 선형 보간으로 구합니다."""
+    rows = np.arange(len(thr))
+    f0, f1 = flux[rows, i0], flux[rows, i1]
+    v0, v1 = velocity[rows, i0], velocity[rows, i1]
+    df = f1 - f0
+    t = np.divide(thr - f0, df, out=np.zeros_like(df), where=np.isfinite(df) & (df != 0))
+    return v0 + np.clip(t, 0.0, 1.0) * (v1 - v0)
+
+def _width_at(velocity, flux, valid, peak_idx, level, peak, frac):
+    """피크에서 좌우로 flux가 level + frac*(peak-level) 아래로 처음 내려가는 지점 사이의 폭"""
+    n, length = flux.shape
+    thr = level + frac * (peak - level)
+    idx = np.arange(length)[None, :]
+    below = ~valid | (flux < thr[:, None])
+    p = peak_idx[:, None]
+    left = np.where(below & (idx < p), idx, -1).max(axis=1)
+    right = np.where(below & (idx > p), idx, length).min(axis=1)
+    last = valid.sum(axis=1) - 1
+    left_in = np.clip(left + 1, 0, length - 1)
+    right_in = np.minimum(np.clip(right - 1, 0, length - 1), last)
+    v_left = np.where(left >= 0, _edge_velocity(velocity, flux, thr, np.maximum(left, 0), left_in),
+                      velocity[np.arange(n), left_in])
+    has_right = right <= last
+    v_right = np.where(has_right, _edge_velocity(velocity, flux, thr, np.minimum(right, last), right_in),
+                       velocity[np.arange(n), right_in])
+    return np.abs(v_right - v_left), left_in, right_in
+
+def line_statistics(velocity, flux, valid=None):
+    """(N, L) 배치의 선 통계를 스펙트럼별 배열 딕셔너리로 반환합니다."""
+    velocity = np.asarray(velocity, dtype=np.float64)
+    flux = np.asarray(flux, dtype=np.float64)
+    if valid is None:
+        valid = np.isfinite(velocity) & np.isfinite(flux)
+    n, length = flux.shape
+    rows = np.arange(n)
+
+    level, noise, _ = line_free_noise(flux, valid)
+    masked_flux = np.where(valid, flux, -np.inf)
+    peak_idx = masked_flux.argmax(axis=1)
+    peak = flux[rows, peak_idx]
+
+    w50, _, _ = _width_at(velocity, flux, valid, peak_idx, level, peak, 0.5)
+    w20, lo, hi = _width_at(velocity, flux, valid, peak_idx, level, peak, 0.2)
+
+    idx = np.arange(length)[None, :]
+    window = valid & (idx >= lo[:, None]) & (idx <= hi[:, None])
+    dv = np.abs(np.gradient(np.where(valid, velocity, np.nan), axis=1))
+    signal = np.where(window, flux - level[:, None], 0.0)
+    weight = np.where(window, signal * np.nan_to_num(dv), 0.0)
+    integrated = weight.sum(axis=1)
+    centroid = np.divide((weight * np.nan_to_num(velocity)).sum(axis=1), integrated,
+                         out=np.full(n, np.nan), where=integrated != 0)
+
+    return {
+        'n_channels': valid.sum(axis=1),
+        'level': level,
+        'noise': noise,
+        'peak': peak,
+        'peak_velocity': velocity[rows, peak_idx],
+        'peak_snr': np.divide(peak - level, noise, out=np.full(n, np.nan), where=noise > 0),
+        'integrated_flux': integrated,
+        'w50': w50,
+        'w20': w20,
+        'centroid': centroid,
+    }
+
+def spectrum_statistics(file_path):
+    """파일 하나의 선 통계를 딕셔너리로 반환합니다 (velocity, flux = 1, 2번째 열)."""
+    data = np.asarray(load_spectrum(file_path), dtype=np.float64)
+    velocity, flux, valid = pad_spectra([(data[:, 0], data[:, 1])])
+    stats = line_statistics(velocity, flux, valid)
+    return {key: value[0].item() for key, value in stats.items()}
+
+def compute_snr(file_path):
+    """스펙트럼 파일의 피크 SNR (선이 없는 영역의 MAD 잡음 기준)을 계산해 반환합니다."""
+    return spectrum_statistics(file_path)['peak_snr']
+
+# --- 코퍼스 카탈로그 ---
+
+def _catalog_chunk(file_infos):
+    """워커에서 파일 묶음을 읽어 한 번의 벡터 연산으로 통계를 계산합니다."""
+    spectra, infos, rows = [], [], []
+    for info in file_infos:
+        try:
+            data = np.asarray(load_spectrum(info['path']), dtype=np.float64)
+            if data.ndim != 2 or data.shape[1] < 2 or len(data) < 3:
+                raise ValueError(f"unsupported shape {data.shape}")
+            spectra.append((data[:, 0], data[:, 1]))
+            infos.append(info)
+        except Exception as e:
+            print(f"[SKIP] {info['path']} - {e}")
+    if not spectra:
+        return rows
+    velocity, flux, valid = pad_spectra(spectra)
+    stats = line_statistics(velocity, flux, valid)
+    for i, info in enumerate(infos):
+        row = dict(info)
+        row.update({key: value[i].item() for key, value in stats.items()})
+        rows.append(row)
+    return rows
+
+def _read_table(path):
+    return pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+
+def _write_table(df, path):
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+def build_catalog(input_dirs, catalog_path, workers=None, batch_size=512):
+    """
+    입력 디렉토리의 모든 스펙트럼에 대해 선 통계 카탈로그(한 행 = 한 스펙트럼)를 만듭니다.
+    카탈로그가 이미 있으면 새로 생기거나 (mtime, 크기가) 바뀐 파일만 다시 계산하고,
+    사라진 파일의 행은 제거합니다. .parquet 경로를 주면 parquet로 저장합니다.
+    """
+    files = sorted({os.path.abspath(p) for d in input_dirs
+                    for p in glob.glob(os.path.join(d, '**', '*.csv'), recursive=True)})
+    infos = []
+    for path in files:
+        stat = os.stat(path)
+        infos.append({'path': path, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size})
+
+    previous = _read_table(catalog_path) if os.path.exists(catalog_path) else pd.DataFrame(columns=CATALOG_COLUMNS)
+    current = {(info['path'], info['mtime_ns'], info['size']) for info in infos}
+    unchanged = np.array([(p, m, s) in current for p, m, s in
+                          zip(previous['path'], previous['mtime_ns'], previous['size'])], dtype=bool)
+    keep = previous[unchanged]
+    done = set(keep['path'])
+    pending = [info for info in infos if info['path'] not in done]
+    print(f"총 {len(infos)}개 파일 중 {len(pending)}개를 새로 계산합니다 (기존 {len(keep)}개 재사용).")
+
+    new_rows = []
+    if pending:
+        start = time.perf_counter()
+        chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(chunks) == 1:
+            for chunk in chunks:
+                new_rows.extend(_catalog_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for rows in executor.map(_catalog_chunk, chunks):
+                    new_rows.extend(rows)
+        elapsed = time.perf_counter() - start
+        print(f"{len(pending)}개 스펙트럼 처리: {elapsed:.2f}s ({len(pending) / elapsed:,.0f} spectra/s)")
+
+    frames = [df for df in (keep, pd.DataFrame(new_rows, columns=CATALOG_COLUMNS)) if len(df)]
+    catalog = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CATALOG_COLUMNS)
+    catalog = catalog.sort_values('path').reset_index(drop=True)
+    _write_table(catalog, catalog_path)
+    print(f"카탈로그 저장: {catalog_path} ({len(catalog)}행)")
+    return catalog
 
 def main(file_path=None):
     if file_path is None and len(sys.argv) > 1:
@@ -9,9 +216,16 @@ def main(file_path=None):
         print("파일 경로가 필요합니다.")
         return
 
-    # MaNGA 파일 형식에 맞게 주석(#)을 무시하고, 공백으로 분리된 데이터를 읽음
-    df = pd.read_csv(file_path, comment='#', delim_whitespace=True, names=['velocity', 'intensity', 'pre_baseline_intensity'])
-    signal = df['intensity'].max()
-    noise = df['intensity'].std()
-    snr = signal / noise
-    print(f"SNR: {snr:.2f}")
+    stats = spectrum_statistics(file_path)
+    print(f"SNR: {stats['peak_snr']:.2f}")
+    print(f"  잡음(MAD): {stats['noise']:.4g}, 적분 플럭스: {stats['integrated_flux']:.4g}")
+    print(f"  W50: {stats['w50']:.1f} km/s, W20: {stats['w20']:.1f} km/s, 중심 속도: {stats['centroid']:.1f} km/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="코퍼스 SNR/선 통계 카탈로그 생성")
+    parser.add_argument('catalog', help="카탈로그 경로 (.csv 또는 .parquet)")
+    parser.add_argument('inputs', nargs='+', help="스펙트럼 CSV 디렉토리")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=512)
+    args = parser.parse_args()
+    build_catalog(args.inputs, args.catalog, workers=args.workers, batch_size=args.batch_size)
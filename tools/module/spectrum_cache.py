@@ -0,0 +1,164 @@
+"""
+공백 구분 스펙트럼 CSV를 위한 공용 로더 (파싱 결과 캐시).
+
+처음 읽을 때 pandas로 파싱한 결과를 중앙 캐시 디렉토리에 .npy로 저장하고,
+이후에는 같은 파일(경로, mtime, 크기가 동일)을 메모리 맵으로 바로 읽습니다.
+캐시 크기가 한도를 넘으면 가장 오래 사용하지 않은 항목부터 삭제합니다 (LRU).
+
+캐시 값은 아래 원래 파서 결과의 .values와 완전히 동일합니다.
+    pd.read_csv(path, sep=r'\\s+', header=None, comment='#')
+
+사용 예 (벤치마크):
+    python -m module.spectrum_cache predata/dr3 predata/dr4
+"""
+import glob
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# 캐시 위치와 크기 한도 (환경 변수로 변경 가능)
+CACHE_DIR = os.environ.get(
+    'CANSAT_SPECTRUM_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'cansat', 'spectra'))
+CACHE_MAX_BYTES = int(os.environ.get('CANSAT_SPECTRUM_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# 프로세스별 캐시 사용량 추정치 (처음 쓸 때 한 번만 디렉토리를 스캔)
+_cache_bytes = None
+
+def parse_spectrum(file_path):
+    """캐시 없이 원래 방식대로 파싱합니다."""
+    return pd.read_csv(file_path, sep=r'\s+', header=None, comment='#').values
+
+def cache_key(file_path):
+    """경로, mtime, 크기로 캐시 키를 만듭니다. 파일이 바뀌면 키도 바뀝니다."""
+    stat = os.stat(file_path)
+    ident = f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(ident.encode('utf-8')).hexdigest()
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.npy")
+
+def _scan_cache(cache_dir):
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith('.npy'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+def _evict(cache_dir, max_bytes):
+    """캐시 크기가 한도를 넘으면 최근 사용 시각(mtime)이 오래된 항목부터 삭제합니다."""
+    global _cache_bytes
+    entries = sorted(_scan_cache(cache_dir))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    _cache_bytes = total
+
+def _store(arr, path, cache_dir, max_bytes):
+    global _cache_bytes
+    os.makedirs(cache_dir, exist_ok=True)
+    if _cache_bytes is None:
+        _cache_bytes = sum(size for _, size, _ in _scan_cache(cache_dir))
+    # 다른 프로세스와 동시에 써도 깨지지 않도록 임시 파일에 쓴 뒤 원자적으로 교체
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, arr)
+    os.replace(tmp_path, path)
+    _cache_bytes += os.path.getsize(path)
+    if _cache_bytes > max_bytes:
+        _evict(cache_dir, max_bytes)
+
+def load_spectrum(file_path, cache_dir=None, max_bytes=None, use_cache=True):
+    """
+    스펙트럼 파일을 2차원 배열로 읽습니다. 캐시 적중 시 읽기 전용 메모리 맵을 반환하므로
+    값을 수정하려면 먼저 복사(np.array)하세요.
+    """
+    if not use_cache:
+        return parse_spectrum(file_path)
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    path = _cache_path(cache_key(file_path), cache_dir)
+    if os.path.exists(path):
+        try:
+            arr = np.load(path, mmap_mode='r')
+            os.utime(path)  # LRU 순서를 위해 사용 시각 갱신
+            return arr
+        except (OSError, ValueError):
+            pass  # 손상된 캐시는 다시 만듦
+
+    arr = parse_spectrum(file_path)
+    if arr.dtype == object:
+        # 숫자가 아닌 값이 섞인 파일은 캐시하지 않고 원래 결과를 그대로 돌려줌
+        return arr
+    try:
+        _store(arr, path, cache_dir, max_bytes)
+    except OSError as e:
+        print(f"Warning: 스펙트럼 캐시 저장 실패 ({file_path}): {e}")
+    return arr
+
+def read_spectrum_df(file_path, names, **kwargs):
+    """
+    pd.read_csv(file_path, comment='#', delim_whitespace=True, names=names) 와 같은 DataFrame을 반환합니다.
+    파일의 열이 names보다 적으면 나머지 열은 NaN으로 채우고, 많으면 앞쪽 열만 사용합니다.
+    """
+    arr = load_spectrum(file_path, **kwargs)
+    if arr.shape[1] >= len(names):
+        data = np.array(arr[:, :len(names)])
+    else:
+        data = np.full((arr.shape[0], len(names)), np.nan, dtype=np.result_type(arr.dtype, np.float64))
+        data[:, :arr.shape[1]] = arr
+    return pd.DataFrame(data, columns=names)
+
+def clear_cache(cache_dir=None):
+    global _cache_bytes
+    cache_dir = cache_dir or CACHE_DIR
+    if os.path.isdir(cache_dir):
+        for _, _, path in _scan_cache(cache_dir):
+            os.remove(path)
+    _cache_bytes = 0
+
+def benchmark(file_paths, cache_dir=None):
+    """원래 파서, 첫 읽기(캐시 생성), 캐시 읽기의 소요 시간을 비교하고 결과가 동일한지 검증합니다."""
+    timings = {}
+
+    start = time.perf_counter()
+    parsed = [parse_spectrum(p) for p in file_paths]
+    timings['pandas'] = time.perf_counter() - start
+
+    clear_cache(cache_dir)
+    start = time.perf_counter()
+    for p in file_paths:
+        load_spectrum(p, cache_dir=cache_dir)
+    timings['cold_cache'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cached = [np.asarray(load_spectrum(p, cache_dir=cache_dir)) for p in file_paths]
+    timings['warm_cache'] = time.perf_counter() - start
+
+    mismatches = [p for p, a, b in zip(file_paths, parsed, cached) if not np.array_equal(a, b)]
+    return timings, mismatches
+
+if __name__ == "__main__":
+    dirs = sys.argv[1:]
+    if not dirs:
+        print("사용법: python -m module.spectrum_cache <데이터 디렉토리> [...]")
+        sys.exit(1)
+    files = [p for d in dirs for p in glob.glob(os.path.join(d, '*.csv'))]
+    print(f"{len(files)}개 파일로 벤치마크를 실행합니다. 캐시: {CACHE_DIR}")
+    timings, mismatches = benchmark(files)
+    for name, seconds in timings.items():
+        print(f"  {name:>10}: {seconds:8.3f}s ({len(files) / seconds:,.0f} files/s)")
+    print(f"  속도 향상 (pandas / warm_cache): {timings['pandas'] / timings['warm_cache']:.1f}x")
+    print(f"  불일치 파일: {len(mismatches)}개")
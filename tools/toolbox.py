@@ -1,6 +1,14 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
+import itertools
 import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib.pyplot as plt
 
 # 모듈 불러오기
 import module.axishifter as ax
@@ -11,76 +19,231 @@ import module.fft as fft
 import module.snr as snr
 import module.doffler as doffler
 import module.info as info
+from module.spectrum_cache import load_spectrum
 
-selected_file = None
+# --- 백그라운드 작업 실행 ---
+# 버튼은 선택된 파일마다 작업(Job)을 스레드 풀에 넣고 바로 돌아옵니다.
+# 작업 스레드는 Tk 위젯을 직접 건드리지 않고 ui_queue에 메시지만 넣으며,
+# Tk 스레드가 root.after로 큐를 비우면서 작업 목록 갱신과 그래프/메시지 표시를 합니다.
 
-def select_file():
-    global selected_file
-    file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
-    if file_path:
-        selected_file = file_path
-        file_label.config(text=os.path.basename(file_path))
-        messagebox.showinfo("파일 선택됨", f"선택된 파일:\n{file_path}")
-
-def preprocess():    
-    if not selected_file:
-        messagebox.showerror("에러", "먼저 파일을 선택하세요.")
+MAX_WORKERS = max(2, min(4, os.cpu_count() or 2))
+POLL_MS = 100
+
+selected_files = []
+jobs = {}
+job_ids = itertools.count(1)  # 끝난 작업을 지워도 번호가 다시 쓰이지 않도록 단조 증가
+ui_queue = queue.Queue()
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, job_id, name, file_path):
+        self.id = job_id
+        self.name = name
+        self.file_path = file_path
+        self.status = "대기"
+        self.progress = 0.0
+        self.result = ""
+        self.start_time = None
+        self.end_time = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    # 아래 메서드는 작업 스레드에서 호출됩니다 (큐를 통해서만 UI에 반영)
+    def set_progress(self, fraction):
+        ui_queue.put(('update', self.id, {'progress': fraction}))
+
+    def check_cancel(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+def _run_job(job, work):
+    """작업 스레드: work(job)을 실행하고 결과를 Tk 스레드로 넘깁니다."""
+    if job.cancel_event.is_set():
+        ui_queue.put(('update', job.id, {'status': "취소됨", 'end': True}))
         return
+    ui_queue.put(('update', job.id, {'status': "실행 중", 'start': True}))
     try:
-        # 1단계: MaNGA 파일 정리 (axishifter가 담당)
-        print(f"1단계: {selected_file} 처리 중...")
-        ax.main(selected_file)
-        vel_file = selected_file.replace(".csv", "_vel.csv")
-        # 2단계: 리샘플링
-        print(f"2단계: {vel_file} 리샘플링 중...")
-        res.main(vel_file)
-        resampled_file = vel_file.replace(".csv", "_resampled.csv")
-        # 3단계: 베이스라인 제거
-        print(f"3단계: {resampled_file} 베이스라인 제거 중...")
-        db.main(resampled_file)
-        final_file = resampled_file.replace(".csv", "_debaselined.csv")
-        messagebox.showinfo("전처리 완료", f"전처리 결과 파일:\n{final_file}")
-        print(f"전처리 완료. 최종 파일: {final_file}")
+        finish = work(job)
+        ui_queue.put(('done', job.id, finish))
+    except (JobCancelled, fft.Cancelled):
+        ui_queue.put(('update', job.id, {'status': "취소됨", 'end': True}))
     except Exception as e:
-        messagebox.showerror("전처리 실패", str(e))
-        print(f"전처리 실패: {e}")
+        traceback.print_exc()
+        ui_queue.put(('update', job.id, {'status': "실패", 'result': str(e), 'end': True}))
 
-def view_graph():
-    if selected_file:
-        graph.main(selected_file)
-    else:
+def submit(name, work):
+    """선택된 파일마다 작업을 하나씩 등록합니다. work(job)은 Tk 스레드에서 실행할 함수(또는 결과 문자열)를 반환합니다."""
+    if not selected_files:
         messagebox.showerror("에러", "먼저 파일을 선택하세요.")
+        return
+    for file_path in selected_files:
+        job = Job(next(job_ids), name, file_path)
+        jobs[job.id] = job
+        job_list.insert('', 'end', iid=str(job.id), values=_row_values(job))
+        job.future = executor.submit(_run_job, job, work)
+
+def _row_values(job):
+    return (job.id, job.name, os.path.basename(job.file_path), job.status,
+            f"{job.progress * 100:.0f}%", f"{job.elapsed():.1f}s", job.result)
+
+def poll_queue():
+    """Tk 스레드: 작업 스레드가 보낸 메시지를 처리하고 실행 중인 작업의 경과 시간을 갱신합니다."""
+    try:
+        while True:
+            kind, job_id, payload = ui_queue.get_nowait()
+            job = jobs[job_id]
+            if kind == 'update':
+                if payload.get('start'):
+                    job.start_time = time.perf_counter()
+                if payload.get('end'):
+                    job.end_time = time.perf_counter()
+                job.status = payload.get('status', job.status)
+                job.progress = payload.get('progress', job.progress)
+                job.result = payload.get('result', job.result)
+            elif kind == 'done':
+                job.end_time = time.perf_counter()
+                job.status = "완료"
+                job.progress = 1.0
+                try:
+                    job.result = (payload() if callable(payload) else payload) or ""
+                except Exception as e:
+                    traceback.print_exc()
+                    job.status = "실패"
+                    job.result = str(e)
+            job_list.item(str(job.id), values=_row_values(job))
+    except queue.Empty:
+        pass
+    for job in jobs.values():
+        if job.status == "실행 중":
+            job_list.item(str(job.id), values=_row_values(job))
+    root.after(POLL_MS, poll_queue)
+
+def cancel_selected():
+    for iid in job_list.selection():
+        job = jobs[int(iid)]
+        if job.status in ("대기", "실행 중"):
+            job.cancel_event.set()
+            # 아직 시작하지 않은 작업은 바로 취소
+            if job.future is not None and job.future.cancel():
+                job.status = "취소됨"
+                job_list.item(iid, values=_row_values(job))
+
+def clear_finished():
+    for job_id in [i for i, job in jobs.items() if job.status in ("완료", "실패", "취소됨")]:
+        job_list.delete(str(job_id))
+        del jobs[job_id]
+
+def select_file():
+    global selected_files
+    file_paths = filedialog.askopenfilenames(filetypes=[("CSV files", "*.csv"), ("I/Q files", "*.cu8 *.bin *.cf32 *.c64"), ("All files", "*.*")])
+    if file_paths:
+        selected_files = list(file_paths)
+        if len(selected_files) == 1:
+            file_label.config(text=os.path.basename(selected_files[0]))
+        else:
+            file_label.config(text=f"{len(selected_files)}개 파일 선택됨")
+
+# --- 작업 정의 (작업 스레드에서 실행) ---
+# 계산은 여기서 하고, 그래프 표시처럼 Tk/pyplot이 필요한 부분은 반환하는 함수로 넘깁니다.
+
+def preprocess_work(job):
+    # 1단계: MaNGA 파일 정리 (axishifter가 담당)
+    print(f"1단계: {job.file_path} 처리 중...")
+    vel_file = ax.convert_file(job.file_path)
+    job.set_progress(1 / 3)
+    job.check_cancel()
+    # 2단계: 리샘플링
+    print(f"2단계: {vel_file} 리샘플링 중...")
+    resampled_file = res.resample_file(vel_file)
+    job.set_progress(2 / 3)
+    job.check_cancel()
+    # 3단계: 베이스라인 제거
+    print(f"3단계: {resampled_file} 베이스라인 제거 중...")
+    final_file, diagnostics = db.remove_baseline_file(resampled_file)
+    print(f"전처리 완료. 최종 파일: {final_file}")
+    return f"{os.path.basename(final_file)} (RMS {diagnostics['rms']:.3g})"
+
+def graph_work(job):
+    data = load_spectrum(job.file_path)
+
+    def show():
+        fig, axis = plt.subplots()
+        graph.plot_spectrum(axis, data[:, 0], data[:, 1])
+        axis.set_title(os.path.basename(job.file_path))
+        plt.show(block=False)
+    return show
+
+def fft_work(job):
+    result = fft.welch_psd(job.file_path, progress=job.set_progress, cancel=job.cancel_event)
+
+    def show():
+        fft.plot_result(result)
+        plt.show(block=False)
+        return f"{result['n_samples']:,} samples, {result['msps']:.1f} MS/s"
+    return show
+
+def snr_work(job):
+    stats = snr.spectrum_statistics(job.file_path)
+    print(f"SNR ({job.file_path}): {stats['peak_snr']:.2f}")
+    return f"SNR {stats['peak_snr']:.2f}, W50 {stats['w50']:.1f} km/s"
+
+def doffler_work(job):
+    try:
+        output, correction, assumed = doffler.correct_file(job.file_path)
+    except doffler.MissingMetadata as e:
+        print(f"도플러 보정 건너뜀: {e}")
+        return f"건너뜀: {e}"
+    print(f"도플러 보정 완료 ({correction:+.3f} km/s, LSRK): {output}")
+    if assumed:
+        print(f"경고: 헤더에 값이 없어 {', '.join(assumed)}으로 가정했습니다.")
+        return f"{correction:+.3f} km/s → {os.path.basename(output)} (가정: {', '.join(assumed)})"
+    return f"{correction:+.3f} km/s → {os.path.basename(output)}"
+
+def info_work(job):
+    result = info.get_info(job.file_path)
+    print("열 이름:", result['columns'])
+    print("행 수:", result['rows'])
+    print("샘플 데이터:\n", result['head'])
+    return f"{result['rows']}행, 열: {' '.join(result['columns'])}"
+
+def preprocess():
+    submit("전처리", preprocess_work)
+
+def view_graph():
+    submit("그래프", graph_work)
 
 def run_fft():
-    if selected_file:
-        fft.main(selected_file)
-    else:
-        messagebox.showerror("에러", "먼저 파일을 선택하세요.")
+    submit("FFT", fft_work)
 
 def calc_snr():
-    if selected_file:
-        snr.main(selected_file)
-    else:
-        messagebox.showerror("에러", "먼저 파일을 선택하세요.")
+    submit("SNR", snr_work)
 
 def run_doffler():
-    if selected_file:
-        doffler.main(selected_file)
-    else:
-        messagebox.showerror("에러", "먼저 파일을 선택하세요.")
+    submit("도플러", doffler_work)
 
 def show_info():
-    if selected_file:
-        info.main(selected_file)
-    else:
-        messagebox.showerror("에러", "먼저 파일을 선택하세요.")
+    submit("메타정보", info_work)
+
+def on_close():
+    for job in jobs.values():
+        job.cancel_event.set()
+    executor.shutdown(wait=False, cancel_futures=True)
+    root.destroy()
 
 # GUI 구성
 root = tk.Tk()
 root.title("CanSat 1D Hydrogen Spectrum 분석 툴")
-root.geometry("400x400")
+root.geometry("760x640")
 
-tk.Button(root, text="파일 선택", command=select_file, width=30).pack(pady=10)
+tk.Button(root, text="파일 선택 (여러 개 가능)", command=select_file, width=30).pack(pady=10)
 file_label = tk.Label(root, text="선택된 파일 없음")
 file_label.pack()
 
@@ -91,4 +254,21 @@ tk.Button(root, text="FFT 실행", command=run_fft, width=40).pack(pady=5)
 tk.Button(root, text="도플러 제거 (NRAO 전용)", command=run_doffler, width=40).pack(pady=5)
 tk.Button(root, text="메타정보 보기 (NRAO 전용)", command=show_info, width=40).pack(pady=5)
 
+# 작업 목록
+columns = ("id", "task", "file", "status", "progress", "elapsed", "result")
+headings = ("#", "작업", "파일", "상태", "진행률", "경과", "결과")
+widths = (30, 70, 170, 60, 60, 60, 280)
+job_list = ttk.Treeview(root, columns=columns, show='headings', height=10)
+for column, heading, width in zip(columns, headings, widths):
+    job_list.heading(column, text=heading)
+    job_list.column(column, width=width, anchor='w')
+job_list.pack(fill='both', expand=True, padx=10, pady=(10, 5))
+
+job_buttons = tk.Frame(root)
+job_buttons.pack(pady=5)
+tk.Button(job_buttons, text="선택한 작업 취소", command=cancel_selected, width=18).pack(side='left', padx=5)
+tk.Button(job_buttons, text="끝난 작업 지우기", command=clear_finished, width=18).pack(side='left', padx=5)
+
+root.protocol("WM_DELETE_WINDOW", on_close)
+root.after(POLL_MS, poll_queue)
 root.mainloop()
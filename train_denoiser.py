@@ -1,52 +1,91 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
-import pandas as pd
+from torch.utils.data import Dataset, DataLoader, DistributedSampler
 import numpy as np
 import os
 import glob
 from tqdm import tqdm
 import copy
-from scipy.signal import resample
+import sys
+import hashlib
+import json
+import time
+# tools/module 의 공용 스펙트럼 로더(파싱 결과 캐시)를 사용하기 위해 경로 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from module.spectrum_cache import load_spectrum
+from module.resampler import resample_to_length
+import augmentation
+import corruptions
+import dataset_manifest
+from checkpointing import AsyncCheckpointer
+from training_metrics import StepInstrumentation
+from cpu_perf import setup_cpu_perf, prepare_model, autocast_context, check_accuracy
+import distributed_training as ddp
+from augmentation import file_rng
+from streaming_dataset import ShardedSpectraStream, write_shards, cache_key, load_target
 
 # --- 1. 모델 아키텍처 (1D U-Net with Dropout) ---
-# (변경 없음)
 class ConvBlock(nn.Module):
-    def __init__(self, in_channels, out_channels):
+    """
+    (Conv1d → BN → ReLU) x layers. separable=True면 각 Conv1d를 depthwise(k=3) + pointwise(1x1) 쌍으로 바꿔
+    연산량과 파라미터를 줄입니다. 기본값(layers=2, separable=False)은 기존 블록과 같은 구조/state_dict 키입니다.
+    """
+    def __init__(self, in_channels, out_channels, layers=2, separable=False):
         super().__init__()
-        self.block = nn.Sequential(
-            nn.Conv1d(in_channels, out_channels, kernel_size=3, padding=1),
-            nn.BatchNorm1d(out_channels),
-            nn.ReLU(inplace=True),
-            nn.Conv1d(out_channels, out_channels, kernel_size=3, padding=1),
-            nn.BatchNorm1d(out_channels),
-            nn.ReLU(inplace=True)
-        )
+        modules = []
+        for i in range(layers):
+            channels = in_channels if i == 0 else out_channels
+            if separable:
+                modules.append(nn.Sequential(
+                    nn.Conv1d(channels, channels, kernel_size=3, padding=1, groups=channels),
+                    nn.Conv1d(channels, out_channels, kernel_size=1)))
+            else:
+                modules.append(nn.Conv1d(channels, out_channels, kernel_size=3, padding=1))
+            modules += [nn.BatchNorm1d(out_channels), nn.ReLU(inplace=True)]
+        self.block = nn.Sequential(*modules)
     def forward(self, x):
         return self.block(x)
 
 class UNet1D(nn.Module):
-    def __init__(self, in_channels=1, out_channels=1, dropout_rate=0.5):
+    """
+    width_mult : 채널 폭 배수 (base_channels * width_mult의 1, 2, 4, 8배; 기본 64/128/256/512)
+    depth_mult : ConvBlock당 합성곱 층 수 배수 (기본 2층; 0.5 → 1층, 1.5 → 3층)
+    separable  : depthwise-separable 합성곱 블록 사용 (경량 모델용; lightweight_models.py)
+    """
+    def __init__(self, in_channels=1, out_channels=1, dropout_rate=0.5, base_channels=64, width_mult=1.0, depth_mult=1.0,
+                 separable=False):
         super().__init__()
-        self.enc1 = ConvBlock(in_channels, 64)
-        self.enc2 = ConvBlock(64, 128)
-        self.enc3 = ConvBlock(128, 256)
+        base = max(4, int(round(base_channels * width_mult)))
+        self.widths = (base, base * 2, base * 4, base * 8)
+        c1, c2, c3, c4 = self.widths
+        block = dict(layers=max(1, int(round(2 * depth_mult))), separable=separable)
+        self.enc1 = ConvBlock(in_channels, c1, **block)
+        self.enc2 = ConvBlock(c1, c2, **block)
+        self.enc3 = ConvBlock(c2, c3, **block)
         self.pool = nn.MaxPool1d(2)
-        self.bottleneck = nn.Sequential(ConvBlock(256, 512), nn.Dropout(dropout_rate))
-        self.upconv3 = nn.ConvTranspose1d(512, 256, kernel_size=2, stride=2)
-        self.dec3 = ConvBlock(512, 256)
-        self.upconv2 = nn.ConvTranspose1d(256, 128, kernel_size=2, stride=2)
-        self.dec2 = ConvBlock(256, 128)
-        self.upconv1 = nn.ConvTranspose1d(128, 64, kernel_size=2, stride=2)
-        self.dec1 = ConvBlock(128, 64)
-        self.out_conv = nn.Conv1d(64, out_channels, kernel_size=1)
+        self.bottleneck = nn.Sequential(ConvBlock(c3, c4, **block), nn.Dropout(dropout_rate))
+        self.upconv3 = nn.ConvTranspose1d(c4, c3, kernel_size=2, stride=2)
+        self.dec3 = ConvBlock(c4, c3, **block)
+        self.upconv2 = nn.ConvTranspose1d(c3, c2, kernel_size=2, stride=2)
+        self.dec2 = ConvBlock(c3, c2, **block)
+        self.upconv1 = nn.ConvTranspose1d(c2, c1, kernel_size=2, stride=2)
+        self.dec1 = ConvBlock(c2, c1, **block)
+        self.out_conv = nn.Conv1d(c1, out_channels, kernel_size=1)
 
     def forward(self, x):
+        return self._forward(x)
+
+    def _forward(self, x, level_bias=None):
+        # level_bias: enc1, enc2, enc3, bottleneck 출력에 더할 (B, C, 1) 텐서 4개 (확산 모델의 시간 임베딩; diffusion_denoiser.py)
         e1 = self.enc1(x)
+        if level_bias is not None: e1 = e1 + level_bias[0]
         e2 = self.enc2(self.pool(e1))
+        if level_bias is not None: e2 = e2 + level_bias[1]
         e3 = self.enc3(self.pool(e2))
+        if level_bias is not None: e3 = e3 + level_bias[2]
         b = self.bottleneck(self.pool(e3))
+        if level_bias is not None: b = b + level_bias[3]
         d3 = self.upconv3(b)
         if d3.shape[2] != e3.shape[2]: d3 = nn.functional.pad(d3, (0, e3.shape[2] - d3.shape[2]))
         d3 = torch.cat([d3, e3], dim=1)
@@ -62,159 +101,440 @@ class UNet1D(nn.Module):
         return self.out_conv(d1)
 
 # --- 2. 데이터 로더 (안정성 강화) ---
+# 파일에는 깨끗한 목표 스펙트럼(2번째 열)만 있으면 됩니다. 입력용 오차(linear/peak/noise)는
+# 미리 만들어 둔 증강 열 대신 배치마다 AugmentingCollate가 새로 만들어 매 에폭 다른 입력을 봅니다.
 
 class SpectraDataset(Dataset):
-    def __init__(self, file_paths, target_length=1024):
+    def __init__(self, file_paths, target_length=1024, samples_per_file=5):
         self.file_paths = file_paths
-        self.num_augmentations = 5
+        self.samples_per_file = samples_per_file  # 한 에폭에 파일마다 뽑는 (서로 다른 오차의) 샘플 수
         self.target_length = target_length
         if not self.file_paths:
             raise ValueError("데이터 파일을 찾을 수 없습니다. 경로를 확인하세요.")
 
     def __len__(self):
-        return len(self.file_paths) * self.num_augmentations
+        return len(self.file_paths) * self.samples_per_file
 
     def __getitem__(self, idx):
         try:
-            file_idx = idx // self.num_augmentations
-            aug_idx = idx % self.num_augmentations
-            file_path = self.file_paths[file_idx]
+            file_path = self.file_paths[idx // self.samples_per_file]
             
-            data = pd.read_csv(file_path, sep=r'\s+', header=None, comment='#').values.astype(np.float32)
+            data = load_spectrum(file_path).astype(np.float32)
 
             # --- 안정성 강화 1: 데이터 유효성 검사 (NaN, Inf 확인) ---
             if not np.isfinite(data).all():
                 return None
 
-            if data.shape[1] < 8:
+            if data.shape[1] < 2:
                 return None
 
             target_flux = data[:, 1]
-            input_flux = data[:, 3 + aug_idx]
 
             if len(target_flux) != self.target_length:
-                target_flux = resample(target_flux, self.target_length)
-                input_flux = resample(input_flux, self.target_length)
+                # 속도 축 기준 등간격 격자로 보간 (FFT 리샘플링 대신)
+                _, (target_flux,) = resample_to_length(data[:, 0], [target_flux], self.target_length)
 
-            input_tensor = torch.from_numpy(input_flux.copy()).unsqueeze(0)
-            target_tensor = torch.from_numpy(target_flux.copy()).unsqueeze(0)
-            return input_tensor, target_tensor
+            return idx, torch.from_numpy(target_flux.copy()).unsqueeze(0)
         except Exception:
             return None
 
-def collate_fn_skip_none(batch):
-    batch = list(filter(lambda x: x is not None, batch))
-    if not batch:
-        return torch.Tensor(), torch.Tensor()
-    return torch.utils.data.dataloader.default_collate(batch)
+# --- 2-1. 사전 패킹 캐시 ---
+# 모든 파일을 한 번만 검증/리샘플링해 (파일 수, target_length) float32 .npy 하나로 묶어 둡니다.
+# 키는 파일 목록(경로, 크기, 수정 시각)과 target_length의 해시이므로 파일이 바뀌면 자동으로 다시 만들고,
+# 이후 실행은 np.load(mmap_mode='r')로 파싱 없이 행 인덱스만으로 읽습니다.
+# 입력 스펙트럼은 AugmentingCollate가 배치마다 새로 만들므로 목표 스펙트럼만 저장합니다.
+
+def build_packed_cache(file_paths, cache_dir, target_length=1024):
+    """
+    목표 스펙트럼을 (M, target_length) float32 배열로 묶어 cache_dir에 저장하고
+    (메모리 맵 배열, 포함된 파일 경로 목록)을 반환합니다. 같은 키의 캐시가 있으면 그대로 읽습니다.
+    """
+    file_paths = sorted(file_paths)
+    key = cache_key(file_paths, target_length)
+    array_path = os.path.join(cache_dir, f"spectra_{target_length}_{key}.npy")
+    index_path = os.path.join(cache_dir, f"spectra_{target_length}_{key}.json")
+    if os.path.exists(array_path) and os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        print(f"Packed cache hit: {array_path} ({len(index['files'])} spectra)")
+        return np.load(array_path, mmap_mode='r'), index['files']
+
+    os.makedirs(cache_dir, exist_ok=True)
+    start = time.perf_counter()
+    tmp_path = array_path + f".{os.getpid()}.tmp.npy"
+    packed = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(len(file_paths), target_length))
+    files, skipped = [], []
+    for file_path in tqdm(file_paths, desc="Packing spectra"):
+        target_flux = load_target(file_path, target_length)
+        if target_flux is None:
+            skipped.append(file_path)
+            continue
+        packed[len(files)] = target_flux
+        files.append(file_path)
+    packed.flush()
+    del packed
+
+    # 유효한 행만 남기고(잘라내기) 원자적으로 교체
+    if skipped:
+        full = np.load(tmp_path, mmap_mode='r')
+        trimmed_path = array_path + f".{os.getpid()}.trim.npy"
+        np.save(trimmed_path, np.asarray(full[:len(files)]))
+        del full
+        os.replace(trimmed_path, tmp_path)
+    os.replace(tmp_path, array_path)
+    index = {'target_length': target_length, 'files': files, 'skipped': skipped}
+    with open(index_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+    os.replace(index_path + ".tmp", index_path)
+    print(f"Packed {len(files)} spectra ({len(skipped)} invalid skipped) in {time.perf_counter() - start:.1f}s → {array_path}")
+    return np.load(array_path, mmap_mode='r'), files
+
+class PackedSpectraDataset(Dataset):
+    """build_packed_cache 결과의 일부 행(rows)을 SpectraDataset과 같은 (idx, (1, L) 텐서) 형태로 제공합니다."""
+    def __init__(self, packed, rows, samples_per_file=5):
+        self.packed = packed
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.samples_per_file = samples_per_file
+        if len(self.rows) == 0:
+            raise ValueError("데이터 파일을 찾을 수 없습니다. 경로를 확인하세요.")
+
+    def __len__(self):
+        return len(self.rows) * self.samples_per_file
+
+    def __getitem__(self, idx):
+        target_flux = np.array(self.packed[self.rows[idx // self.samples_per_file]])
+        return idx, torch.from_numpy(target_flux).unsqueeze(0)
+
+class AugmentingCollate:
+    """
+    (idx, 목표 스펙트럼) 배치를 모아 입력 스펙트럼을 한 번에 만듭니다.
+    effects=None이면 augmentation 모듈의 기존 오차(linear/peak/noise)를, 효과 이름 목록이면
+    corruptions 모듈의 실제 관측 손상(ripple, bandpass, dc_spike, rfi_comb ...)을 사용합니다.
+    - 학습 (seed=None): 프로세스마다 torch.initial_seed()로 Generator를 만듭니다. DataLoader 워커의 시드는
+      에폭마다 새로 정해지므로 매 에폭 새로운 오차가 나오고, torch.manual_seed를 고정하면 재현됩니다.
+    - 검증 (seed 지정): 샘플마다 (seed, idx)로 난수열을 정해 에폭이 바뀌어도 같은 입력을 사용합니다.
+    ranges는 기존 오차의 범위 인자(augmentation.draw_params의 max_slope, noise_level 등),
+    probabilities/corruption_ranges는 corruptions.draw_params의 probabilities/ranges 인자입니다.
+    """
+    def __init__(self, seed=None, effects=None, probabilities=None, corruption_ranges=None, **ranges):
+        if effects is None and (probabilities or corruption_ranges):
+            raise ValueError("probabilities/corruption_ranges는 effects를 지정했을 때만 사용할 수 있습니다.")
+        if effects is not None and ranges:
+            raise ValueError(f"effects를 지정하면 기존 오차 범위 인자 {sorted(ranges)}는 사용할 수 없습니다. "
+                             "corruption_ranges로 효과별 범위를 지정하세요.")
+        self.seed = seed
+        self.effects = tuple(effects) if effects is not None else None
+        self.ranges = ranges
+        self.probabilities = probabilities
+        self.corruption_ranges = corruption_ranges
+        self._rng = None
+        self._pid = None
+
+    def _generator(self):
+        if self._rng is None or self._pid != os.getpid():
+            self._rng = np.random.default_rng(torch.initial_seed())
+            self._pid = os.getpid()
+        return self._rng
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_rng'] = None
+        return state
+
+    def _corrupt(self, flux, rng):
+        n, length = flux.shape
+        if self.effects is None:
+            return augmentation.apply_params(flux, augmentation.draw_params(rng, n, length, **self.ranges))
+        params = corruptions.draw_params(rng, n, length, effects=self.effects, probabilities=self.probabilities,
+                                         ranges=self.corruption_ranges)
+        return corruptions.apply_params(flux, params)
+
+    def __call__(self, batch):
+        batch = [item for item in batch if item is not None]
+        if not batch:
+            return torch.Tensor(), torch.Tensor()
+        indices = [idx for idx, _ in batch]
+        targets = torch.stack([target for _, target in batch])
+        flux = targets[:, 0].numpy()
+
+        if self.seed is None:
+            inputs = self._corrupt(flux, self._generator())
+        else:
+            inputs = np.concatenate([self._corrupt(flux[i:i + 1], file_rng(self.seed, str(idx)))
+                                     for i, idx in enumerate(indices)])
+        return torch.from_numpy(inputs.astype(np.float32)).unsqueeze(1), targets
 
 # --- 3. 학습 파이프라인 (안정성 강화) ---
 
-def train_model(data_dirs, model_save_path, epochs=50, batch_size=16, lr=1e-5, validation_split=0.2, patience=7, target_length=1024):
+def _hash_fraction(name):
+    """이름으로 정해지는 [0, 1) 값 (실행/샤드 구성과 무관한 학습/검증 분할용)"""
+    return int(hashlib.sha1(name.encode('utf-8')).hexdigest()[:8], 16) / 16 ** 8
+
+def split_files(file_paths, validation_split=0.2):
+    """
+    파일 이름 해시로 (학습, 검증) 파일 목록을 나눕니다. 실행, 캐시/샤드 모드, 분산 rank와 무관하게 같은 분할이므로
+    학습 뒤 평가 스크립트도 같은 검증 파일을 쓸 수 있습니다.
+    """
+    train_files = [p for p in file_paths if _hash_fraction(os.path.basename(p)) >= validation_split]
+    val_files = [p for p in file_paths if _hash_fraction(os.path.basename(p)) < validation_split]
+    return train_files, val_files
+
+def _quiet(*args, **kwargs):
+    """분산 학습에서 rank 0이 아닌 프로세스의 로그 출력 대신 사용"""
+
+def _timed(loader, data_wait):
+    """배치를 기다린 시간(다음 배치가 준비될 때까지 학습 루프가 멈춘 시간)을 data_wait[0]에 더합니다."""
+    iterator = iter(loader)
+    while True:
+        start = time.perf_counter()
+        try:
+            batch = next(iterator)
+        except StopIteration:
+            return
+        data_wait[0] += time.perf_counter() - start
+        yield batch
+
+def train_model(data_dirs, model_save_path, epochs=50, batch_size=16, lr=1e-5, validation_split=0.2, patience=7, target_length=1024,
+                samples_per_file=5, val_seed=0, corruption_effects=None, cache_dir=None, shard_dir=None, num_workers=0,
+                manifest_path=None, cpu_perf=None, model_kwargs=None, epoch_callback=None, keep_top_k=3, checkpoint_every_steps=None,
+                instrumentation=None, teacher_path=None, teacher_kwargs=None, distill_alpha=0.5):
+    """
+    cache_dir를 지정하면 파일을 매번 읽는 대신 사전 패킹 캐시(build_packed_cache)에서 학습합니다.
+    shard_dir를 지정하면 메모리에 다 올리지 않고 샤드 파일에서 스트리밍합니다 (streaming_dataset.py).
+    num_workers > 0이면 워커를 에폭 사이에 유지(persistent_workers)하며 미리 배치를 준비합니다.
+    manifest_path를 지정하면 매니페스트(dataset_manifest.py)를 갱신하고 검증된 파일만 사용합니다.
+    cpu_perf에 설정 딕셔너리를 주면 CPU 성능 모드(bf16 autocast, torch.compile, 스레드 수; cpu_perf.py)로 학습합니다.
+    torchrun으로 실행하면 gloo 분산 데이터 병렬로 학습합니다 (distributed_training.py). batch_size는 프로세스당 크기입니다.
+    학습/검증 분할은 모든 모드에서 파일 이름 해시(split_files)로 정해지므로 실행마다, rank마다 같습니다.
+    model_kwargs는 UNet1D에 그대로 전달됩니다 (예: {'dropout_rate': 0.2, 'base_channels': 32}).
+    epoch_callback(epoch, train_loss, val_loss)이 True를 반환하면 그 에폭에서 학습을 멈춥니다 (하이퍼파라미터 탐색의 가지치기용).
+    체크포인트는 백그라운드 스레드가 원자적으로 저장하며 (checkpointing.py), 검증 손실 상위 keep_top_k개 에폭 체크포인트를 남깁니다.
+    checkpoint_every_steps를 주면 에폭 중간에도 그 배치 수마다 checkpoint.pth를 갱신합니다 (이어서 학습하면 그 에폭을 처음부터 다시 돕니다).
+    instrumentation에 설정 딕셔너리를 주면 스텝별 구간 시간(data/forward/backward/optimizer/checkpoint), samples/s, 최대 RSS를
+    JSONL/CSV와 TensorBoard로 기록하고 선택한 스텝을 프로파일링합니다 (training_metrics.py).
+    teacher_path를 주면 지식 증류 모드로 학습합니다: 학습 손실 = distill_alpha * MSE(출력, 교사 출력) + (1 - distill_alpha) * MSE(출력, 정답).
+    교사(기본: 전체 크기 UNet1D, teacher_kwargs로 구조 지정)는 eval 모드로 고정되며, 검증 손실은 항상 정답 기준입니다.
+    최고 검증 손실을 반환합니다.
+    """
+    rank, world_size = ddp.init_distributed()
+    is_main = rank == 0
+    log = print if is_main else _quiet
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
+    log(f"Using device: {device}" + (f", distributed: {world_size} processes ({ddp.BACKEND})" if world_size > 1 else ""))
 
-    model = UNet1D(in_channels=1, out_channels=1).to(device)
+    model = UNet1D(in_channels=1, out_channels=1, **(model_kwargs or {})).to(device)
+    teacher = None
+    if teacher_path is not None:
+        teacher = UNet1D(in_channels=1, out_channels=1, **(teacher_kwargs or {}))
+        teacher.load_state_dict(torch.load(teacher_path, map_location=device))
+        teacher.to(device).eval().requires_grad_(False)
+        log(f"Distillation: teacher {teacher_path} ({sum(p.numel() for p in teacher.parameters()):,} params) → "
+            f"student {sum(p.numel() for p in model.parameters()):,} params, alpha={distill_alpha}")
+    perf = setup_cpu_perf(cpu_perf, device) if cpu_perf is not None else None
     optimizer = optim.Adam(model.parameters(), lr=lr)
     criterion = nn.MSELoss()
 
     checkpoint_path = os.path.join(model_save_path, 'checkpoint.pth')
     os.makedirs(model_save_path, exist_ok=True)
+    checkpointer = AsyncCheckpointer(model_save_path, top_k=keep_top_k, enabled=is_main)
+    metrics = StepInstrumentation(instrumentation, model_save_path, rank=rank, world_size=world_size)
 
-    all_files = [p for d in data_dirs for p in glob.glob(os.path.join(d, '*.csv'))]
+    # 분산 모드: rank 0이 매니페스트/캐시/샤드를 먼저 만든 뒤 나머지 rank는 barrier 뒤에 같은 캐시를 읽기만 합니다.
+    # 분할은 파일 이름 해시로 정하므로 rank 사이에 주고받을 것이 없습니다 (이 구간에는 다른 집합 통신이 없어야 함).
+    if not is_main:
+        ddp.barrier()
+    if manifest_path is not None:
+        manifest = dataset_manifest.update_manifest(data_dirs, manifest_path) if is_main else dataset_manifest.load_manifest(manifest_path)
+        all_files = dataset_manifest.valid_files(manifest)
+    else:
+        all_files = [p for d in data_dirs for p in glob.glob(os.path.join(d, '*.csv'))]
     if not all_files:
         raise ValueError(f"{data_dirs} 에서 데이터 파일을 찾을 수 없습니다.")
     
-    np.random.shuffle(all_files)
-    split_idx = int(len(all_files) * (1 - validation_split))
-    train_files, val_files = all_files[:split_idx], all_files[split_idx:]
-    
-    train_dataset = SpectraDataset(train_files, target_length=target_length)
-    val_dataset = SpectraDataset(val_files, target_length=target_length)
-    
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=0, collate_fn=collate_fn_skip_none)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=0, collate_fn=collate_fn_skip_none)
+    if shard_dir is not None:
+        train_files, val_files = split_files(all_files, validation_split)
+        # rank는 여기서 명시 (spawn으로 시작한 DataLoader 워커에는 프로세스 그룹이 없음)
+        train_dataset = ShardedSpectraStream(write_shards(train_files, shard_dir, target_length=target_length),
+                                             samples_per_file=samples_per_file, rank=rank, world_size=world_size)
+        val_dataset = ShardedSpectraStream(write_shards(val_files, shard_dir, target_length=target_length),
+                                           samples_per_file=samples_per_file, shuffle_buffer=0, rank=rank, world_size=world_size)
+    elif cache_dir is not None:
+        # 캐시 키가 실행마다 같도록 전체 파일로 한 번 패킹한 뒤 행 인덱스를 나눕니다
+        packed, all_files = build_packed_cache(all_files, cache_dir, target_length=target_length)
+        is_val = np.array([_hash_fraction(os.path.basename(p)) < validation_split for p in all_files], dtype=bool)
+        train_dataset = PackedSpectraDataset(packed, np.flatnonzero(~is_val), samples_per_file=samples_per_file)
+        val_dataset = PackedSpectraDataset(packed, np.flatnonzero(is_val), samples_per_file=samples_per_file)
+    else:
+        train_files, val_files = split_files(all_files, validation_split)
+        train_dataset = SpectraDataset(train_files, target_length=target_length, samples_per_file=samples_per_file)
+        val_dataset = SpectraDataset(val_files, target_length=target_length, samples_per_file=samples_per_file)
+    if is_main:
+        ddp.barrier()
+
+    loader_kwargs = {'num_workers': num_workers, 'pin_memory': device.type == 'cuda', 'persistent_workers': num_workers > 0}
+    if num_workers > 0:
+        loader_kwargs['prefetch_factor'] = 4
+    streaming = isinstance(train_dataset, ShardedSpectraStream)
+    # 샤드 스트림은 rank별로 스스로 나누므로 샘플러가 필요 없음
+    train_sampler = DistributedSampler(train_dataset, shuffle=True) if world_size > 1 and not streaming else None
+    val_sampler = DistributedSampler(val_dataset, shuffle=False) if world_size > 1 and not streaming else None
+    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=not streaming and train_sampler is None, sampler=train_sampler,
+                              collate_fn=AugmentingCollate(effects=corruption_effects), **loader_kwargs)
+    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, sampler=val_sampler,
+                            collate_fn=AugmentingCollate(seed=val_seed, effects=corruption_effects), **loader_kwargs)
     
-    print(f"Data loaded: {len(train_dataset)} training samples, {len(val_dataset)} validation samples from {len(all_files)} files.")
-    print(f"All spectra will be resampled to a length of {target_length}. Invalid files will be skipped.")
+    log(f"Data loaded: {len(train_dataset)} training samples, {len(val_dataset)} validation samples from {len(all_files)} files.")
+    log(f"All spectra will be resampled to a length of {target_length}. Invalid files will be skipped.")
 
     start_epoch = 0
     best_loss = float('inf')
     epochs_no_improve = 0
     if os.path.exists(checkpoint_path):
-        print(f"Resuming training from checkpoint: {checkpoint_path}")
-        checkpoint = torch.load(checkpoint_path)
+        log(f"Resuming training from checkpoint: {checkpoint_path}")
+        checkpoint = torch.load(checkpoint_path, map_location=device)
         model.load_state_dict(checkpoint['model_state_dict'])
         optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
         start_epoch = checkpoint['epoch'] + 1
         best_loss = checkpoint['best_loss']
         epochs_no_improve = checkpoint['epochs_no_improve']
-        print(f"Resuming from epoch {start_epoch + 1}")
+        checkpointer.top = [tuple(item) for item in checkpoint.get('top_k', [])]
+        log(f"Resuming from epoch {start_epoch + 1}")
+
+    # 순전파에만 사용 (DDP/컴파일 래퍼도 가중치는 model과 공유하므로 저장은 항상 model로 → 기존 형식과 호환)
+    ddp_model = ddp.wrap_model(model)
+    forward = prepare_model(ddp_model, perf)
+    # 검증은 DDP 래퍼를 거치지 않음: DDP는 no-grad 순전파에서도 BatchNorm 버퍼를 broadcast 하므로
+    # rank마다 검증 배치 수가 다르면 뒤따르는 all_reduce_sum과 집합 통신 순서가 어긋납니다.
+    eval_forward = forward if ddp_model is model else prepare_model(model, perf)
 
-    print("Starting training...")
+    log("Starting training...")
 
     for epoch in range(start_epoch, epochs):
+        epoch_start = time.perf_counter()
+        if streaming:
+            train_dataset.set_epoch(epoch)
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
         model.train()
         running_loss = 0.0
-        train_progress = tqdm(train_loader, desc=f"Epoch {epoch+1}/{epochs} [Train]")
-        for inputs, targets in train_progress:
-            if inputs.nelement() == 0: continue
-            inputs, targets = inputs.to(device), targets.to(device)
-            optimizer.zero_grad()
-            outputs = model(inputs)
-            loss = criterion(outputs, targets)
-            loss.backward()
-            
-            # --- 안정성 강화 2: 그래디언트 클리핑 ---
-            torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+        num_batches = 0
+        num_samples = 0
+        data_wait = [0.0]
+        metrics.start_epoch(epoch)
+        train_batches = train_dataset.num_batches(batch_size, num_workers) if streaming else len(train_loader)
+        train_progress = tqdm(_timed(train_loader, data_wait), total=train_batches, desc=f"Epoch {epoch+1}/{epochs} [Train]", disable=not is_main)
+        # rank마다 배치 수가 달라도(샤드 크기 차이, 빈 배치) 멈추지 않도록 join으로 감쌈
+        with ddp.uneven_inputs(ddp_model):
+            for inputs, targets in train_progress:
+                if inputs.nelement() == 0: continue
+                inputs, targets = inputs.to(device, non_blocking=True), targets.to(device, non_blocking=True)
+                optimizer.zero_grad()
+                with metrics.phase('forward'), autocast_context(perf, device):
+                    outputs = forward(inputs)
+                    loss = criterion(outputs.float(), targets)
+                    if teacher is not None:
+                        with torch.no_grad():
+                            teacher_outputs = teacher(inputs).float()
+                        loss = distill_alpha * criterion(outputs.float(), teacher_outputs) + (1 - distill_alpha) * loss
+                with metrics.phase('backward'):
+                    loss.backward()
             
-            optimizer.step()
-            running_loss += loss.item()
-            train_progress.set_postfix(loss=loss.item())
-        train_loss = running_loss / len(train_loader)
+                with metrics.phase('optimizer'):
+                    # --- 안정성 강화 2: 그래디언트 클리핑 ---
+                    torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+                    optimizer.step()
+                loss_value = loss.item()
+                running_loss += loss_value
+                num_batches += 1
+                num_samples += len(inputs)
+                train_progress.set_postfix(loss=loss_value)
+                if checkpoint_every_steps and num_batches % checkpoint_every_steps == 0:
+                    # 에폭 중간 체크포인트: 'epoch'를 직전 완료 에폭으로 두어 이어서 학습하면 이 에폭을 다시 시작
+                    with metrics.phase('checkpoint'):
+                        checkpointer.save({
+                            'epoch': epoch - 1,
+                            'step': num_batches,
+                            'model_state_dict': model.state_dict(),
+                            'optimizer_state_dict': optimizer.state_dict(),
+                            'best_loss': best_loss,
+                            'epochs_no_improve': epochs_no_improve,
+                            'top_k': checkpointer.top,
+                            'model_kwargs': model_kwargs or {}
+                        }, checkpoint_path)
+                metrics.end_step(len(inputs), loss_value, data_wait)
+        # 분산 모드에서는 모든 rank의 합으로 평균
+        running_loss, num_batches = ddp.all_reduce_sum(running_loss, num_batches)
+        train_loss = running_loss / max(num_batches, 1)
 
+        if perf is not None and epoch == start_epoch:
+            check_accuracy(model, eval_forward, val_loader, criterion, device, perf)
+            # 모든 rank가 같은 정밀도로 학습하도록 한 rank라도 끄면 전체를 끔
+            perf['bf16'] = ddp.all_reduce_sum(perf['bf16'])[0] == world_size
         model.eval()
         val_loss = 0.0
-        val_progress = tqdm(val_loader, desc=f"Epoch {epoch+1}/{epochs} [Val]")
+        num_batches = 0
+        val_batches = val_dataset.num_batches(batch_size, num_workers) if streaming else len(val_loader)
+        val_progress = tqdm(val_loader, total=val_batches, desc=f"Epoch {epoch+1}/{epochs} [Val]", disable=not is_main)
         with torch.no_grad():
             for inputs, targets in val_progress:
                 if inputs.nelement() == 0: continue
-                inputs, targets = inputs.to(device), targets.to(device)
-                outputs = model(inputs)
-                loss = criterion(outputs, targets)
+                inputs, targets = inputs.to(device, non_blocking=True), targets.to(device, non_blocking=True)
+                with autocast_context(perf, device):
+                    outputs = eval_forward(inputs)
+                loss = criterion(outputs.float(), targets)
                 val_loss += loss.item()
+                num_batches += 1
+                num_samples += len(inputs)
                 val_progress.set_postfix(loss=loss.item())
-        val_loss /= len(val_loader)
-        print(f"Epoch {epoch+1}: Train Loss: {train_loss:.6f}, Val Loss: {val_loss:.6f}")
+        # 조기 종료 판단이 rank마다 같도록 검증 손실도 전체 평균
+        val_loss, num_batches, num_samples = ddp.all_reduce_sum(val_loss, num_batches, num_samples)
+        val_loss /= max(num_batches, 1)
+        epoch_time = time.perf_counter() - epoch_start
+        log(f"Epoch {epoch+1}: Train Loss: {train_loss:.6f}, Val Loss: {val_loss:.6f}, "
+            f"Time: {epoch_time:.1f}s ({num_samples / epoch_time:.0f} samples/s), "
+            f"Data wait: {data_wait[0]:.1f}s ({data_wait[0] / epoch_time:.0%})")
 
         is_best = val_loss < best_loss
         if is_best:
-            print(f"Validation loss decreased ({best_loss:.6f} --> {val_loss:.6f}). Saving best model...")
+            log(f"Validation loss decreased ({best_loss:.6f} --> {val_loss:.6f}). Saving best model...")
             best_loss = val_loss
             epochs_no_improve = 0
-            torch.save(model.state_dict(), os.path.join(model_save_path, 'best_model.pth'))
+            with metrics.phase('checkpoint'):
+                checkpointer.save(model.state_dict(), os.path.join(model_save_path, 'best_model.pth'))
         else:
             epochs_no_improve += 1
-            print(f"Validation loss did not improve. Counter: {epochs_no_improve}/{patience}")
+            log(f"Validation loss did not improve. Counter: {epochs_no_improve}/{patience}")
 
-        torch.save({
-            'epoch': epoch,
-            'model_state_dict': model.state_dict(),
-            'optimizer_state_dict': optimizer.state_dict(),
-            'best_loss': best_loss,
-            'epochs_no_improve': epochs_no_improve
-        }, checkpoint_path)
+        with metrics.phase('checkpoint'):
+            checkpointer.save_epoch({
+                'epoch': epoch,
+                'model_state_dict': model.state_dict(),
+                'optimizer_state_dict': optimizer.state_dict(),
+                'best_loss': best_loss,
+                'epochs_no_improve': epochs_no_improve,
+                'model_kwargs': model_kwargs or {}
+            }, checkpoint_path, val_loss, epoch)
+        metrics.log_epoch(epoch, {'train_loss': train_loss, 'val_loss': val_loss, 'time': epoch_time,
+                                  'samples_per_s': num_samples / epoch_time, 'data_wait': data_wait[0]})
 
         if epochs_no_improve >= patience:
-            print("Early stopping triggered.")
+            log("Early stopping triggered.")
+            break
+        if epoch_callback is not None and epoch_callback(epoch, train_loss, val_loss):
+            log("Stopped by epoch callback.")
             break
             
-    print("Finished Training")
-    print(f"Best model saved as 'best_model.pth' in '{model_save_path}' with validation loss {best_loss:.6f}")
+    checkpointer.close()
+    metrics.close()
+    log("Finished Training")
+    log(f"Best model saved as 'best_model.pth' in '{model_save_path}' with validation loss {best_loss:.6f}")
+    ddp.cleanup()
+    return best_loss
 
 
 if __name__ == '__main__':
-    AUGMENTED_DATA_DIRS = [
+    # 깨끗한 원본 스펙트럼 폴더 (오차는 학습 중에 생성하므로 data_augmenter.py 결과가 필요 없음)
+    DATA_DIRS = [
         r'C:\Users\chan2\Desktop\Can-Satellite\predata\dr3',
         r'C:\Users\chan2\Desktop\Can-Satellite\predata\dr4'
     ]
@@ -227,15 +547,42 @@ if __name__ == '__main__':
     VALIDATION_SPLIT = 0.2
     EARLY_STOPPING_PATIENCE = 7
     TARGET_LENGTH = 1024
+    SAMPLES_PER_FILE = 5
+    # 입력 손상: None이면 기존 linear/peak/noise, 효과 목록이면 corruptions.py의 실제 관측 손상 사용
+    CORRUPTION_EFFECTS = corruptions.EFFECTS
+    # 사전 패킹 캐시 폴더 (None이면 매 에폭 파일에서 읽음)
+    CACHE_DIR = os.path.join(MODEL_SAVE_DIR, 'spectra_cache')
+    # 메모리보다 큰 코퍼스: 샤드 스트리밍 폴더 (지정하면 CACHE_DIR 대신 사용)
+    SHARD_DIR = None
+    # 검증된 파일 목록 (바뀐 파일만 다시 검사). None이면 폴더의 모든 CSV 사용
+    MANIFEST_PATH = os.path.join(MODEL_SAVE_DIR, 'dataset_manifest.json')
+    NUM_WORKERS = 0
+    # GPU가 없는 장비용 CPU 성능 모드 (None이면 기존 fp32 eager). 예: {'bf16': 'auto', 'compile': True, 'intra_op_threads': 16}
+    CPU_PERF = None
+    # 검증 손실 상위 몇 개의 에폭 체크포인트를 남길지, 에폭 중간 체크포인트 간격(배치 수, None이면 에폭 끝에만)
+    KEEP_TOP_K = 3
+    CHECKPOINT_EVERY_STEPS = None
+    # 스텝 계측 (None이면 끔). 예: {'format': 'jsonl', 'tensorboard': True, 'profile_steps': (20, 25)}
+    INSTRUMENTATION = None
 
     print("--- Denoising U-Net Trainer with Enhanced Stability ---")
     train_model(
-        data_dirs=AUGMENTED_DATA_DIRS,
+        data_dirs=DATA_DIRS,
         model_save_path=MODEL_SAVE_DIR,
         epochs=NUM_EPOCHS,
         batch_size=BATCH_SIZE,
         lr=LEARNING_RATE,
         validation_split=VALIDATION_SPLIT,
         patience=EARLY_STOPPING_PATIENCE,
-        target_length=TARGET_LENGTH
+        target_length=TARGET_LENGTH,
+        samples_per_file=SAMPLES_PER_FILE,
+        corruption_effects=CORRUPTION_EFFECTS,
+        cache_dir=CACHE_DIR,
+        shard_dir=SHARD_DIR,
+        num_workers=NUM_WORKERS,
+        manifest_path=MANIFEST_PATH,
+        cpu_perf=CPU_PERF,
+        keep_top_k=KEEP_TOP_K,
+        checkpoint_every_steps=CHECKPOINT_EVERY_STEPS,
+        instrumentation=INSTRUMENTATION
     )
@@ -0,0 +1,204 @@
+"""
+학습 스텝 계측 (train_denoiser.py의 train_model(instrumentation=...) 에서 사용)
+
+스텝마다 구간별 시간을 재서 기록합니다.
+    data       : 다음 배치를 기다린 시간 (CSV 파싱, resample, 손상 생성 등 DataLoader 쪽 병목)
+    forward    : 순전파 + 손실 계산
+    backward   : 역전파 (분산 모드에서는 그래디언트 all-reduce 포함)
+    optimizer  : 그래디언트 클리핑 + optimizer.step
+    checkpoint : 체크포인트 스냅샷 (실제 디스크 쓰기는 백그라운드 스레드; checkpointing.py)
+그 밖에 스텝 시간, samples/s, 손실, 프로세스 최대 RSS(MB)를 함께 남깁니다.
+
+설정 딕셔너리 (None이면 계측하지 않으며, 학습 루프에는 빈 컨텍스트 매니저 비용만 남습니다):
+    log_dir       : 기록 폴더 (기본: model_save_path/metrics)
+    format        : 'jsonl' 또는 'csv' → steps.jsonl / steps.csv (분산 모드에서는 steps_rank{N}.*)
+    tensorboard   : True면 TensorBoard 이벤트 파일도 씀 (rank 0만, tensorboard 패키지 필요)
+    profile_steps : (시작, 끝) 전역 스텝 구간을 torch.profiler로 잡아 Chrome trace(trace_steps_A-B.json)로 저장
+                    (chrome://tracing 또는 https://ui.perfetto.dev 에서 열기)
+
+CUDA에서는 커널이 비동기로 실행되므로 구간 시간이 다음 동기화 지점으로 밀릴 수 있습니다 (CPU 학습에서는 정확).
+
+사용 예:
+    train_model(..., instrumentation={'format': 'jsonl', 'tensorboard': True, 'profile_steps': (20, 25)})
+    tensorboard --logdir trained_models/metrics
+"""
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows에는 resource 모듈이 없음 (psutil이 있으면 그것으로 측정)
+    resource = None
+
+PHASES = ('data', 'forward', 'backward', 'optimizer', 'checkpoint')
+FIELDS = ('step', 'epoch') + PHASES + ('step_time', 'samples', 'samples_per_s', 'loss', 'peak_rss_mb')
+
+DEFAULTS = {
+    'log_dir': None,
+    'format': 'jsonl',
+    'tensorboard': True,
+    'profile_steps': None,
+}
+
+_NULL = contextlib.nullcontext()
+
+def peak_rss_mb():
+    """이 프로세스의 최대 상주 메모리(MB). 측정할 수 없으면 None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux는 KB, macOS는 바이트 단위
+        return peak / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1024 ** 2
+    except ImportError:
+        return None
+
+class _Phase:
+    __slots__ = ('times', 'name', 'start')
+
+    def __init__(self, times, name):
+        self.times = times
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.times[self.name] += time.perf_counter() - self.start
+        return False
+
+class StepInstrumentation:
+    """
+    학습 루프에서
+        metrics.start_epoch(epoch)
+        for batch in ...:
+            with metrics.phase('forward'): ...
+            metrics.end_step(batch_size, loss, data_wait)
+    처럼 사용합니다. enabled=False면 모든 메서드가 아무것도 하지 않습니다.
+    data_wait는 train_denoiser._timed가 누적하는 [초] 리스트이며, 직전 스텝과의 차이를 data 구간으로 기록합니다.
+    """
+    def __init__(self, config=None, default_log_dir='.', rank=0, world_size=1):
+        self.enabled = config is not None
+        if not self.enabled:
+            return
+        cfg = {**DEFAULTS, **config}
+        if cfg['format'] not in ('jsonl', 'csv'):
+            raise ValueError(f"알 수 없는 계측 기록 형식: {cfg['format']}")
+        self.log_dir = cfg['log_dir'] or os.path.join(default_log_dir, 'metrics')
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.format = cfg['format']
+        suffix = f"_rank{rank}" if world_size > 1 else ""
+        path = os.path.join(self.log_dir, f"steps{suffix}.{self.format}")
+        is_new = not os.path.exists(path)
+        self._file = open(path, 'a', encoding='utf-8', newline='')
+        self._csv = None
+        if self.format == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=FIELDS)
+            if is_new:
+                self._csv.writeheader()
+
+        self._tb = None
+        if cfg['tensorboard'] and rank == 0:
+            try:
+                from torch.utils.tensorboard import SummaryWriter
+                self._tb = SummaryWriter(self.log_dir)
+            except ImportError:
+                print("TensorBoard 기록에는 tensorboard가 필요합니다 (pip install tensorboard). 이벤트 파일은 쓰지 않습니다.")
+
+        self.profile_steps = cfg['profile_steps']
+        self._profiler = None
+        self.step = 0
+        self.epoch = 0
+        self._times = dict.fromkeys(PHASES, 0.0)
+        self._last_wait = 0.0
+        self._step_start = time.perf_counter()
+
+    def start_epoch(self, epoch):
+        if not self.enabled:
+            return
+        self.epoch = epoch
+        self._last_wait = 0.0
+        self._step_start = time.perf_counter()
+
+    def phase(self, name):
+        """구간 시간을 재는 컨텍스트 매니저 (비활성화 시 공용 nullcontext)"""
+        if not self.enabled:
+            return _NULL
+        return _Phase(self._times, name)
+
+    def _profile(self):
+        if self.profile_steps is None:
+            return
+        start, stop = self.profile_steps
+        if self.step == start and self._profiler is None:
+            self._profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU],
+                                                    record_shapes=True, with_stack=False)
+            self._profiler.__enter__()
+        elif self.step == stop and self._profiler is not None:
+            self._profiler.__exit__(None, None, None)
+            trace_path = os.path.join(self.log_dir, f"trace_steps_{start}-{stop}.json")
+            self._profiler.export_chrome_trace(trace_path)
+            self._profiler = None
+            print(f"Profiler trace saved: {trace_path}")
+
+    def end_step(self, samples, loss, data_wait):
+        """스텝 하나를 기록하고 다음 스텝 측정을 시작합니다. loss는 파이썬 float 값입니다."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._times['data'] = data_wait[0] - self._last_wait
+        self._last_wait = data_wait[0]
+        step_time = now - self._step_start
+        row = {'step': self.step, 'epoch': self.epoch, **{k: round(v, 6) for k, v in self._times.items()},
+               'step_time': round(step_time, 6), 'samples': samples,
+               'samples_per_s': round(samples / step_time, 1) if step_time > 0 else None,
+               'loss': loss, 'peak_rss_mb': peak_rss_mb()}
+        self._write(row)
+        self._times = dict.fromkeys(PHASES, 0.0)
+        self.step += 1
+        self._profile()
+        # 기록에 쓴 시간은 다음 스텝의 data 구간과 겹치지 않도록 여기서 다시 시작
+        self._step_start = time.perf_counter()
+
+    def _write(self, row):
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps(row) + '\n')
+        if self._tb is not None:
+            for key in PHASES + ('step_time', 'samples_per_s', 'loss', 'peak_rss_mb'):
+                if row[key] is not None:
+                    self._tb.add_scalar(f"step/{key}", row[key], row['step'])
+
+    def log_epoch(self, epoch, values):
+        """
+        에폭 단위 값(손실, 에폭 시간 등)을 TensorBoard에 기록합니다.
+        마지막 스텝 뒤에 잰 구간(에폭 끝 체크포인트)은 여기서 epoch/checkpoint로 기록하고 비웁니다.
+        """
+        if not self.enabled:
+            return
+        values = {**values, 'checkpoint': self._times['checkpoint']}
+        self._times = dict.fromkeys(PHASES, 0.0)
+        if self._tb is None:
+            return
+        for key, value in values.items():
+            self._tb.add_scalar(f"epoch/{key}", value, epoch + 1)
+        self._tb.flush()
+
+    def close(self):
+        if not self.enabled:
+            return
+        if self._profiler is not None:
+            self._profiler.__exit__(None, None, None)
+            self._profiler = None
+        self._file.close()
+        if self._tb is not None:
+            self._tb.close()
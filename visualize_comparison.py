@@ -5,13 +5,17 @@ import os
 import random
 import tkinter as tk
 from tkinter import filedialog
+import sys
+# tools/module 의 공용 스펙트럼 로더(파싱 결과 캐시)를 사용하기 위해 경로 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+from module.spectrum_cache import load_spectrum
 
 def create_comparison_plot(csv_path, output_dir):
     """
     증강된 데이터 파일 하나를 읽어, 원본과 증강된 데이터를 비교하는 그래프를 생성합니다.
     """
     try:
-        data = pd.read_csv(csv_path, sep=r'\s+', header=None, comment='#')
+        data = pd.DataFrame(load_spectrum(csv_path))
     except FileNotFoundError:
         print(f"오류: 파일을 찾을 수 없습니다 - {csv_path}")
         return